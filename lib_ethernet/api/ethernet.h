@@ -45,6 +45,10 @@ typedef struct ethernet_packet_info_t {
   unsigned filter_data;   /**< A word of user data that was registered with the MAC address filter */
 } ethernet_packet_info_t;
 
+/** The number of bytes taken by a packet of ``len`` bytes in the buffer filled by
+ *  get_packets(): its descriptor followed by its data padded to a whole number of words */
+#define ETHERNET_BATCH_RECORD_SIZE(len) (sizeof(ethernet_packet_info_t) + (((len) + 3) & ~3))
+
 /** Structure representing MAC address filter data that is registered with the Ethernet MAC */
 typedef struct ethernet_macaddr_filter_t {
   uint8_t addr[MACADDR_NUM_BYTES]; /**< Six-octet destination MAC address to filter to the client that registers it */
@@ -141,8 +145,9 @@ typedef interface ethernet_cfg_if {
   void del_all_macaddr_filters(size_t client_num, int is_hp);
 
   /** Add an Ethertype to the filter. This filter is applied after the MAC address filter and only if
-   *  it is successful. Only packets with the specified Ethertypes will be forwarded to the client. A
-   *  maximum of 2 Ethertype filters can be applied per client.
+   *  it is successful. Only packets with the specified Ethertypes will be forwarded to the client. Up
+   *  to ETHERNET_MAX_ETHERTYPE_FILTERS (2 by default) Ethertype filters can be applied per client,
+   *  and the time taken to filter each packet does not depend on how many have been applied.
    *
    *  \param client_num   The index into the set of RX clients. Can be acquired by
    *                      calling the get_index() method.
@@ -158,6 +163,38 @@ typedef interface ethernet_cfg_if {
    */
   void del_ethertype_filter(size_t client_num, uint16_t ethertype);
 
+  /** Add a VLAN ID to the VLAN membership of a client. Once a client is a member of any VLAN, only
+   *  tagged packets with the VLAN IDs it is a member of are forwarded to it. Untagged and priority
+   *  tagged (VLAN ID 0) packets are always forwarded. This filter is applied with the Ethertype
+   *  filter, and the time taken to filter each packet does not depend on how many VLAN IDs have
+   *  been added.
+   *
+   *  VLAN filters are only applied to low priority clients, as are Ethertype filters. They are
+   *  only available if ETHERNET_SUPPORT_VLAN_FILTER is set true, which adds a 512 byte bitmap of
+   *  VLAN IDs to each low priority receive client.
+   *
+   *  \param client_num   The index into the set of RX clients. Can be acquired by
+   *                      calling the get_index() method.
+   *  \param vlan_id      The 12-bit VLAN ID to add.
+   */
+  void add_vlan_filter(size_t client_num, uint16_t vlan_id);
+
+  /** Delete a VLAN ID from the VLAN membership of a client
+   *
+   *  \param client_num   The index into the set of RX clients. Can be acquired by
+   *                      calling the get_index() method.
+   *  \param vlan_id      The 12-bit VLAN ID to delete.
+   */
+  void del_vlan_filter(size_t client_num, uint16_t vlan_id);
+
+  /** Delete all VLAN IDs from the VLAN membership of a client, so that it is forwarded
+   *  packets with any VLAN ID
+   *
+   *  \param client_num   The index into the set of RX clients. Can be acquired by
+   *                      calling the get_index() method.
+   */
+  void del_all_vlan_filters(size_t client_num);
+
   /** Get the tile ID that the Ethernet MAC is running on and the current timer value on that tile.
    *  This function is only available in the 10/100 Mb/s real-time and 10/100/1000 Mb/s MACs.
    *
@@ -332,7 +369,7 @@ typedef interface ethernet_rx_if {
   /** Packet ready notification.
    *
    *  This notification will fire when a packet has been queued for this
-   *  client and is ready to be received using get_packet().
+   *  client and is ready to be received using get_packet() or get_packets().
    *
    *  The event can be selected upon e.g.:
     \verbatim
@@ -356,6 +393,38 @@ typedef interface ethernet_rx_if {
   XC_CLEARS_NOTIFICATION void get_packet(REFERENCE_PARAM(ethernet_packet_info_t, desc),
                                           char packet[n],
                                           unsigned n);
+
+  /** Function to receive a batch of Ethernet packets and status/control data from the MAC in
+   *  a single transaction. Should be called after a packet_ready() notification.
+   *
+   *  The packets are packed into the buffer one after the other. Each starts with
+   *  its ``ethernet_packet_info_t`` descriptor, followed by the packet data, and the next
+   *  starts ETHERNET_BATCH_RECORD_SIZE(len) bytes later, where ``len`` is the length in the
+   *  descriptor:
+    \verbatim
+    unsigned num_packets = i_eth_rx.get_packets(buffer, sizeof(buffer), MAX_PACKETS);
+    unsigned offset = 0;
+    for (unsigned i = 0; i < num_packets; i++) {
+      ethernet_packet_info_t desc;
+      memcpy(&desc, &buffer[offset], sizeof(desc));
+      ... // Handle the packet at &buffer[offset + sizeof(desc)]
+      offset += ETHERNET_BATCH_RECORD_SIZE(desc.len);
+    }
+    \endverbatim
+   *
+   *  Only whole packets are received, so the buffer should be at least
+   *  ETHERNET_BATCH_RECORD_SIZE(ETHERNET_MAX_PACKET_SIZE) bytes. At most
+   *  ETHERNET_RX_MAX_BATCH_PACKETS (4 by default) packets are received in each call, so that the
+   *  MAC is not held up copying a long batch. The packet_ready() notification fires again if
+   *  there are packets left in the queue of the client.
+   *
+   *  \param buffer      A byte-array to receive the packets. Should be word aligned.
+   *  \param n           The number of bytes in the buffer.
+   *  \param max_packets The maximum number of packets to receive.
+   *
+   *  \returns           The number of packets received.
+   */
+  XC_CLEARS_NOTIFICATION unsigned get_packets(char buffer[n], unsigned n, unsigned max_packets);
 #ifdef __XC__
 } ethernet_rx_if;
 #endif
@@ -1,4 +1,4 @@
-// Copyright 2015-2021 XMOS LIMITED.
+// Copyright 2015-2024 XMOS LIMITED.
 // This Software is subject to the terms of the XMOS Public Licence: Version 1.
 #ifndef __client_state_h__
 #define __client_state_h__
@@ -9,6 +9,8 @@
 #include "mii_filter.h"
 #include "mii_buffering.h"
 #include "mii_ts_queue.h"
+#include "ethertype_filter.h"
+#include "vlan_filter.h"
 
 #ifdef __XC__
 extern "C" {
@@ -30,7 +32,11 @@ typedef struct
   int status_update_state;
   size_t num_etype_filters;
   int strip_vlan_tags;
-  uint16_t etype_filters[ETHERNET_MAX_ETHERTYPE_FILTERS];
+  uint16_t etype_filters[ETHERNET_ETHERTYPE_FILTER_TABLE_SIZE];
+#if ETHERNET_SUPPORT_VLAN_FILTER
+  size_t num_vlan_filters;
+  unsigned vlan_filters[ETHERNET_VLAN_FILTER_WORDS];
+#endif
 } rx_client_state_t;
 
 // Data structure to keep track of link layer status for transmit clients.
@@ -1,4 +1,4 @@
-// Copyright 2013-2021 XMOS LIMITED.
+// Copyright 2013-2024 XMOS LIMITED.
 // This Software is subject to the terms of the XMOS Public Licence: Version 1.
 #ifndef __default_ethernet_conf_h__
 #define __default_ethernet_conf_h__
@@ -15,6 +15,12 @@
 #define ETHERNET_SUPPORT_TRAFFIC_SHAPER (0)
 #endif
 
+#ifndef ETHERNET_SUPPORT_VLAN_FILTER
+// The VLAN filter of each receive client is a bitmap of all VLAN IDs, which
+// takes 512 bytes per client, so it is only included when this is set true
+#define ETHERNET_SUPPORT_VLAN_FILTER (0)
+#endif
+
 #ifndef ETHERNET_FILTER_SPECIALIZATION
   #define ETHERNET_FILTER_SPECIALIZATION
   #ifndef ETHERNET_ENABLE_FILTER_TIMING
@@ -42,6 +48,12 @@
 #define ETHERNET_RX_MAX_PACKET_SIZE ETHERNET_MAX_PACKET_SIZE
 #endif
 
+#ifndef ETHERNET_RX_MAX_BATCH_PACKETS
+// The most packets get_packets() receives in one call. The MAC does not handle
+// its other events while it copies the packets, so keep this small
+#define ETHERNET_RX_MAX_BATCH_PACKETS 4
+#endif
+
 #ifndef RGMII_MAC_BUFFER_COUNT
 // Provide enough buffers to receive all minumum sized frames after
 // a maximum sized frame
@@ -59,18 +71,66 @@
 #define ETHERNET_NUM_PACKET_POINTERS 32
 #endif
 
+#ifndef ETHERNET_MACADDR_FILTER_TABLE_SIZE
+// The MAC address filter table of the MII MACs.
+// Keep this as a power of 2 multiple of ETHERNET_MACADDR_FILTER_BUCKET_SIZE.
+// Each entry is 16 bytes, so the default table is 1024 bytes (the table of
+// 30 entries it replaced was 480 bytes). A hashed table of 32 entries fails to
+// add random addresses before it holds 30, while 64 entries always fit the 30
+// addresses the old table could. Set this to 32 to save memory if fewer than
+// about 24 addresses are used.
+#define ETHERNET_MACADDR_FILTER_TABLE_SIZE 64
+#endif
+
+#ifndef ETHERNET_MACADDR_FILTER_BUCKET_SIZE
+// The entries each MAC address can be in for each of its two hashes. The
+// filter time is set by this and not by the size of the table
+#define ETHERNET_MACADDR_FILTER_BUCKET_SIZE 4
+#endif
+
 #ifndef MII_MACADDR_HASH_TABLE_SIZE
 #define MII_MACADDR_HASH_TABLE_SIZE 256
 #endif
 
+#ifndef MII_MACADDR_HASH_BUCKET_SIZE
+// The entries each MAC address can be in for each of its two hashes.
+// Keep this as a power of 2 that divides MII_MACADDR_HASH_TABLE_SIZE
+#define MII_MACADDR_HASH_BUCKET_SIZE 4
+#endif
+
+#ifndef MII_MACADDR_HASH_MAX_MOVES
+// The most entries moved to make space when adding a MAC address filter
+#define MII_MACADDR_HASH_MAX_MOVES 3
+#endif
+
+#ifndef MII_MACADDR_HASH_MAX_SEARCH
+// The most buckets searched for a free entry when adding a MAC address filter
+#define MII_MACADDR_HASH_MAX_SEARCH 64
+#endif
+
 #ifndef MII_TIMESTAMP_QUEUE_MAX_SIZE
 #define MII_TIMESTAMP_QUEUE_MAX_SIZE 10
 #endif
 
 #ifndef ETHERNET_MAX_ETHERTYPE_FILTERS
+// The Ethertype filters each client can add. The filter table of each client
+// takes 2 * ETHERNET_ETHERTYPE_FILTER_TABLE_SIZE bytes
 #define ETHERNET_MAX_ETHERTYPE_FILTERS 2
 #endif
 
+#ifndef ETHERNET_ETHERTYPE_FILTER_TABLE_SIZE
+// The entries in the Ethertype filter table of each client. Keep this to
+// at least four times ETHERNET_MAX_ETHERTYPE_FILTERS
+#define ETHERNET_ETHERTYPE_FILTER_TABLE_SIZE (4 * ETHERNET_MAX_ETHERTYPE_FILTERS)
+#endif
+
+#ifndef ETHERNET_ETHERTYPE_FILTER_MAX_PROBES
+// The entries checked for the Ethertype of each packet. Keep this to at least
+// ETHERNET_MAX_ETHERTYPE_FILTERS, so that there is always a free entry in range
+// of the hash of an Ethertype while fewer than that many have been added
+#define ETHERNET_ETHERTYPE_FILTER_MAX_PROBES ETHERNET_MAX_ETHERTYPE_FILTERS
+#endif
+
 #ifndef __SIMULATOR__
 #define __SIMULATOR__ 0
 #endif
@@ -0,0 +1,33 @@
+// Copyright 2024 XMOS LIMITED.
+// This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#ifndef __ethertype_filter_h__
+#define __ethertype_filter_h__
+#include <stdint.h>
+#include <stddef.h>
+#include "default_ethernet_conf.h"
+
+// The Ethertype filters of a client are an open-addressed hash table. Each
+// Ethertype is in one of the ETHERNET_ETHERTYPE_FILTER_MAX_PROBES entries
+// following its hash, so the check of each packet takes the same time however
+// many Ethertypes the client has added. An entry is free when it is 0, which
+// is not a valid Ethertype.
+
+#ifdef __XC__
+
+void ethernet_init_ethertype_filter(uint16_t filters[ETHERNET_ETHERTYPE_FILTER_TABLE_SIZE],
+                                    size_t &num_filters);
+
+void ethernet_add_ethertype_filter_entry(uint16_t filters[ETHERNET_ETHERTYPE_FILTER_TABLE_SIZE],
+                                         size_t &num_filters,
+                                         uint16_t ethertype);
+
+void ethernet_del_ethertype_filter_entry(uint16_t filters[ETHERNET_ETHERTYPE_FILTER_TABLE_SIZE],
+                                         size_t &num_filters,
+                                         uint16_t ethertype);
+
+int ethernet_ethertype_filter_match(uint16_t filters[ETHERNET_ETHERTYPE_FILTER_TABLE_SIZE],
+                                    uint16_t ethertype);
+
+#endif
+
+#endif // __ethertype_filter_h__
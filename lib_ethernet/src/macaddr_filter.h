@@ -1,12 +1,12 @@
-// Copyright 2014-2021 XMOS LIMITED.
+// Copyright 2014-2024 XMOS LIMITED.
 // This Software is subject to the terms of the XMOS Public Licence: Version 1.
 #ifndef __macaddr_filter_h__
 #define __macaddr_filter_h__
 #include "ethernet.h"
 #include "default_ethernet_conf.h"
 
-// This is the worst-case that can be supported for line-rate processing
-#define ETHERNET_MACADDR_FILTER_TABLE_SIZE 30
+#define ETHERNET_MACADDR_FILTER_NUM_BUCKETS \
+  (ETHERNET_MACADDR_FILTER_TABLE_SIZE / ETHERNET_MACADDR_FILTER_BUCKET_SIZE)
 
 typedef struct eth_global_filter_entry_t {
   char addr[MACADDR_NUM_BYTES];
@@ -1,31 +1,41 @@
-// Copyright 2015-2021 XMOS LIMITED.
+// Copyright 2015-2024 XMOS LIMITED.
 // This Software is subject to the terms of the XMOS Public Licence: Version 1.
 #include <xs1.h>
 #include <print.h>
-#include "hwlock.h"
 #include "string.h"
 #include "macaddr_filter_hash.h"
 
-static mii_macaddr_hash_table_t hash_table_0;
-static mii_macaddr_hash_table_t hash_table_1;
-
-static mii_macaddr_hash_table_t *hash_table = &hash_table_0;
-static mii_macaddr_hash_table_t *backup_table = &hash_table_1;
-
-static unsigned int a = 1664525;
-static unsigned int c = 1013904223;
-
-// There can be one or two filter threads active
-#define MAX_NUM_FILTERS 2u
-static unsigned filter_active[MAX_NUM_FILTERS];
-static unsigned waiting_for_filter[MAX_NUM_FILTERS];
+// The table is a bucketized cuckoo hash table. Each key can be in one of two
+// buckets, chosen by CRCs with the two polynomials, so a lookup checks at most
+// 3 * MII_MACADDR_HASH_BUCKET_SIZE entries, as it checks the first bucket twice
+// (see below).
+//
+// The filter threads read the table while it is being updated, and a lookup
+// never waits for or retries after an update, so that it always takes the same
+// bounded time:
+//
+// - An entry is added to a free slot by writing all but the second word of its
+//   key, which is EMPTY_KEY1 in a free slot, and then publishing it by writing
+//   that word. It is removed by writing EMPTY_KEY1 to the same word. No lookup
+//   can match the second word of a free slot, as a key only uses 16 bits of it.
+// - The result of an entry in use is updated with one write to its result.
+// - Entries are only moved by copying them to a free slot before the old slot
+//   is reused. A lookup checks the first bucket again after the second, so it
+//   finds an entry that moves in either direction while it is looking.
+// - A lookup that matches a key checks it again after reading the result, and
+//   ignores the slot if it was reused in the meantime.
+
+#define EMPTY_KEY1 0xffffffff
+
+static mii_macaddr_hash_table_t hash_table;
 
 static void clear_table(mii_macaddr_hash_table_t * table)
 {
-  table->num_entries = 0;
+  volatile unsigned *p_num_entries = (volatile unsigned *)&table->num_entries;
+  *p_num_entries = 0;
   for (unsigned i = 0; i < MII_MACADDR_HASH_TABLE_SIZE; i++) {
-    table->entries[i].id[0] = 0;
-    table->entries[i].id[1] = 0;
+    volatile unsigned *id = (volatile unsigned *)table->entries[i].id;
+    id[1] = EMPTY_KEY1;
   }
   table->polys[0] = 0xedb88320;
   table->polys[1] = 0xba75fe21;
@@ -33,20 +43,7 @@ static void clear_table(mii_macaddr_hash_table_t * table)
 
 void mii_macaddr_hash_table_init()
 {
-  clear_table(hash_table);
-  clear_table(backup_table);
-}
-
-void mii_macaddr_set_num_active_filters(unsigned num_active)
-{
-  for (unsigned i = 0; i < MAX_NUM_FILTERS; i++) {
-    filter_active[i] = 0;
-    waiting_for_filter[i] = 0;
-  }
-  
-  for (unsigned i = 0; i < num_active; i++) {
-    filter_active[i] = 1;
-  }
+  clear_table(&hash_table);
 }
 
 static inline void entry_to_keys(ethernet_macaddr_filter_t entry,
@@ -60,28 +57,44 @@ static inline void entry_to_keys(ethernet_macaddr_filter_t entry,
           entry.addr[5] <<  8;
 }
 
-static inline int hash(int key0, int key1, int poly)
+static inline unsigned hash(unsigned key0, unsigned key1, unsigned poly)
 {
   unsigned int x = key0;
 
   __asm("crc32 %0, %2, %3":"=r"(x):"0"(x),"r"(key1),"r"(poly));
   __asm("crc32 %0, %2, %3":"=r"(x):"0"(x),"r"(0),"r"(poly));
 
-  x = x & (MII_MACADDR_HASH_TABLE_SIZE-1);
-  return x;
+  // Return the index of the first entry of the bucket
+  x = x & (MII_MACADDR_HASH_NUM_BUCKETS-1);
+  return x * MII_MACADDR_HASH_BUCKET_SIZE;
 }
 
 mii_macaddr_hash_table_t *mii_macaddr_get_hash_table(unsigned filter_num)
 {
-  mii_macaddr_hash_table_t *table = hash_table;
-
-  // Clear the waiting bit to indicate that the table has been swapped
-  volatile unsigned *p_waiting_for_filter = (volatile unsigned *)(&waiting_for_filter[filter_num]);
-  *p_waiting_for_filter = 0;
-  
-  return table;
-} 
-  
+  return &hash_table;
+}
+
+static inline unsigned lookup_bucket(volatile mii_macaddr_hash_table_t *table,
+                                     unsigned bucket,
+                                     unsigned key0,
+                                     unsigned key1,
+                                     unsigned *appdata)
+{
+  for (unsigned i = 0; i < MII_MACADDR_HASH_BUCKET_SIZE; i++) {
+    volatile mii_macaddr_hash_table_entry_t *entry = &table->entries[bucket + i];
+    if (key1 == entry->id[1] && key0 == entry->id[0]) {
+      unsigned result = entry->result;
+      unsigned data = entry->appdata;
+      // The slot is reused for another key if the entry is moved
+      if (key1 == entry->id[1] && key0 == entry->id[0]) {
+        *appdata = data;
+        return result;
+      }
+    }
+  }
+  return 0;
+}
+
 unsigned mii_macaddr_hash_lookup(mii_macaddr_hash_table_t *table,
                                  unsigned key0,
                                  unsigned key1,
@@ -90,168 +103,137 @@ unsigned mii_macaddr_hash_lookup(mii_macaddr_hash_table_t *table,
   if (key0 == 0 && key1 == 0)
     return 0;
 
-  // Always perform both lookups to ensure lookup time remains
+  // Always compute both hashes to ensure lookup time remains
   // relatively constant
   unsigned int x = hash(key0, key1, table->polys[0]);
   unsigned int y = hash(key0, key1, table->polys[1]);
-  
-  if (key0 == table->entries[y].id[0] &&
-      key1 == table->entries[y].id[1]) {
-    *appdata = table->entries[y].appdata;
-    return table->entries[y].result;
-  }
-  
-  if (key0 == table->entries[x].id[0] &&
-      key1 == table->entries[x].id[1]) {
-    *appdata = table->entries[x].appdata;
-    return table->entries[x].result;
-  }
 
-  return 0;
+  volatile mii_macaddr_hash_table_t *t = (volatile mii_macaddr_hash_table_t *)table;
+  unsigned result = lookup_bucket(t, x, key0, key1, appdata);
+  if (!result)
+    result = lookup_bucket(t, y, key0, key1, appdata);
+  if (!result)
+    result = lookup_bucket(t, x, key0, key1, appdata);
+  return result;
 }
 
-
-static int contains_different_entry(unsigned index, unsigned key[2], int *empty)
+static inline int is_empty(mii_macaddr_hash_table_entry_t *entry)
 {
-  *empty =
-    backup_table->entries[index].id[0] == 0
-    &&
-    backup_table->entries[index].id[1] == 0;
-
-  int different =
-    backup_table->entries[index].id[0] != key[0]
-    ||
-    backup_table->entries[index].id[1] != key[1];
-
-  return (!*empty && different);
+  return entry->id[1] == EMPTY_KEY1;
 }
 
-static int insert(unsigned key0, unsigned key1,
-                  unsigned result, unsigned set_not_or,
-                  unsigned appdata)
+static int find_entry(unsigned key0, unsigned key1)
 {
-  unsigned count = 0;
-  int conflict = 0;
-  int hashtype = 0;
-
-  mii_macaddr_hash_table_entry_t current;
-  current.id[0] = key0;
-  current.id[1] = key1;
-  current.result = result;
-  current.appdata = appdata;
-  do {
-    int index = hash(current.id[0], current.id[1], backup_table->polys[hashtype]);
-
-    int empty = 0;
-    if (!contains_different_entry(index, current.id, &empty)) {
-      backup_table->entries[index].id[0] = current.id[0];
-      backup_table->entries[index].id[1] = current.id[1];
-
-      // Should only OR the value into an existing entry
-      if (set_not_or || empty)
-        backup_table->entries[index].result = current.result;
-      else
-        backup_table->entries[index].result |= current.result;
-      
-      backup_table->entries[index].appdata = current.appdata;
-      conflict = 0;
-    }
-    else {
-      conflict = 1;
-      if (count == 0) {
-        hashtype = 1 - hashtype;
-      }
-      else {
-        mii_macaddr_hash_table_entry_t tmp;
-        memcpy(&tmp, &backup_table->entries[index], sizeof(tmp));
-
-        backup_table->entries[index].id[0] = current.id[0];
-        backup_table->entries[index].id[1] = current.id[1];
-        backup_table->entries[index].result = current.result;
-        backup_table->entries[index].appdata = current.appdata;
-
-        // There is no need to OR in the result any more
-        set_not_or = 1;
+  unsigned int x = hash(key0, key1, hash_table.polys[0]);
+  unsigned int y = hash(key0, key1, hash_table.polys[1]);
+
+  for (unsigned i = 0; i < MII_MACADDR_HASH_BUCKET_SIZE; i++) {
+    if (hash_table.entries[x + i].id[0] == key0 &&
+        hash_table.entries[x + i].id[1] == key1)
+      return x + i;
+    if (hash_table.entries[y + i].id[0] == key0 &&
+        hash_table.entries[y + i].id[1] == key1)
+      return y + i;
+  }
+  return -1;
+}
 
-        memcpy(&current, &tmp, sizeof(tmp));
-        hashtype = 1 - hashtype;
-      }
-    }
+static void write_entry(unsigned index, mii_macaddr_hash_table_entry_t *src)
+{
+  volatile mii_macaddr_hash_table_entry_t *dst =
+    (volatile mii_macaddr_hash_table_entry_t *)&hash_table.entries[index];
+  unsigned key1 = src->id[1];
+  dst->id[1] = EMPTY_KEY1;
+  dst->id[0] = src->id[0];
+  dst->result = src->result;
+  dst->appdata = src->appdata;
+  dst->id[1] = key1;
+}
 
-    count++;
-  } while (conflict && count < (backup_table->num_entries + 10));
+static void remove_entry(unsigned index)
+{
+  volatile mii_macaddr_hash_table_entry_t *dst =
+    (volatile mii_macaddr_hash_table_entry_t *)&hash_table.entries[index];
+  dst->id[1] = EMPTY_KEY1;
+  hash_table.num_entries--;
+}
 
-  if (!conflict)
-    backup_table->num_entries++;
+typedef struct search_node_t {
+  unsigned bucket;
+  int parent;
+  unsigned slot;
+  unsigned depth;
+} search_node_t;
 
-  return !conflict;
+static int get_free_slot(unsigned bucket)
+{
+  for (unsigned i = 0; i < MII_MACADDR_HASH_BUCKET_SIZE; i++) {
+    if (is_empty(&hash_table.entries[bucket + i]))
+      return bucket + i;
+  }
+  return -1;
 }
 
-static void refill_backup_table() {
-  // clear the backup table
-  backup_table->num_entries = 0;
-  for (int i = 0; i < MII_MACADDR_HASH_TABLE_SIZE; i++) {
-    backup_table->entries[i].id[0] = 0;
-    backup_table->entries[i].id[1] = 0;
+static int on_path(search_node_t nodes[], int node, unsigned bucket)
+{
+  for (; node >= 0; node = nodes[node].parent) {
+    if (nodes[node].bucket == bucket)
+      return 1;
   }
-
-  int success;
-  do {
-    // change the poly
-    backup_table->polys[0] = a * backup_table->polys[0] + c;
-    backup_table->polys[1] = a * backup_table->polys[1] + c;
-    success = 1;
-    for (int i = 0; success && i < MII_MACADDR_HASH_TABLE_SIZE; i++) {
-      if (hash_table->entries[i].id[0] != 0 ||
-          hash_table->entries[i].id[1] != 0) {
-        success = insert(hash_table->entries[i].id[0],
-                         hash_table->entries[i].id[1],
-                         hash_table->entries[i].result, 1, 
-                         hash_table->entries[i].appdata);
-      }
-    }
-  } while (!success);
+  return 0;
 }
 
-static void swap_tables(int do_memcpy)
+static int insert(mii_macaddr_hash_table_entry_t *entry)
 {
-  mii_macaddr_hash_table_t *old_table = hash_table;
-  
-  // flip the tables
-  hash_table = backup_table;
-    
-  // Wait for filter clients to start using the updated table
-  for (unsigned i = 0; i < MAX_NUM_FILTERS; i++) {
-    if (filter_active[i]) {
-      // Ensure that the accesses to this value go to memory
-      volatile unsigned *p_waiting_for_filter = (volatile unsigned *)(&waiting_for_filter[i]);
-      *p_waiting_for_filter = 1;
+  // Breadth-first search from the two buckets of the key for a path of moves
+  // that ends in a free slot, bounded so that an insert takes a fixed worst
+  // case time. The search is static as it takes 16 bytes per node, which is
+  // too much for the stack of the configuration thread
+  static search_node_t nodes[MII_MACADDR_HASH_MAX_SEARCH];
+  unsigned num_nodes = 2;
+  nodes[0].bucket = hash(entry->id[0], entry->id[1], hash_table.polys[0]);
+  nodes[1].bucket = hash(entry->id[0], entry->id[1], hash_table.polys[1]);
+  nodes[0].parent = nodes[1].parent = -1;
+  nodes[0].depth = nodes[1].depth = 0;
+
+  for (unsigned n = 0; n < num_nodes; n++) {
+    int index = get_free_slot(nodes[n].bucket);
+    if (index >= 0) {
+      // Move each entry on the path into the slot freed after it, starting
+      // from the end, so that every entry can always be found
+      int node = n;
+      while (nodes[node].parent >= 0) {
+        search_node_t *parent = &nodes[nodes[node].parent];
+        unsigned src = parent->bucket + nodes[node].slot;
+        write_entry(index, &hash_table.entries[src]);
+        index = src;
+        node = nodes[node].parent;
+      }
+      write_entry(index, entry);
+      hash_table.num_entries++;
+      return 1;
     }
-  }
 
-  backup_table = old_table;
-
-  for (unsigned i = 0; i < MAX_NUM_FILTERS; i++) {
-    int retries = 100;
-    
-    // Ensure that the accesses to this value go to memory
-    volatile unsigned *p_waiting_for_filter = (volatile unsigned *)(&waiting_for_filter[i]);
-    while (*p_waiting_for_filter && retries) {
-      // Wait for the table to be taken by the filter threads - with a get-out clause for
-      // the case the speed change has happenend
-      retries -= 1;
-    }
-    
-    if (!retries) {
-      break;
+    if (nodes[n].depth == MII_MACADDR_HASH_MAX_MOVES)
+      continue;
+
+    for (unsigned i = 0; i < MII_MACADDR_HASH_BUCKET_SIZE; i++) {
+      if (num_nodes == MII_MACADDR_HASH_MAX_SEARCH)
+        break;
+      mii_macaddr_hash_table_entry_t *other = &hash_table.entries[nodes[n].bucket + i];
+      unsigned alt = hash(other->id[0], other->id[1], hash_table.polys[0]);
+      if (alt == nodes[n].bucket)
+        alt = hash(other->id[0], other->id[1], hash_table.polys[1]);
+      if (on_path(nodes, n, alt))
+        continue;
+      nodes[num_nodes].bucket = alt;
+      nodes[num_nodes].parent = n;
+      nodes[num_nodes].slot = i;
+      nodes[num_nodes].depth = nodes[n].depth + 1;
+      num_nodes++;
     }
   }
-
-  if (do_memcpy) {
-    // Keep tables in sync by doing a copy. If not, the calling function
-    // needs to apply their operation again to the new backup table.
-    memcpy(backup_table, hash_table, sizeof(hash_table_0));
-  }
+  return 0;
 }
 
 ethernet_macaddr_filter_result_t
@@ -261,94 +243,61 @@ mii_macaddr_hash_table_add_entry(unsigned client_num, int is_hp,
   unsigned key0, key1;
   entry_to_keys(entry, &key0, &key1);
 
-  int success = 0;
-  int do_memcpy = 0;
-  while (!success) {
-    success = insert(key0, key1,
-                     ethernet_filter_result_set_hp(1 << client_num, is_hp), 0,
-                     entry.appdata);
+  int index = find_entry(key0, key1);
+  if (index >= 0) {
+    // Should only OR the client into an existing entry. The result is
+    // written last so a lookup that sees the new client gets its appdata
+    volatile mii_macaddr_hash_table_entry_t *existing =
+      (volatile mii_macaddr_hash_table_entry_t *)&hash_table.entries[index];
+    existing->appdata = entry.appdata;
+    existing->result = hash_table.entries[index].result |
+                       ethernet_filter_result_set_hp(1 << client_num, is_hp);
+    return ETHERNET_MACADDR_FILTER_SUCCESS;
+  }
 
-    if (success) {
-      swap_tables(do_memcpy);
-    }
-    else {
-      // refill table with a different hash and try again
-      refill_backup_table();
+  mii_macaddr_hash_table_entry_t current;
+  current.id[0] = key0;
+  current.id[1] = key1;
+  current.result = ethernet_filter_result_set_hp(1 << client_num, is_hp);
+  current.appdata = entry.appdata;
 
-      // Get the update to do a memcpy of the table to keep the table in sync
-      do_memcpy = 1;
-    }
-  }
+  if (!insert(&current))
+    return ETHERNET_MACADDR_FILTER_TABLE_FULL;
 
-  if (!do_memcpy) {
-    // The tables need to be kept in sync by performing the same operation
-    // as it is quicker than doing a full memcpy
-    insert(key0, key1,
-           ethernet_filter_result_set_hp(1 << client_num, is_hp), 0,
-           entry.appdata);
-  }
-  
   return ETHERNET_MACADDR_FILTER_SUCCESS;
 }
 
-static int delete_entry(unsigned client_num, int is_hp,
-                        ethernet_macaddr_filter_t entry)
+void mii_macaddr_hash_table_delete_entry(unsigned client_num, int is_hp,
+                                         ethernet_macaddr_filter_t entry)
 {
   unsigned key0, key1;
   entry_to_keys(entry, &key0, &key1);
 
   if (key0 == 0 && key1 == 0)
-    return 0;
+    return;
 
-  unsigned int x = hash(key0, key1, backup_table->polys[0]);
+  int index = find_entry(key0, key1);
+  if (index < 0)
+    return;
 
-  if (key0 != backup_table->entries[x].id[0] ||
-      key1 != backup_table->entries[x].id[1]) { 
-    x = hash(key0, key1, hash_table->polys[1]);
-  }
-
-  if (key0 != backup_table->entries[x].id[0] ||
-      key1 != backup_table->entries[x].id[1]) {
-    return 0;
-  }
-  
-  // Update the entry.
-  unsigned result = backup_table->entries[x].result;
+  unsigned result = hash_table.entries[index].result;
 
   // Ensure the entry is the correct priority
   if (ethernet_filter_result_is_hp(result) != is_hp)
-    return 0;
+    return;
 
-  // Clear the client
+  // Clear the client and remove the entry if there are no more clients
   result &= ~(1 << client_num);
-
-  // Clear the high priority bit if there are no more clients
-  if (is_hp && (ethernet_filter_result_interfaces(result) == 0)) {
-    result = 0;
+  if (ethernet_filter_result_interfaces(result) == 0) {
+    remove_entry(index);
   }
-  backup_table->entries[x].result = result;
-
-  return 1;
-}
-  
-
-void mii_macaddr_hash_table_delete_entry(unsigned client_num, int is_hp,
-                                         ethernet_macaddr_filter_t entry)
-{
-  int deleted = delete_entry(client_num, is_hp, entry);
-  if (deleted) {
-    swap_tables(0);
-
-    // Re-apply the deletion to keep the tables in sync
-    delete_entry(client_num, is_hp, entry);
+  else {
+    volatile unsigned *p_result = (volatile unsigned *)&hash_table.entries[index].result;
+    *p_result = result;
   }
 }
 
 void mii_macaddr_hash_table_clear()
 {
-  clear_table(backup_table);
-  swap_tables(0);
-
-  // Apply clear operation to new backup table (quicker than copying a blank table)
-  clear_table(backup_table);
+  clear_table(&hash_table);
 }
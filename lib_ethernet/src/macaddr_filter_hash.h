@@ -1,4 +1,4 @@
-// Copyright 2015-2021 XMOS LIMITED.
+// Copyright 2015-2024 XMOS LIMITED.
 // This Software is subject to the terms of the XMOS Public Licence: Version 1.
 #ifndef __macaddr_filter_hash_h__
 #define __macaddr_filter_hash_h__
@@ -10,6 +10,8 @@
 extern "C" {
 #endif
 
+#define MII_MACADDR_HASH_NUM_BUCKETS (MII_MACADDR_HASH_TABLE_SIZE / MII_MACADDR_HASH_BUCKET_SIZE)
+
 typedef struct mii_macaddr_hash_table_entry_t
 {
   unsigned id[2];
@@ -26,7 +28,6 @@ typedef struct mii_macaddr_hash_table_t
   
 
 void mii_macaddr_hash_table_init();
-void mii_macaddr_set_num_active_filters(unsigned num_active);
 
 mii_macaddr_hash_table_t *mii_macaddr_get_hash_table(unsigned filter_num);
   
@@ -0,0 +1,35 @@
+// Copyright 2024 XMOS LIMITED.
+// This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#ifndef __vlan_filter_h__
+#define __vlan_filter_h__
+#include <stdint.h>
+#include <stddef.h>
+
+// The VLAN membership of a client is a bitmap of the 4096 VLAN IDs, so the
+// check of each packet takes the same time however many VLANs the client
+// belongs to.
+#define ETHERNET_NUM_VLAN_IDS 4096
+#define ETHERNET_VLAN_FILTER_WORDS (ETHERNET_NUM_VLAN_IDS / 32)
+
+#ifdef __XC__
+
+void ethernet_init_vlan_filter(unsigned filter[ETHERNET_VLAN_FILTER_WORDS],
+                               size_t &num_vlans);
+
+void ethernet_add_vlan_filter_entry(unsigned filter[ETHERNET_VLAN_FILTER_WORDS],
+                                    size_t &num_vlans,
+                                    uint16_t vlan_id);
+
+void ethernet_del_vlan_filter_entry(unsigned filter[ETHERNET_VLAN_FILTER_WORDS],
+                                    size_t &num_vlans,
+                                    uint16_t vlan_id);
+
+/** Returns whether a packet with a VLAN tag with the given TCI passes the
+ *  filter. Priority tagged packets (VLAN ID 0) always pass.
+ */
+int ethernet_vlan_filter_match(unsigned filter[ETHERNET_VLAN_FILTER_WORDS],
+                               uint16_t tci);
+
+#endif
+
+#endif // __vlan_filter_h__
@@ -16,6 +16,7 @@ setuptools.setup(
         'flake8~=7.0',
         'pytest~=8.2',
         'pytest-xdist~=3.6',
+        'numpy~=1.26',
     ],
     dependency_links=[
     ],
@@ -0,0 +1,71 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# Compare benchmark results with a checked in baseline. The baseline file holds
+# the tolerance of each metric and the last accepted result of each benchmark:
+#
+#   {
+#     "tolerances": {"throughput_mbps": {"better": "higher", "relative": 0.02}, ...},
+#     "results": {"rt-mii-25MHz-imix": {"throughput_mbps": 57.1, ...}, ...}
+#   }
+#
+# A metric regresses when it is worse than the baseline by more than
+# relative * baseline + absolute. Metrics without a tolerance, such as the
+# harness wall time which depends on the host, are recorded for information but
+# never compared. Benchmarks without a baseline result are skipped until one is
+# recorded with --update-baseline.
+#
+
+import json
+from pathlib import Path
+
+from filelock import FileLock
+
+
+def load_baseline(filename):
+    filename = Path(filename)
+    if not filename.is_file():
+        return {"tolerances": {}, "results": {}}
+    with open(filename) as f:
+        baseline = json.load(f)
+    baseline.setdefault("tolerances", {})
+    baseline.setdefault("results", {})
+    return baseline
+
+
+def compare(name, result, baseline):
+    """ Returns a description of each metric of a result that has regressed
+        against the baseline
+    """
+    expected = baseline["results"].get(name)
+    if expected is None:
+        return []
+
+    regressions = []
+    for (metric, tolerance) in baseline["tolerances"].items():
+        if metric not in expected or metric not in result:
+            continue
+
+        allowed = tolerance.get("relative", 0) * abs(expected[metric]) + tolerance.get("absolute", 0)
+        if tolerance.get("better", "lower") == "higher":
+            worse_by = expected[metric] - result[metric]
+        else:
+            worse_by = result[metric] - expected[metric]
+
+        if worse_by > allowed:
+            regressions.append(f"{name}: {metric} {result[metric]:.6g} is worse than the "
+                               f"baseline {expected[metric]:.6g} by more than {allowed:.6g}")
+    return regressions
+
+
+def update_baseline(filename, name, result):
+    """ Record a result as the new baseline. The file is locked so that benchmarks
+        running in parallel can all update it.
+    """
+    with FileLock(f"{filename}.lock"):
+        baseline = load_baseline(filename)
+        baseline["results"][name] = result
+        baseline["results"] = dict(sorted(baseline["results"].items()))
+        with open(filename, "w") as f:
+            json.dump(baseline, f, indent=2)
+            f.write("\n")
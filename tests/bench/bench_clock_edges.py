@@ -0,0 +1,102 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# Count the Python callbacks made by the simulator per simulated frame when the
+# PHY threads wait for clock edges. The 'polling' mode restores the original
+# behaviour of waiting on a predicate of the clock value, which the simulator
+# re-evaluates on every scheduling step; the 'edges' mode sleeps with wait_until
+# straight to the next relevant edge.
+#
+# Usage (from the tests directory, needs the test_rx binaries):
+#   pytest -s bench/bench_clock_edges.py
+#
+
+import json
+import random
+import sys
+import types
+from collections import Counter
+from pathlib import Path
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from mii_clock import Clock
+from mii_packet import MiiPacket
+from helpers import do_rx_test, packet_processing_time, get_dut_mac_address
+from helpers import check_received_packet, get_mii_rx_clk_phy, get_mii_tx_clk_phy
+from helpers import get_rgmii_rx_clk_phy, get_rgmii_tx_clk_phy
+
+with open(Path(__file__).resolve().parent.parent / "test_rx/test_params.json") as f:
+    params = json.load(f)
+
+num_frames = 20
+
+
+def poll_clock_low(phy):
+    phy.wait(lambda x: phy._clock.is_low())
+
+def poll_clock_high(phy):
+    phy.wait(lambda x: phy._clock.is_high())
+
+
+def count_callbacks(thread, counts):
+    """ Wrap the wait functions of a thread so that every predicate evaluation and
+        every timed wake up is counted.
+    """
+    wait = thread.wait
+    wait_until = thread.wait_until
+
+    def counting_wait(fn):
+        def counted(x):
+            counts['predicate'] += 1
+            return fn(x)
+        wait(counted)
+
+    def counting_wait_until(t):
+        counts['wait_until'] += 1
+        wait_until(t)
+
+    thread.wait = counting_wait
+    thread.wait_until = counting_wait_until
+
+
+def create_packets(rand, mac, tx_phy):
+    packets = []
+    for i in range(num_frames):
+        length = rand.randint(46, 1500)
+        packets.append(MiiPacket(rand,
+            dst_mac_addr=get_dut_mac_address(),
+            create_data_args=['step', (i, length)],
+            inter_frame_gap=packet_processing_time(tx_phy, length, mac)
+          ))
+    return packets
+
+
+@pytest.mark.parametrize("mode", ["polling", "edges"])
+@pytest.mark.parametrize("params", params["PROFILES"], ids=["-".join(list(profile.values())) for profile in params["PROFILES"]])
+def test_clock_callbacks(capfd, params, mode):
+    if params["phy"] == "mii":
+        (rx_clk, rx_phy) = get_mii_rx_clk_phy(packet_fn=check_received_packet)
+        (tx_clk, tx_phy) = get_mii_tx_clk_phy()
+    else:
+        clk_rate = Clock.CLK_125MHz if params["clk"] == "125MHz" else Clock.CLK_25MHz
+        (rx_clk, rx_phy) = get_rgmii_rx_clk_phy(clk_rate, packet_fn=check_received_packet)
+        (tx_clk, tx_phy) = get_rgmii_tx_clk_phy(clk_rate)
+
+    counts = {}
+    for thread in [rx_phy, tx_phy]:
+        if mode == "polling":
+            thread.wait_for_clock_low = types.MethodType(poll_clock_low, thread)
+            thread.wait_for_clock_high = types.MethodType(poll_clock_high, thread)
+        counts[thread] = Counter()
+        count_callbacks(thread, counts[thread])
+
+    packets = create_packets(random.Random(1), params["mac"], tx_phy)
+    do_rx_test(capfd, params["mac"], params["arch"], rx_clk, rx_phy, tx_clk, tx_phy,
+               packets, __file__, 1, override_dut_dir='test_rx')
+
+    with capfd.disabled():
+        for thread, name in [(tx_phy, 'tx'), (rx_phy, 'rx')]:
+            total = sum(counts[thread].values())
+            print(f"{mode:>8} {name} {tx_clk.get_name()}: {total/num_frames:.0f} callbacks/frame "
+                  f"({counts[thread]['predicate']} predicate, {counts[thread]['wait_until']} wait_until)")
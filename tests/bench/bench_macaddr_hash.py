@@ -0,0 +1,124 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# Benchmarks of the MAC address filter tables. The test_macaddr_hash
+# application fills the table of the RGMII MAC with random multicast addresses
+# to 50%, 80% and 95% of its size and prints the time taken by the adds and the
+# lookups at each load. The test_macaddr_filter application does the same for
+# the table of the MII MACs, built with each of a set of table sizes, and times
+# ethernet_do_filtering(), the filter time of each received packet.
+#
+# The applications print times in 10ns reference timer ticks. They are
+# converted to ns and compared with bench_baseline.json as for bench_profiles.py.
+#
+# Usage (from the tests directory):
+#   pytest -s bench/bench_macaddr_hash.py [--update-baseline]
+#
+
+import json
+import sys
+from pathlib import Path
+import Pyxsim as px
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from helpers import tests_dir, build_if_needed
+from bench.baseline import load_baseline, compare, update_baseline
+
+bench_dir = Path(__file__).resolve().parent
+baseline_file = bench_dir / "bench_baseline.json"
+
+dut = 'test_macaddr_hash'
+profile = 'rt_hp_rgmii'
+
+LOADS = [50, 80, 95]
+
+filter_dut = 'test_macaddr_filter'
+with open(tests_dir / filter_dut / "test_params.json") as f:
+    filter_profiles = [f'{p["mac"]}_{p["phy"]}_{p["table_size"]}' for p in json.load(f)["PROFILES"]]
+
+FILTER_LOADS = [25, 50, 90]
+
+# The reference timer runs at 100MHz
+TICK_NS = 10
+
+# The metrics printed by the application that are times in ticks
+TIME_METRICS = ["insert_mean", "insert_max", "lookup_hit_mean", "lookup_miss_mean", "lookup_max",
+                "filter_hit_mean", "filter_hit_max", "filter_miss_mean", "filter_miss_max"]
+
+
+class OutputTester(object):
+    """ Keeps the output of the application to be parsed
+    """
+
+    def __init__(self):
+        self.output = []
+
+    def run(self, output):
+        self.output = output
+        return True
+
+
+def parse_output(output):
+    """ Returns the results of each load from the lines printed by the
+        applications, which are a list of names and values
+    """
+    results = {}
+    for line in output:
+        if line.startswith("ERROR"):
+            raise RuntimeError(line.strip())
+        fields = line.split()
+        if "load" not in fields[0::2]:
+            continue
+        values = dict(zip(fields[0::2], [int(v) for v in fields[1::2]]))
+        result = {"entries": values["entries"], "failed_inserts": values["failed"]}
+        for metric in TIME_METRICS:
+            if metric in values:
+                result[f"{metric}_ns"] = values[metric] * TICK_NS
+        results[values["load"]] = result
+    return results
+
+
+def run_app(testname, profile):
+    build_if_needed(testname, profile)
+    binary = tests_dir / testname / "bin" / profile / f"{testname}_{profile}.xe"
+    tester = OutputTester()
+    px.run_on_simulator_(str(binary), tester=tester, do_xe_prebuild=False)
+    return parse_output(tester.output)
+
+
+@pytest.fixture(scope="module")
+def load_results():
+    return run_app(dut, profile)
+
+
+@pytest.fixture(scope="module")
+def filter_results():
+    return {p: run_app(filter_dut, p) for p in filter_profiles}
+
+
+def check_result(request, name, result):
+    print(f"{name}: " + ", ".join(f"{k} {v:.6g}" for (k, v) in result.items()))
+
+    if request.config.getoption("--update-baseline"):
+        update_baseline(baseline_file, name, result)
+        return
+
+    baseline = load_baseline(baseline_file)
+    if name not in baseline["results"]:
+        pytest.skip(f"No baseline has been recorded for {name}, run with --update-baseline")
+
+    regressions = compare(name, result, baseline)
+    assert not regressions, "\n".join(regressions)
+
+
+@pytest.mark.parametrize("load", LOADS)
+def test_bench_macaddr_hash(request, load_results, load):
+    check_result(request, f"macaddr_hash-load{load}", load_results[load])
+
+
+@pytest.mark.parametrize("load", FILTER_LOADS)
+@pytest.mark.parametrize("filter_profile", filter_profiles)
+def test_bench_macaddr_filter(request, filter_results, filter_profile, load):
+    table_size = filter_profile.split("_")[-1]
+    check_result(request, f"macaddr_filter-size{table_size}-load{load}", filter_results[filter_profile][load])
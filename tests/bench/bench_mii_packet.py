@@ -0,0 +1,124 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# Memory and throughput benchmark for the MiiPacket representation. It compares
+# the bytearray/__slots__ backed MiiPacket against the original list-of-ints
+# representation when building large packet corpora.
+#
+# Usage: python bench_mii_packet.py [--counts 10000,100000,1000000] [--data-bytes 46]
+#
+
+import argparse
+import gc
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from mii_packet import MiiPacket
+
+
+class ListMiiPacket(object):
+    """ The original list-backed packet representation, reduced to the fields
+        needed to build a packet and serialise its bytes.
+    """
+
+    def __init__(self, rand, **kwargs):
+        self.dropped = False
+        self.num_preamble_nibbles = 15
+        self.sfd_nibble = 0xd
+        self.num_data_bytes = 46
+        self.inter_frame_gap = 960 * 1e6
+        self.dst_mac_addr = None
+        self.src_mac_addr = None
+        self.vlan_prio_tag = None
+        self.ether_len_type = None
+        self.data_bytes = None
+        self.preamble_nibbles = None
+        self.send_crc_word = True
+        self.corrupt_crc = False
+        self.extra_nibble = False
+        self.seed = None
+        self.create_data_args = None
+        self.send_header = True
+        self.nibble = None
+        self.packet_crc = 0
+        self.error_nibbles = []
+
+        for arg,value in kwargs.items():
+            setattr(self, arg, value)
+
+        self.preamble_nibbles = [0x5 for x in range(self.num_preamble_nibbles)]
+        if self.dst_mac_addr is None:
+            self.dst_mac_addr = [rand.randint(0, 255) for x in range(6)]
+        if self.src_mac_addr is None:
+            self.src_mac_addr = [rand.randint(0, 255) for x in range(6)]
+        if self.data_bytes is None:
+            self.data_bytes = [rand.randint(0, 255) for x in range(self.num_data_bytes)]
+        self.num_data_bytes = len(self.data_bytes)
+        self.ether_len_type = [(self.num_data_bytes >> 8) & 0xff, self.num_data_bytes & 0xff]
+
+    def get_packet_bytes(self):
+        return self.dst_mac_addr + self.src_mac_addr + self.ether_len_type + self.data_bytes
+
+
+def build_corpus(cls, count, data_bytes):
+    rand = random.Random(1)
+    data = [(7 * i) & 0xff for i in range(data_bytes)]
+    # Each packet is given its own copy of the data as it would be in a real corpus
+    return [cls(rand, dst_mac_addr=[0, 1, 2, 3, 4, 5], data_bytes=list(data)) for i in range(count)]
+
+
+def measure(cls, count, data_bytes):
+    gc.collect()
+    start = time.perf_counter()
+    packets = build_corpus(cls, count, data_bytes)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    total_bytes = sum(len(packet.get_packet_bytes()) for packet in packets)
+    serialise_time = time.perf_counter() - start
+    del packets
+
+    gc.collect()
+    tracemalloc.start()
+    packets = build_corpus(cls, count, data_bytes)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del packets
+
+    return {
+        'build_s': build_time,
+        'serialise_s': serialise_time,
+        'serialise_mbps': (total_bytes * 8) / serialise_time / 1e6,
+        'bytes_per_packet': current / count,
+        'peak_mb': peak / 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='MiiPacket memory and throughput benchmark')
+    parser.add_argument('--counts', default='10000,100000,1000000',
+                        help='Comma separated list of corpus sizes')
+    parser.add_argument('--data-bytes', type=int, default=46,
+                        help='Number of payload bytes in each frame')
+    parser.add_argument('--skip-list', action='store_true',
+                        help='Only measure the compact representation')
+    options = parser.parse_args()
+
+    representations = [('bytearray', MiiPacket)]
+    if not options.skip_list:
+        representations.append(('list', ListMiiPacket))
+
+    print(f"{'frames':>10} {'repr':>10} {'build s':>10} {'serialise s':>12} {'Mb/s':>10} {'B/frame':>10} {'peak MB':>10}")
+    for count in [int(x) for x in options.counts.split(',')]:
+        for name, cls in representations:
+            r = measure(cls, count, options.data_bytes)
+            print(f"{count:>10} {name:>10} {r['build_s']:>10.2f} {r['serialise_s']:>12.2f} "
+                  f"{r['serialise_mbps']:>10.1f} {r['bytes_per_packet']:>10.0f} {r['peak_mb']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# Performance regression benchmarks. Every MAC/PHY/clock profile listed in the
+# test_params.json files is run under each of a set of standard traffic mixes
+# against the test_rx application, which loops every frame it receives back to
+# the testbench. The simulated throughput, drops and loopback latency are taken
+# from a MetricsCollector. The harness wall time is measured around the run and
+# recorded for information only, as it depends on the host.
+#
+# The results are compared with bench_baseline.json, which also holds the
+# tolerance allowed on each metric. Frames the DUT cannot keep up with are
+# counted as drops rather than failing the run, so profiles that the functional
+# tests skip (such as gigabit line rate) are still benchmarked.
+#
+# Usage (from the tests directory):
+#   pytest -s bench/bench_profiles.py [--bench-frames N] [--update-baseline]
+#
+
+import json
+import random
+import sys
+import time
+from pathlib import Path
+import Pyxsim as px
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from mii_clock import Clock
+from mii_packet import MiiPacket
+from metrics import MetricsCollector
+from helpers import tests_dir, build_if_needed, get_sim_args, packet_processing_time
+from helpers import get_dut_mac_address, get_mii_rx_clk_phy, get_mii_tx_clk_phy
+from helpers import get_rgmii_rx_clk_phy, get_rgmii_tx_clk_phy
+from bench.baseline import load_baseline, compare, update_baseline
+
+bench_dir = Path(__file__).resolve().parent
+baseline_file = bench_dir / "bench_baseline.json"
+
+# The application that loops frames back and its profiles
+dut = 'test_rx'
+with open(tests_dir / dut / "test_params.json") as f:
+    dut_profiles = {f'{p["mac"]}_{p["phy"]}' for p in json.load(f)["PROFILES"]}
+
+clock_rates = {"25MHz": Clock.CLK_25MHz, "125MHz": Clock.CLK_125MHz}
+
+# The number of frames in each burst of the max_size_burst mix
+BURST_FRAMES = 8
+
+# The frame sizes (in data bytes) of the simple IMIX: 7 x 64, 4 x 576, 1 x 1518 byte frames
+IMIX_DATA_BYTES = [46] * 7 + [558] * 4 + [1500]
+
+# The VLAN priorities of the HP/LP mix
+HP_PRIORITY = 5
+LP_PRIORITY = 0
+
+
+def get_profiles():
+    """ Returns each distinct mac/phy/clk profile in the test_params.json files
+    """
+    profiles = {}
+    for filename in sorted(tests_dir.glob("test_*/test_params.json")):
+        with open(filename) as f:
+            for profile in json.load(f)["PROFILES"]:
+                key = (profile["mac"], profile["phy"], profile["clk"])
+                profiles[key] = {"mac": profile["mac"], "phy": profile["phy"],
+                                 "clk": profile["clk"], "arch": profile["arch"]}
+    return [profiles[key] for key in sorted(profiles)]
+
+
+def get_dut_profile(mac, phy):
+    # The RGMII MAC is the same with or without RT so the hp MAC is the rt_hp build
+    if phy == 'rgmii' and mac == 'hp':
+        mac = 'rt_hp'
+    return f'{mac}_{phy}'
+
+
+def create_packet(rand, i, num_data_bytes, ifg, vlan_prio_tag=[]):
+    # The step data makes each frame unique so that its latency can be measured
+    return MiiPacket(rand, dst_mac_addr=get_dut_mac_address(), vlan_prio_tag=vlan_prio_tag,
+                     create_data_args=['step', (i & 0xff, num_data_bytes)], inter_frame_gap=ifg)
+
+
+def mix_min_size(rand, tx_phy, mac, num_frames):
+    """ Minimum sized frames at line rate
+    """
+    ifg = tx_phy.get_clock().get_min_ifg()
+    return [create_packet(rand, i, 46, ifg) for i in range(num_frames)]
+
+
+def mix_imix(rand, tx_phy, mac, num_frames):
+    """ Frames of the simple IMIX sizes in a random order at line rate
+    """
+    ifg = tx_phy.get_clock().get_min_ifg()
+    return [create_packet(rand, i, rand.choice(IMIX_DATA_BYTES), ifg) for i in range(num_frames)]
+
+
+def mix_max_size_burst(rand, tx_phy, mac, num_frames):
+    """ Bursts of maximum sized frames at line rate, with time between the bursts
+        for the DUT to process them
+    """
+    packets = []
+    for i in range(num_frames):
+        ifg = tx_phy.get_clock().get_min_ifg()
+        if i and i % BURST_FRAMES == 0:
+            ifg = BURST_FRAMES * packet_processing_time(tx_phy, 1500, mac)
+        packets.append(create_packet(rand, i, 1500, ifg))
+    return packets
+
+
+def mix_hp_lp(rand, tx_phy, mac, num_frames):
+    """ High and low priority VLAN tagged frames of random sizes at line rate
+    """
+    ifg = tx_phy.get_clock().get_min_ifg()
+    packets = []
+    for i in range(num_frames):
+        priority = rand.choice([HP_PRIORITY, LP_PRIORITY])
+        tag = [0x81, 0x00, priority << 5, 0x00]
+        packets.append(create_packet(rand, i, rand.randint(42, 1500), ifg, vlan_prio_tag=tag))
+    return packets
+
+
+mixes = {
+    "min_size_line_rate": mix_min_size,
+    "imix": mix_imix,
+    "max_size_burst": mix_max_size_burst,
+    "hp_lp_mixed": mix_hp_lp,
+  }
+
+
+class BenchTester(object):
+    """ The DUT output is not checked, drops are measured from the frames received
+    """
+
+    def run(self, output):
+        return True
+
+
+def run_benchmark(capfd, params, mix, num_frames):
+    (mac, phy, clk) = (params["mac"], params["phy"], params["clk"])
+
+    if phy == 'mii':
+        get_rx_clk_phy = get_mii_rx_clk_phy
+        get_tx_clk_phy = get_mii_tx_clk_phy
+    else:
+        get_rx_clk_phy = lambda **kwargs: get_rgmii_rx_clk_phy(clock_rates[clk], **kwargs)
+        get_tx_clk_phy = lambda **kwargs: get_rgmii_tx_clk_phy(clock_rates[clk], **kwargs)
+
+    def count_received(packet, phy):
+        # The packet has already been counted by the metrics collector
+        if phy.get_metrics().get_total().num_frames == num_frames:
+            phy.xsi.terminate()
+
+    (rx_clk, rx_phy) = get_rx_clk_phy(packet_fn=count_received)
+    (tx_clk, tx_phy) = get_tx_clk_phy(compiled=True)
+
+    metrics = MetricsCollector(rx_clk)
+    rx_phy.set_metrics(metrics)
+    tx_phy.set_metrics(metrics)
+
+    packets = mixes[mix](random.Random(1), tx_phy, mac, num_frames)
+    tx_phy.set_packets(packets)
+
+    profile = get_dut_profile(mac, phy)
+    binary = tests_dir / dut / "bin" / profile / f"{dut}_{profile}.xe"
+
+    start_time = time.perf_counter()
+    px.run_on_simulator_(str(binary),
+                         simthreads=[rx_clk, rx_phy, tx_clk, tx_phy, metrics],
+                         tester=BenchTester(),
+                         simargs=get_sim_args(dut, mac, tx_clk, tx_phy, params["arch"]),
+                         do_xe_prebuild=False,
+                         capfd=capfd)
+    wall_time = time.perf_counter() - start_time
+
+    name = f"{mac}-{phy}-{clk}-{mix}"
+    metrics.export(bench_dir / "results" / f"{name}.json", dict(params, mix=mix))
+
+    total = metrics.get_results()["all"]
+    result = {
+        "frames_sent": num_frames,
+        "frames_received": total["frames"],
+        "drops": num_frames - total["frames"],
+        "throughput_mbps": total["throughput_mbps"],
+        "wall_time_s": wall_time,
+      }
+    if "latency_ns" in total:
+        for percentile in ["p50", "p99", "max"]:
+            result[f"latency_{percentile}_ns"] = total["latency_ns"][percentile]
+
+    return (name, result)
+
+
+@pytest.mark.parametrize("mix", list(mixes))
+@pytest.mark.parametrize("params", get_profiles(), ids=["-".join([p["mac"], p["phy"], p["clk"]]) for p in get_profiles()])
+def test_bench_profile(capfd, request, params, mix):
+    profile = get_dut_profile(params["mac"], params["phy"])
+    if profile not in dut_profiles:
+        pytest.skip(f"{dut} has no {profile} build to loop back frames")
+
+    with capfd.disabled():
+        build_if_needed(dut, profile)
+
+    num_frames = request.config.getoption("--bench-frames")
+    (name, result) = run_benchmark(capfd, params, mix, num_frames)
+
+    with capfd.disabled():
+        print(f"{name}: " + ", ".join(f"{k} {v:.6g}" for (k, v) in result.items()))
+
+    if request.config.getoption("--update-baseline"):
+        update_baseline(baseline_file, name, result)
+        return
+
+    baseline = load_baseline(baseline_file)
+    expected = baseline["results"].get(name)
+    if expected is None:
+        pytest.skip(f"No baseline has been recorded for {name}, run with --update-baseline")
+    if expected["frames_sent"] != num_frames:
+        pytest.skip(f"The baseline for {name} was recorded with {expected['frames_sent']} frames")
+
+    regressions = compare(name, result, baseline)
+    assert not regressions, "\n".join(regressions)
@@ -0,0 +1,132 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# Benchmark of the batched receive API. Minimum sized frames are sent at line
+# rate to the test_rx_batch application, which receives them either one at a
+# time with get_packet() or in batches with get_packets(), on the RT MII and the
+# RGMII MACs. The frames received, the drops, the number of receive calls and
+# the time the client spends in them per frame are compared with
+# bench_baseline.json as for bench_profiles.py.
+#
+# Usage (from the tests directory):
+#   pytest -s bench/bench_rx_batch.py [--bench-frames N] [--update-baseline]
+#
+
+import json
+import random
+import sys
+from pathlib import Path
+import Pyxsim as px
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from mii_clock import Clock
+from mii_packet import MiiPacket
+from helpers import tests_dir, build_if_needed, get_sim_args
+from helpers import get_dut_mac_address, get_mii_tx_clk_phy, get_rgmii_tx_clk_phy
+from bench.baseline import load_baseline, compare, update_baseline
+
+bench_dir = Path(__file__).resolve().parent
+baseline_file = bench_dir / "bench_baseline.json"
+
+dut = 'test_rx_batch'
+with open(tests_dir / dut / "test_params.json") as f:
+    dut_profiles = json.load(f)["PROFILES"]
+
+clock_rates = {"25MHz": Clock.CLK_25MHz, "125MHz": Clock.CLK_125MHz}
+
+# The reference timer runs at 100MHz
+TICK_NS = 10
+
+
+class OutputTester(object):
+    """ Keeps the output of the application to be parsed
+    """
+
+    def __init__(self):
+        self.output = []
+
+    def run(self, output):
+        self.output = output
+        return True
+
+
+def parse_output(output):
+    """ Returns the values printed by the application, which are a list of
+        names and values
+    """
+    for line in output:
+        fields = line.split()
+        if fields and fields[0] == "received":
+            return dict(zip(fields[0::2], [int(v) for v in fields[1::2]]))
+    raise RuntimeError("No results in the output of the application:\n" + "".join(output))
+
+
+def get_dut_profile(params):
+    return f'{params["mac"]}_{params["phy"]}_batch{params["batch"]}'
+
+
+def run_benchmark(capfd, params, num_frames):
+    (mac, phy, clk, batch) = (params["mac"], params["phy"], params["clk"], params["batch"])
+
+    if phy == 'mii':
+        (tx_clk, tx_phy) = get_mii_tx_clk_phy(test_ctrl="tile[0]:XS1_PORT_1A",
+                                              expect_loopback=False, compiled=True)
+    else:
+        (tx_clk, tx_phy) = get_rgmii_tx_clk_phy(clock_rates[clk], test_ctrl="tile[0]:XS1_PORT_1A",
+                                                expect_loopback=False, compiled=True)
+
+    rand = random.Random(1)
+    ifg = tx_clk.get_min_ifg()
+    packets = [MiiPacket(rand, dst_mac_addr=get_dut_mac_address(),
+                         create_data_args=['step', (i & 0xff, 46)], inter_frame_gap=ifg)
+               for i in range(num_frames)]
+    tx_phy.set_packets(packets)
+
+    profile = get_dut_profile(params)
+    binary = tests_dir / dut / "bin" / profile / f"{dut}_{profile}.xe"
+
+    tester = OutputTester()
+    px.run_on_simulator_(str(binary),
+                         simthreads=[tx_clk, tx_phy],
+                         tester=tester,
+                         simargs=get_sim_args(dut, mac, tx_clk, tx_phy, params["arch"]),
+                         do_xe_prebuild=False,
+                         capfd=capfd)
+
+    values = parse_output(tester.output)
+    received = values["received"]
+    result = {
+        "frames_sent": num_frames,
+        "frames_received": received,
+        "drops": num_frames - received,
+        "receive_calls": values["calls"],
+        "rx_time_per_frame_ns": values["rx_ticks"] * TICK_NS / received if received else 0,
+      }
+    return (f"rx_batch-{mac}-{phy}-{clk}-batch{batch}", result)
+
+
+@pytest.mark.parametrize("params", dut_profiles, ids=["-".join(list(profile.values())) for profile in dut_profiles])
+def test_bench_rx_batch(capfd, request, params):
+    with capfd.disabled():
+        build_if_needed(dut, get_dut_profile(params))
+
+    num_frames = request.config.getoption("--bench-frames")
+    (name, result) = run_benchmark(capfd, params, num_frames)
+
+    with capfd.disabled():
+        print(f"{name}: " + ", ".join(f"{k} {v:.6g}" for (k, v) in result.items()))
+
+    if request.config.getoption("--update-baseline"):
+        update_baseline(baseline_file, name, result)
+        return
+
+    baseline = load_baseline(baseline_file)
+    expected = baseline["results"].get(name)
+    if expected is None:
+        pytest.skip(f"No baseline has been recorded for {name}, run with --update-baseline")
+    if expected["frames_sent"] != num_frames:
+        pytest.skip(f"The baseline for {name} was recorded with {expected['frames_sent']} frames")
+
+    regressions = compare(name, result, baseline)
+    assert not regressions, "\n".join(regressions)
@@ -0,0 +1,8 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+
+def pytest_addoption(parser):
+    parser.addoption("--update-baseline", action="store_true", default=False,
+                     help="Record the benchmark results as the new baseline")
+    parser.addoption("--bench-frames", type=int, default=200,
+                     help="The number of frames sent by each benchmark")
@@ -0,0 +1,141 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# Opt-in profiling of the Python side of a simulation. Each simulator thread
+# (PHYs, clocks and any test specific threads) is wrapped so that the predicate
+# evaluations of wait(), the calls to wait_until(), the pins driven and sampled
+# and the wall time the thread spends running Python are counted. The threads
+# are only wrapped when profiling is enabled so it costs nothing otherwise.
+#
+
+import time
+
+
+class ThreadStats(object):
+    """ The counts and times for one simulator thread
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.predicate_calls = 0
+        self.predicate_time = 0.0
+        self.wait_until_calls = 0
+        self.drive_calls = 0
+        self.sample_calls = 0
+        self.active_time = 0.0
+        self.sim_time = 0
+
+    def get_python_time(self):
+        """ Returns the wall time spent running this thread's Python code, both in
+            the thread itself and in the predicates evaluated by the simulator
+        """
+        return self.active_time + self.predicate_time
+
+
+class CountingXsi(object):
+    """ Passes calls on to the simulator interface, counting the port accesses
+    """
+
+    def __init__(self, xsi, stats):
+        self._xsi = xsi
+        self._stats = stats
+
+    def drive_port_pins(self, *args, **kwargs):
+        self._stats.drive_calls += 1
+        return self._xsi.drive_port_pins(*args, **kwargs)
+
+    def sample_port_pins(self, *args, **kwargs):
+        self._stats.sample_calls += 1
+        return self._xsi.sample_port_pins(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._xsi, name)
+
+
+class HarnessProfiler(object):
+    """ Collects ThreadStats for the simulator threads it instruments and reports
+        the Python time spent against the simulated time
+    """
+
+    def __init__(self):
+        self._stats = []
+        self._start_time = None
+        self._end_time = None
+
+    def instrument(self, thread):
+        """ Wrap the run, wait and wait_until methods of a simulator thread. The
+            simulator interface is wrapped once the thread starts running.
+        """
+        stats = ThreadStats(type(thread).__name__)
+        self._stats.append(stats)
+
+        run = thread.run
+        wait = thread.wait
+        wait_until = thread.wait_until
+        resumed = [None]
+
+        def suspend():
+            stats.active_time += time.perf_counter() - resumed[0]
+
+        def resume():
+            resumed[0] = time.perf_counter()
+            stats.sim_time = thread.xsi.get_time()
+
+        def profiled_run():
+            thread.xsi = CountingXsi(thread.xsi, stats)
+            resume()
+            try:
+                run()
+            finally:
+                suspend()
+
+        def profiled_wait(fn):
+            def counted(x):
+                stats.predicate_calls += 1
+                start = time.perf_counter()
+                try:
+                    return fn(x)
+                finally:
+                    stats.predicate_time += time.perf_counter() - start
+            suspend()
+            wait(counted)
+            resume()
+
+        def profiled_wait_until(t):
+            stats.wait_until_calls += 1
+            suspend()
+            wait_until(t)
+            resume()
+
+        thread.run = profiled_run
+        thread.wait = profiled_wait
+        thread.wait_until = profiled_wait_until
+        return thread
+
+    def start(self):
+        self._start_time = time.perf_counter()
+
+    def stop(self):
+        self._end_time = time.perf_counter()
+
+    def get_stats(self):
+        return self._stats
+
+    def get_summary(self):
+        """ Returns a table of the counts and times of each thread followed by the
+            totals for the test
+        """
+        lines = [f"{'thread':<20} {'predicates':>11} {'wait_until':>11} {'drives':>10} "
+                 f"{'samples':>10} {'python s':>9}"]
+        for stats in self._stats:
+            lines.append(f"{stats.name:<20} {stats.predicate_calls:>11} {stats.wait_until_calls:>11} "
+                         f"{stats.drive_calls:>10} {stats.sample_calls:>10} {stats.get_python_time():>9.3f}")
+
+        python_time = sum(stats.get_python_time() for stats in self._stats)
+        sim_time = max((stats.sim_time for stats in self._stats), default=0)
+        wall_time = (self._end_time - self._start_time) if self._end_time else 0.0
+        lines.append(f"Python {python_time:.3f} s of {wall_time:.3f} s wall time "
+                     f"for {sim_time/1e9:.3f} us simulated")
+        if sim_time:
+            lines.append(f"Python {python_time / (sim_time/1e9) * 1e3:.3f} ms per simulated us")
+        return "\n".join(lines)
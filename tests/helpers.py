@@ -1,8 +1,14 @@
 # Copyright 2014-2024 XMOS LIMITED.
 # This Software is subject to the terms of the XMOS Public Licence: Version 1.
+import hashlib
+import json
 import os
 import random
+import re
+import subprocess
 import sys
+import time
+from pathlib import Path
 from types import SimpleNamespace
 import Pyxsim as px
 from filelock import FileLock
@@ -11,6 +17,8 @@ import pytest
 from mii_clock import Clock
 from mii_phy import MiiTransmitter, MiiReceiver
 from rgmii_phy import RgmiiTransmitter, RgmiiReceiver
+from streaming_tester import StreamingTester
+from harness_profile import HarnessProfiler
 
 args = SimpleNamespace( trace=False, # Set to True to enable VCD and instruction tracing for debug. Warning - it's about 5x slower with trace on and creates up to ~1GB of log files in tests/logs
                         num_packets=100, # Number of packets in the test
@@ -22,8 +30,25 @@ args = SimpleNamespace( trace=False, # Set to True to enable VCD and instruction
                         weight_tagged=50, # Weight of VLAN tagged traffic'
                         weight_untagged=50, # Weight of non-VLAN tagged traffic
                         max_hp_mbps=1000, # The maximum megabits per second
+                        profile_harness=os.environ.get("HARNESS_PROFILE") == "1", # Report the Python cost of each simulator thread
+                        soak_seed=os.environ.get("SOAK_SEED"), # The seed chosen by the soak runner (soak.py)
+                        soak_packets=os.environ.get("SOAK_PACKETS"), # The indices of the packets to send when minimizing a schedule
+                        soak_metrics=os.environ.get("SOAK_METRICS"), # The file the soak runner collects the metrics of a run from
                         )
 
+class PacketSource(object):
+    """ A re-iterable source of packets. Each iteration calls fn(*args) to create a
+        new iterator over the packets, so a generator function that creates the same
+        packets every time can be consumed by several users without building a list.
+    """
+
+    def __init__(self, fn, *args):
+        self._fn = fn
+        self._args = args
+
+    def __iter__(self):
+        return iter(self._fn(*self._args))
+
 def create_if_needed(folder):
     lock_path = f"{folder}.lock"
     # xdist can cause race conditions so use a lock
@@ -32,6 +57,103 @@ def create_if_needed(folder):
             os.makedirs(folder)
         return folder
 
+def write_if_changed(filename, contents):
+    """ Write a file unless it already has the given contents. An unchanged file is
+        left alone so that its timestamp does not cause the DUT to be rebuilt.
+        Returns True if the file was written.
+    """
+    try:
+        with open(filename) as f:
+            if f.read() == contents:
+                return False
+    except FileNotFoundError:
+        pass
+
+    # Replace the file atomically so that a concurrent build never sees it partially written
+    tmp_filename = f"{filename}.{os.getpid()}.tmp"
+    with open(tmp_filename, "w") as f:
+        f.write(contents)
+    os.replace(tmp_filename, filename)
+    return True
+
+# The root of the tests and the directories that are not part of the DUT sources
+tests_dir = Path(__file__).resolve().parent
+build_output_dirs = {"bin", "build", "__pycache__"}
+
+def get_build_sources(testname):
+    """ Returns the files and directories that a test application is built from
+    """
+    lib_dir = tests_dir.parent / "lib_ethernet"
+    return [lib_dir / "api", lib_dir / "src", lib_dir / "lib_build_info.cmake",
+            tests_dir / "include", tests_dir / "test_deps.cmake", tests_dir / testname]
+
+def hash_build_sources(testname):
+    """ Returns a hash of the contents of all the sources a test application is built from
+    """
+    digest = hashlib.sha256()
+    for path in get_build_sources(testname):
+        if path.is_file():
+            files = [path]
+        else:
+            files = sorted(f for f in path.rglob("*")
+                           if f.is_file() and f.suffix not in (".lock", ".tmp", ".stamp") and
+                           not build_output_dirs.intersection(f.relative_to(path).parts))
+        for f in files:
+            digest.update(str(f.relative_to(tests_dir.parent)).encode())
+            digest.update(b"\0")
+            digest.update(f.read_bytes())
+            digest.update(b"\0")
+    return digest.hexdigest()
+
+def get_app_configs(testname):
+    """ Returns each profile in the test_params.json of a test application with the
+        name of the build config made for it, formed from the profile the way the
+        CMakeLists.txt of the application names its configs
+    """
+    test_dir = tests_dir / testname
+    cmake = (test_dir / "CMakeLists.txt").read_text()
+    match = re.search(r'set\(config\s+"([^"]+)"\)', cmake)
+    if not match:
+        raise ValueError(f"No config name found in {test_dir / 'CMakeLists.txt'}")
+
+    with open(test_dir / "test_params.json") as f:
+        profiles = json.load(f)["PROFILES"]
+    return [(profile, re.sub(r"\$\{(\w+)\}", lambda m: str(profile[m.group(1)]), match.group(1)))
+            for profile in profiles]
+
+def build_if_needed(testname, profile):
+    """ Build the binary for a profile of a test application unless it has already
+        been built from the current sources. Each binary is stamped with the hash of
+        its sources. The sources are hashed, checked against the stamp, built and
+        stamped under a lock for the profile, so the profiles of an application
+        build in parallel. Only configuring the build directory they share is
+        serialized, under a lock for the application.
+    """
+    test_dir = tests_dir / testname
+    binary = test_dir / "bin" / profile / f"{testname}_{profile}.xe"
+    stamp = binary.parent / "sources.stamp"
+
+    (test_dir / "bin").mkdir(exist_ok=True)
+    with FileLock(f"{test_dir}/bin/{profile}.lock"):
+        sources_hash = hash_build_sources(testname)
+        if binary.is_file() and stamp.is_file() and stamp.read_text() == sources_hash:
+            return False
+
+        # The build directory is reconfigured if any of the CMake inputs are newer than it
+        with FileLock(f"{test_dir}/build.lock"):
+            makefile = test_dir / "build" / "Makefile"
+            cmake_inputs = [test_dir / "CMakeLists.txt", test_dir / "test_params.json",
+                            tests_dir / "test_deps.cmake"]
+            if (not makefile.is_file() or
+                    any(f.stat().st_mtime > makefile.stat().st_mtime for f in cmake_inputs if f.is_file())):
+                result = subprocess.run('cmake -B build -G "Unix Makefiles"', shell=True, cwd=test_dir)
+                result.check_returncode()
+
+        result = subprocess.run(f'xmake -j 8 -C build {profile}', shell=True, cwd=test_dir)
+        result.check_returncode()
+        stamp.write_text(sources_hash)
+    return True
+
 # A set of functions to create the clock and phy for tests. This set of functions
 # contains all the port mappings for the different phys.
 def get_mii_rx_clk_phy(packet_fn=None, verbose=False, test_ctrl=None):
@@ -44,7 +166,8 @@ def get_mii_rx_clk_phy(packet_fn=None, verbose=False, test_ctrl=None):
 
 def get_mii_tx_clk_phy(verbose=False, test_ctrl=None, do_timeout=True,
                        complete_fn=None, expect_loopback=True,
-                       dut_exit_time=50000*1e6, initial_delay=85000*1e6):
+                       dut_exit_time=50000*1e6, initial_delay=85000*1e6,
+                       compiled=False):
     clk = Clock('tile[0]:XS1_PORT_1J', Clock.CLK_25MHz)
     phy = MiiTransmitter('tile[0]:XS1_PORT_4E',
                          'tile[0]:XS1_PORT_1K',
@@ -53,7 +176,8 @@ def get_mii_tx_clk_phy(verbose=False, test_ctrl=None, do_timeout=True,
                          verbose=verbose, test_ctrl=test_ctrl,
                          do_timeout=do_timeout, complete_fn=complete_fn,
                          expect_loopback=expect_loopback,
-                         dut_exit_time=dut_exit_time, initial_delay=initial_delay)
+                         dut_exit_time=dut_exit_time, initial_delay=initial_delay,
+                         compiled=compiled)
     return (clk, phy)
 
 def get_rgmii_rx_clk_phy(clk_rate, packet_fn=None, verbose=False, test_ctrl=None):
@@ -66,7 +190,8 @@ def get_rgmii_rx_clk_phy(clk_rate, packet_fn=None, verbose=False, test_ctrl=None
 
 def get_rgmii_tx_clk_phy(clk_rate, verbose=False, test_ctrl=None,
                           do_timeout=True, complete_fn=None, expect_loopback=True,
-                          dut_exit_time=50000*1e6, initial_delay=130000*1e6):
+                          dut_exit_time=50000*1e6, initial_delay=130000*1e6,
+                          compiled=False):
     clk = Clock('tile[1]:XS1_PORT_1O', clk_rate)
     phy = RgmiiTransmitter('tile[1]:XS1_PORT_8A',
                            'tile[1]:XS1_PORT_4E',
@@ -78,12 +203,13 @@ def get_rgmii_tx_clk_phy(clk_rate, verbose=False, test_ctrl=None,
                            verbose=verbose, test_ctrl=test_ctrl,
                            do_timeout=do_timeout, complete_fn=complete_fn,
                            expect_loopback=expect_loopback,
-                           dut_exit_time=dut_exit_time, initial_delay=initial_delay)
+                           dut_exit_time=dut_exit_time, initial_delay=initial_delay,
+                           compiled=compiled)
     return (clk, phy)
 
 
 def run_parametrised_test_rx(capfd, test_fn, params, exclude_standard=False, verbose=False, seed=False):
-    seed = seed if seed else random.randint(0, sys.maxsize)
+    seed = get_seed(seed)
 
     # Test 100 MBit - MII XS2
     if params["phy"] == "mii":
@@ -116,7 +242,13 @@ def do_rx_test(capfd, mac, arch, rx_clk, rx_phy, tx_clk, tx_phy, packets, test_f
                extra_tasks=[], override_dut_dir=False):
 
     """ Shared test code for all RX tests using the test_rx application.
+
+        The packets are iterated separately by the transmitter, the receiver and to
+        create the expect file, so they must be re-iterable: a list or a PacketSource.
     """
+    assert iter(packets) is not packets, "The packets must be re-iterable, use a PacketSource for generators"
+    packets = select_packets(packets)
+
     testname,extension = os.path.splitext(os.path.basename(test_file))
 
     with capfd.disabled():
@@ -136,21 +268,118 @@ def do_rx_test(capfd, mac, arch, rx_clk, rx_phy, tx_clk, tx_phy, packets, test_f
         folder=expect_folder, test=testname, mac=mac, phy=tx_phy.get_name(), clk=tx_clk.get_name(), arch=arch)
     create_expect(packets, expect_filename)
 
-    tester = px.testers.ComparisonTester(open(expect_filename))
+    # Check the output as the simulation runs so that it stops at the first error
+    tester = StreamingTester(open(expect_filename))
+    monitor = tester.get_monitor(capfd)
 
     simargs = get_sim_args(testname, mac, tx_clk, tx_phy, arch)
     # with capfd.disabled():
     #     print(f"simargs {simargs}\n bin: {binary}")
-    result = px.run_on_simulator_(  binary,
-                                    simthreads=[rx_clk, rx_phy, tx_clk, tx_phy] + extra_tasks,
-                                    tester=tester,
-                                    simargs=simargs,
-                                    do_xe_prebuild=False,
-                                    capfd=capfd)
+    result = run_on_simulator(binary,
+                              simthreads=[rx_clk, rx_phy, tx_clk, tx_phy, monitor] + extra_tasks,
+                              tester=tester,
+                              simargs=simargs,
+                              do_xe_prebuild=False,
+                              capfd=capfd)
 
     assert result is True, f"{result}"
 
 
+def run_on_simulator(binary, simthreads, capfd, **kwargs):
+    """ Run a binary on the simulator with the given threads. If args.profile_harness
+        is set then the threads are profiled and a summary is printed at the end.
+        The wall time of the simulation is recorded for the soak runner.
+    """
+    start_time = time.perf_counter()
+    try:
+        if not args.profile_harness:
+            return px.run_on_simulator_(binary, simthreads=simthreads, capfd=capfd, **kwargs)
+
+        profiler = HarnessProfiler()
+        for thread in simthreads:
+            profiler.instrument(thread)
+
+        profiler.start()
+        try:
+            return px.run_on_simulator_(binary, simthreads=simthreads, capfd=capfd, **kwargs)
+        finally:
+            profiler.stop()
+            with capfd.disabled():
+                print(profiler.get_summary())
+    finally:
+        record_soak_metrics(binary=str(binary), sim_wall_time_s=time.perf_counter() - start_time)
+
+
+def get_seed(seed=None):
+    """ Returns the seed for a randomized test. The soak runner chooses the seed
+        through args.soak_seed, otherwise the given seed or a random one is used.
+    """
+    if args.soak_seed:
+        return int(args.soak_seed)
+    return seed if seed else random.randint(0, sys.maxsize)
+
+
+def parse_packet_selection(selection):
+    """ Returns the packet indices in a selection such as "0-9,12,15-20"
+    """
+    indices = []
+    for part in selection.split(","):
+        (first, _, last) = part.partition("-")
+        indices += range(int(first), int(last if last else first) + 1)
+    return indices
+
+
+def format_packet_selection(indices):
+    """ Returns the selection string for a sorted list of packet indices
+    """
+    parts = []
+    for i in indices:
+        if parts and parts[-1][1] == i - 1:
+            parts[-1][1] = i
+        else:
+            parts.append([i, i])
+    return ",".join(f"{a}" if a == b else f"{a}-{b}" for (a, b) in parts)
+
+
+def select_packets(packets):
+    """ Returns the packets to send. The soak runner minimizes a failing schedule
+        by only sending the packets selected by args.soak_packets. The number of
+        packets in the full schedule is recorded so that it knows where to start.
+    """
+    if args.soak_metrics and not args.soak_packets:
+        record_soak_metrics(num_packets=len(packets) if hasattr(packets, "__len__") else
+                                       sum(1 for p in packets))
+
+    if not args.soak_packets:
+        return packets
+
+    indices = parse_packet_selection(args.soak_packets)
+    if hasattr(packets, "select"):
+        return packets.select(indices)
+
+    selected = set(indices)
+    if isinstance(packets, list):
+        return [p for (i, p) in enumerate(packets) if i in selected]
+    return PacketSource(lambda: (p for (i, p) in enumerate(packets) if i in selected))
+
+
+def record_soak_metrics(**metrics):
+    """ Add metrics to those the soak runner collects for this run. Does nothing
+        unless the test is run by the soak runner.
+    """
+    if not args.soak_metrics:
+        return
+
+    try:
+        with open(args.soak_metrics) as f:
+            values = json.load(f)
+    except FileNotFoundError:
+        values = {}
+    values.update(metrics)
+    with open(args.soak_metrics, "w") as f:
+        json.dump(values, f)
+
+
 def create_expect(packets, filename):
     """ Create the expect file for what packets should be reported by the DUT
     """
@@ -208,9 +437,10 @@ def choose_small_frame_size(rand):
     return rand.randint(46, 54)
 
 def move_to_next_valid_packet(phy):
-    while (phy.expect_packet_index < phy.num_expected_packets and
-           phy.expected_packets[phy.expect_packet_index].dropped):
-        phy.expect_packet_index += 1
+    expected = phy.peek_expected_packet()
+    while expected is not None and expected.dropped:
+        phy.pop_expected_packet()
+        expected = phy.peek_expected_packet()
 
 def check_received_packet(packet, phy):
     if phy.expected_packets is None:
@@ -218,29 +448,38 @@ def check_received_packet(packet, phy):
 
     move_to_next_valid_packet(phy)
 
-    if phy.expect_packet_index < phy.num_expected_packets:
-        expected = phy.expected_packets[phy.expect_packet_index]
+    expected = phy.peek_expected_packet()
+    if expected is not None:
         if packet != expected:
-            print(f"ERROR: packet {phy.expect_packet_index} does not match expected packet {expected}")
+            print(f"ERROR: packet {phy.expect_packet_index} does not match expected packet {expected} "
+                  f"(at simulated time {phy.xsi.get_time()/1e6:.0f} ns)")
+            for diff in packet.diff(expected):
+                print(f"  {diff}")
 
             print(f"Received:")
             sys.stdout.write(packet.dump())
             print("Expected:")
             sys.stdout.write(expected.dump())
 
+            # There is no point continuing once the packets are out of step
+            phy.xsi.terminate()
+            return
+
         print(f"Received packet {phy.expect_packet_index} ok")
         # Skip this packet
-        phy.expect_packet_index += 1
+        phy.pop_expected_packet()
 
         # Skip on past any invalid packets
         move_to_next_valid_packet(phy)
 
     else:
-        print(f"ERROR: received unexpected packet from DUT")
+        print(f"ERROR: received unexpected packet from DUT (at simulated time {phy.xsi.get_time()/1e6:.0f} ns)")
         print("Received:")
         sys.stdout.write(packet.dump())
+        phy.xsi.terminate()
+        return
 
-    if phy.expect_packet_index >= phy.num_expected_packets:
+    if phy.peek_expected_packet() is None:
         print("Test done")
         phy.xsi.terminate()
 
@@ -0,0 +1,342 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# A bit-exact model of the MAC address hash filter of the RGMII MAC
+# (lib_ethernet/src/macaddr_filter_hash.c) and an analysis of how it behaves as
+# the number of multicast groups grows, so the table size can be checked
+# without running the simulator. The filter table of the MII MACs
+# (lib_ethernet/src/macaddr_filter.xc) works in the same way, with
+# ETHERNET_MACADDR_FILTER_TABLE_SIZE entries.
+#
+# The filter is a bucketized cuckoo hash table. Each address can be in one of
+# the BUCKET_SIZE slots of the two buckets chosen by the CRC of the address with
+# each of two polynomials, computed with the XS crc32 instruction. When both
+# buckets are full a breadth-first search looks for a path of at most MAX_MOVES
+# moves of other entries to their other buckets that frees a slot, searching at
+# most MAX_SEARCH buckets. If there is none the add fails with
+# ETHERNET_MACADDR_FILTER_TABLE_FULL.
+#
+# Usage (from the tests directory):
+#   python macaddr_hash_model.py [--max-groups N] [--trials N] [--addresses random|avb]
+#                                [--table-size N]
+#
+
+import argparse
+import numpy as np
+
+# default_ethernet_conf.h
+TABLE_SIZE = 256
+MII_TABLE_SIZE = 64
+BUCKET_SIZE = 4
+MAX_MOVES = 3
+MAX_SEARCH = 64
+
+NUM_BUCKETS = TABLE_SIZE // BUCKET_SIZE
+
+POLYS = (0xedb88320, 0xba75fe21)
+
+HP_BIT = 1 << 31
+
+
+def crc32(crc, data, poly):
+    """ The XS crc32 instruction: shift the 32 bits of data into crc, LSB first
+    """
+    for i in range(32):
+        xor_bit = crc & 1
+        crc = (crc >> 1) | ((data & 1) << 31)
+        data >>= 1
+        if xor_bit:
+            crc ^= poly
+    return crc
+
+
+def crc32_array(crc, data, poly):
+    """ The crc32 instruction applied to arrays of values
+    """
+    crc = np.array(crc, dtype=np.uint32)
+    data = np.array(data, dtype=np.uint32)
+    poly = np.uint32(poly)
+    for i in range(32):
+        xor_bit = (crc & 1).astype(bool)
+        crc = (crc >> 1) | ((data & 1) << 31)
+        data = data >> 1
+        crc = np.where(xor_bit, crc ^ poly, crc)
+    return crc
+
+
+def get_keys(addr):
+    """ Returns the two keys of a MAC address, as in entry_to_keys()
+    """
+    key0 = addr[0] | addr[1] << 8 | addr[2] << 16 | addr[3] << 24
+    key1 = addr[4] | addr[5] << 8
+    return (key0, key1)
+
+
+def get_keys_array(addrs):
+    """ Returns the keys of an array of MAC addresses with one address per row
+    """
+    addrs = np.asarray(addrs, dtype=np.uint32)
+    keys0 = addrs[:, 0] | addrs[:, 1] << 8 | addrs[:, 2] << 16 | addrs[:, 3] << 24
+    keys1 = addrs[:, 4] | addrs[:, 5] << 8
+    return (keys0, keys1)
+
+
+def get_hash(key0, key1, poly, num_buckets=NUM_BUCKETS):
+    """ Returns the index of the first slot of the bucket of a key
+    """
+    return (crc32(crc32(key0, key1, poly), 0, poly) & (num_buckets - 1)) * BUCKET_SIZE
+
+
+def get_hash_array(keys0, keys1, poly, num_buckets=NUM_BUCKETS):
+    buckets = crc32_array(crc32_array(keys0, keys1, poly), 0, poly) & (num_buckets - 1)
+    return buckets.astype(np.int64) * BUCKET_SIZE
+
+
+class AddStats(object):
+    """ What it took to add one entry to the filter
+    """
+
+    def __init__(self):
+        self.added = False
+        # The buckets searched for a free slot
+        self.probes = 0
+        # The entries moved to their other bucket
+        self.moves = 0
+
+
+class MacAddrHashFilter(object):
+    """ mii_macaddr_hash_table_t and the operations on it, or
+        eth_global_filter_info_t with a table_size of MII_TABLE_SIZE
+    """
+
+    def __init__(self, table_size=TABLE_SIZE):
+        if table_size % BUCKET_SIZE or (table_size // BUCKET_SIZE) & (table_size // BUCKET_SIZE - 1):
+            raise ValueError(f"The table size {table_size} is not a power of 2 number of buckets")
+        self.table_size = table_size
+        self.num_buckets = table_size // BUCKET_SIZE
+        self.polys = POLYS
+        self.clear()
+        self._hash_cache = {}
+
+    def clear(self):
+        """ mii_macaddr_hash_table_clear()
+        """
+        self.num_entries = 0
+        self.ids = [(0, 0)] * self.table_size
+        self.results = [0] * self.table_size
+        self.appdata = [0] * self.table_size
+
+    def _hashes(self, key):
+        hashes = self._hash_cache.get(key)
+        if hashes is None:
+            hashes = tuple(get_hash(key[0], key[1], poly, self.num_buckets) for poly in self.polys)
+            self._hash_cache[key] = hashes
+        return hashes
+
+    def get_occupancy(self):
+        """ Returns the fraction of the slots that hold an address
+        """
+        return self.num_entries / self.table_size
+
+    def _find_entry(self, key):
+        (x, y) = self._hashes(key)
+        for i in range(BUCKET_SIZE):
+            if self.ids[x + i] == key:
+                return x + i
+            if self.ids[y + i] == key:
+                return y + i
+        return None
+
+    def _get_free_slot(self, bucket):
+        for i in range(BUCKET_SIZE):
+            if self.ids[bucket + i] == (0, 0):
+                return bucket + i
+        return None
+
+    def _on_path(self, nodes, node, bucket):
+        while node is not None:
+            if nodes[node][0] == bucket:
+                return True
+            node = nodes[node][1]
+        return False
+
+    def _insert(self, key, result, appdata, stats):
+        """ insert(): returns True if the entry was added
+        """
+        # Each node is (bucket, parent, slot, depth)
+        nodes = [(bucket, None, 0, 0) for bucket in self._hashes(key)]
+        n = 0
+        while n < len(nodes):
+            (bucket, parent, slot, depth) = nodes[n]
+            stats.probes += 1
+            index = self._get_free_slot(bucket)
+            if index is not None:
+                # Move the entries along the path, starting from the end
+                node = n
+                while nodes[node][1] is not None:
+                    src = nodes[nodes[node][1]][0] + nodes[node][2]
+                    (self.ids[index], self.results[index], self.appdata[index]) = \
+                        (self.ids[src], self.results[src], self.appdata[src])
+                    stats.moves += 1
+                    index = src
+                    node = nodes[node][1]
+                (self.ids[index], self.results[index], self.appdata[index]) = (key, result, appdata)
+                self.num_entries += 1
+                return True
+
+            if depth < MAX_MOVES:
+                for i in range(BUCKET_SIZE):
+                    if len(nodes) == MAX_SEARCH:
+                        break
+                    (x, y) = self._hashes(self.ids[bucket + i])
+                    alt = y if x == bucket else x
+                    if not self._on_path(nodes, n, alt):
+                        nodes.append((alt, n, i, depth + 1))
+            n += 1
+        return False
+
+    def add_entry(self, client_num, is_hp, addr, appdata=0):
+        """ mii_macaddr_hash_table_add_entry(): returns the AddStats of the add
+        """
+        stats = AddStats()
+        key = get_keys(addr)
+        result = (1 << client_num) | (HP_BIT if is_hp else 0)
+
+        index = self._find_entry(key)
+        if index is not None:
+            # Only OR the client into an existing entry
+            self.appdata[index] = appdata
+            self.results[index] |= result
+            stats.added = True
+        else:
+            stats.added = self._insert(key, result, appdata, stats)
+        return stats
+
+    def delete_entry(self, client_num, is_hp, addr):
+        """ mii_macaddr_hash_table_delete_entry()
+        """
+        key = get_keys(addr)
+        if key == (0, 0):
+            return
+        index = self._find_entry(key)
+        if index is None or bool(self.results[index] & HP_BIT) != bool(is_hp):
+            return
+
+        result = self.results[index] & ~(1 << client_num)
+        if result & ~HP_BIT == 0:
+            self.ids[index] = (0, 0)
+            self.num_entries -= 1
+        else:
+            self.results[index] = result
+
+    def lookup(self, addrs):
+        """ mii_macaddr_hash_lookup() for an array of addresses. Returns the arrays
+            of results and appdata, and the number of slots compared to find each
+            address (0 if it is not in the table).
+        """
+        (keys0, keys1) = get_keys_array(addrs)
+        x = get_hash_array(keys0, keys1, self.polys[0], self.num_buckets)
+        y = get_hash_array(keys0, keys1, self.polys[1], self.num_buckets)
+
+        ids = np.array(self.ids, dtype=np.uint32).reshape(self.table_size, 2)
+        results = np.array(self.results, dtype=np.uint32)
+        appdata = np.array(self.appdata, dtype=np.uint32)
+
+        # The slots of the first bucket then the second, in the order compared
+        slots = np.concatenate([x[:, None] + np.arange(BUCKET_SIZE), y[:, None] + np.arange(BUCKET_SIZE)], axis=1)
+        matches = (ids[slots, 0] == keys0[:, None]) & (ids[slots, 1] == keys1[:, None])
+        matches &= ~((keys0 == 0) & (keys1 == 0))[:, None]
+
+        found = matches.any(axis=1)
+        first = matches.argmax(axis=1)
+        slot = slots[np.arange(len(slots)), first]
+        return (np.where(found, results[slot], 0), np.where(found, appdata[slot], 0),
+                np.where(found, first + 1, 0))
+
+
+def random_multicast_addresses(gen, n):
+    """ Returns n different random multicast addresses
+    """
+    addrs = set()
+    while len(addrs) < n:
+        addr = gen.integers(0, 256, 6)
+        addr[0] |= 1
+        addrs.add(tuple(addr.tolist()))
+    return [list(addr) for addr in addrs]
+
+
+def avb_multicast_addresses(gen, n):
+    """ Returns n consecutive addresses from a random base in the MAAP range
+        91:E0:F0:00:00:00 - 91:E0:F0:00:FD:FF, as allocated to AVB streams
+    """
+    base = int(gen.integers(0, 0xfe00 - n + 1))
+    return [[0x91, 0xe0, 0xf0, 0x00, (base + i) >> 8, (base + i) & 0xff] for i in range(n)]
+
+
+def analyze(max_groups, trials, seed=1, addresses=random_multicast_addresses, table_size=TABLE_SIZE):
+    """ Add multicast groups one at a time to a filter and return, for each number
+        of groups, the mean occupancy, mean buckets searched and entries moved by
+        the insert, mean slots compared by a lookup and the rate at which the add
+        failed because the table was full
+    """
+    gen = np.random.default_rng(seed)
+    occupancy = np.zeros((trials, max_groups))
+    probes = np.zeros((trials, max_groups))
+    moves = np.zeros((trials, max_groups))
+    lookup_probes = np.zeros((trials, max_groups))
+    failed = np.zeros((trials, max_groups), dtype=bool)
+
+    for trial in range(trials):
+        hash_filter = MacAddrHashFilter(table_size)
+        addrs = addresses(gen, max_groups)
+        added = []
+        for i in range(max_groups):
+            stats = hash_filter.add_entry(0, False, addrs[i])
+            if stats.added:
+                added.append(addrs[i])
+            (results, appdata, slots) = hash_filter.lookup(added)
+            assert np.all(slots), "An added address was not found"
+
+            occupancy[trial, i] = hash_filter.get_occupancy()
+            probes[trial, i] = stats.probes
+            moves[trial, i] = stats.moves
+            lookup_probes[trial, i] = np.mean(slots)
+            failed[trial, i] = not stats.added
+
+    return {
+        "groups": list(range(1, max_groups + 1)),
+        "occupancy": occupancy.mean(axis=0).tolist(),
+        "insert_probes": probes.mean(axis=0).tolist(),
+        "insert_moves": moves.mean(axis=0).tolist(),
+        "lookup_probes": lookup_probes.mean(axis=0).tolist(),
+        "failure_rate": failed.mean(axis=0).tolist(),
+      }
+
+
+def get_summary(analysis, step=16):
+    """ Returns a table of the analysis every step groups
+    """
+    lines = [f"{'groups':>6} {'occupancy':>10} {'ins probes':>11} {'ins moves':>10} "
+             f"{'lkp probes':>11} {'fail rate':>10}"]
+    for i in range(step - 1, len(analysis["groups"]), step):
+        lines.append(f"{analysis['groups'][i]:>6} {analysis['occupancy'][i]:>10.3f} "
+                     f"{analysis['insert_probes'][i]:>11.2f} {analysis['insert_moves'][i]:>10.2f} "
+                     f"{analysis['lookup_probes'][i]:>11.3f} {analysis['failure_rate'][i]:>10.3f}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Model the MAC address hash filter as groups are added")
+    parser.add_argument("--max-groups", type=int, default=256, help="The number of multicast groups to add")
+    parser.add_argument("--trials", type=int, default=20, help="The number of sets of addresses to try")
+    parser.add_argument("--addresses", choices=["random", "avb"], default="random",
+                        help="Random multicast addresses or consecutive AVB (MAAP) addresses")
+    parser.add_argument("--table-size", type=int, default=TABLE_SIZE,
+                        help=f"The number of entries in the table ({MII_TABLE_SIZE} for the MII MACs)")
+    parser.add_argument("--step", type=int, default=16, help="Report every step groups")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    addresses = avb_multicast_addresses if args.addresses == "avb" else random_multicast_addresses
+    analysis = analyze(args.max_groups, args.trials, args.seed, addresses, args.table_size)
+    print(get_summary(analysis, args.step))
@@ -0,0 +1,186 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# Collect timing metrics for the frames passing through the simulated PHYs. The
+# transmitter reports the start of each frame it sends to the DUT and the receiver
+# reports the end of each frame it receives from the DUT. Frames are identified
+# by a digest of their bytes, so the latency through the DUT is measured for any
+# frame that is looped back. The results are grouped by traffic class and can be
+# exported as JSON for each test profile.
+#
+
+import json
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+import Pyxsim as px
+
+from packet_matcher import packet_digest
+
+
+# The number of bits between frames required by the standard
+MIN_IFG_BITS = 96
+
+# Width of the bins of the IFG histograms in bit times
+IFG_BIN_BITS = 8
+
+
+def vlan_priority_class(packet):
+    """ Returns the traffic class of a packet from its VLAN priority
+    """
+    if packet.vlan_prio_tag and len(packet.vlan_prio_tag) == 4:
+        return f"prio_{packet.vlan_prio_tag[2] >> 5}"
+    return "untagged"
+
+
+class ClassMetrics(object):
+    """ The metrics for the frames of one traffic class
+    """
+
+    def __init__(self):
+        self.num_frames = 0
+        self.num_bytes = 0
+        self.start_time = None
+        self.end_time = None
+        self.latencies = []
+        self.ifgs = []
+
+    def add_frame(self, num_bytes, start_time, end_time, ifg, latency):
+        if self.start_time is None:
+            self.start_time = start_time
+        self.end_time = end_time
+        self.num_frames += 1
+        self.num_bytes += num_bytes
+        if ifg is not None:
+            self.ifgs.append(ifg)
+        if latency is not None:
+            self.latencies.append(latency)
+
+    def get_throughput(self):
+        """ Returns the rate at which frame bytes were received in Mb/s
+        """
+        if not self.num_frames or self.end_time == self.start_time:
+            return 0.0
+        return (self.num_bytes * 8) / (self.end_time - self.start_time) * 1e9
+
+    def get_efficiency(self, bit_time):
+        """ Returns the percentage of the wire time used by the frames and the minimum
+            IFG between them
+        """
+        if not self.num_frames or self.end_time == self.start_time:
+            return 0.0
+        bits = (self.num_bytes * 8) + ((self.num_frames - 1) * MIN_IFG_BITS)
+        return ((bits * bit_time) / (self.end_time - self.start_time)) * 100
+
+    def get_results(self, bit_time):
+        results = {
+            "frames": self.num_frames,
+            "bytes": self.num_bytes,
+            "throughput_mbps": self.get_throughput(),
+            "efficiency_percent": self.get_efficiency(bit_time),
+          }
+
+        if self.latencies:
+            latencies = np.array(self.latencies) / 1e6
+            results["latency_ns"] = {
+                "count": len(latencies),
+                "min": float(latencies.min()),
+                "p50": float(np.percentile(latencies, 50)),
+                "p99": float(np.percentile(latencies, 99)),
+                "max": float(latencies.max()),
+              }
+
+        if self.ifgs:
+            ifg_bits = np.array(self.ifgs) / bit_time
+            bins = (ifg_bits // IFG_BIN_BITS).astype(int) * IFG_BIN_BITS
+            (values, counts) = np.unique(bins, return_counts=True)
+            results["ifg_bits"] = {
+                "min": float(ifg_bits.min()),
+                "p50": float(np.percentile(ifg_bits, 50)),
+                "max": float(ifg_bits.max()),
+                "histogram": {str(v): int(c) for (v, c) in zip(values, counts)},
+              }
+
+        return results
+
+
+class MetricsCollector(px.SimThread):
+    """ Collects the events handed to it by a TxPhy and RxPhy (see set_metrics() on
+        each). It is a simulator thread so that the time of each event can be taken
+        from the simulator when the PHY does not give one.
+
+        The traffic class of each frame is given by class_fn(packet), which defaults
+        to the VLAN priority. The totals over all classes are also kept.
+    """
+
+    ALL_CLASSES = "all"
+
+    def __init__(self, clock, class_fn=vlan_priority_class):
+        self._clock = clock
+        self._class_fn = class_fn
+        self._sent = {}
+        self._classes = {}
+        self._total = ClassMetrics()
+        self._last_end_time = None
+
+    def run(self):
+        # All the work is done as the PHYs report their events
+        pass
+
+    def _now(self, time):
+        return self.xsi.get_time() if time is None else time
+
+    def frame_started(self, packet, time=None):
+        """ Record the start of a frame sent to the DUT
+        """
+        self._sent.setdefault(packet_digest(packet), deque()).append(self._now(time))
+
+    def frame_received(self, packet, time=None):
+        """ Record the end of a frame received from the DUT. If the frame was sent to
+            the DUT then the latency through the DUT is recorded.
+        """
+        end_time = self._now(time)
+
+        # The CRC is not included in the packet bytes
+        num_bytes = len(packet.get_packet_bytes()) + 4
+        start_time = end_time - num_bytes * 8 * self._clock.get_bit_time()
+
+        latency = None
+        digest = packet_digest(packet)
+        sent = self._sent.get(digest)
+        if sent:
+            latency = end_time - sent.popleft()
+            if not sent:
+                del self._sent[digest]
+
+        # Only the gaps between frames received in this run are measured
+        ifg = packet.inter_frame_gap if self._last_end_time is not None else None
+        self._last_end_time = end_time
+
+        frame_class = self._class_fn(packet) if self._class_fn else self.ALL_CLASSES
+        if frame_class not in self._classes:
+            self._classes[frame_class] = ClassMetrics()
+
+        for metrics in (self._total, self._classes[frame_class]):
+            metrics.add_frame(num_bytes, start_time, end_time, ifg, latency)
+
+    def get_total(self):
+        """ Returns the ClassMetrics for the frames of all classes
+        """
+        return self._total
+
+    def get_results(self):
+        bit_time = self._clock.get_bit_time()
+        classes = {name: metrics.get_results(bit_time) for (name, metrics) in self._classes.items()}
+        classes[self.ALL_CLASSES] = self._total.get_results(bit_time)
+        return classes
+
+    def export(self, filename, profile):
+        """ Write the results as JSON along with the profile (mac/phy/clk) they are for
+        """
+        filename = Path(filename)
+        filename.parent.mkdir(parents=True, exist_ok=True)
+        with open(filename, "w") as f:
+            json.dump({"profile": profile, "classes": self.get_results()}, f, indent=2)
+            f.write("\n")
@@ -0,0 +1,422 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# A discrete-event model of the receive buffering of the MII real-time MAC, so
+# that buffer sizes can be chosen for a traffic profile without running the
+# simulator. It models the structures of lib_ethernet/src/mii_buffering.c as they
+# are used by mii_master.xc, mii_filter.xc and mii_ethernet_rt_mac.xc:
+#
+#  - the circular mempool that frames are written into (mii_reserve(),
+#    mii_commit() and last_safe_wrptr), in words from the start of the buffer,
+#  - the high and low priority packet queues of ETHERNET_NUM_PACKET_POINTERS
+#    pointers, which are freed out of order,
+#  - the queue of ETHERNET_RX_CLIENT_QUEUE_SIZE packets for each LP client and
+#    the dropping of LP packets when less than MII_RX_THRESHOLD_BYTES are free.
+#
+# The frames are replayed at their arrival times. Each LP client takes its
+# packets at its own drain rate and the HP client is streamed each packet at its
+# rate, which blocks the server as sout_char_array() does. The filter is assumed
+# to keep up, so frames go straight from the receiver to the packet queues, and
+# the server runs after every event.
+#
+# The model reports the drops of each kind, the worst-case occupancy of the
+# mempool, the space lost to fragmentation (freed packets that are behind the
+# oldest packet still in use, and the space skipped at the end of the buffer)
+# and any HP packets overwritten because the shared read pointer only follows
+# the LP queue while it has packets.
+#
+
+import heapq
+import numpy as np
+
+from traffic import PREAMBLE_BYTES, CRC_BYTES
+
+# mii_buffering_defines.h and mii_buffering.c
+MII_PACKET_HEADER_WORDS = 10
+MEMPOOL_INFO_BYTES = 20
+MIN_USAGE = 4 * MII_PACKET_HEADER_WORDS + 4 + 12
+
+# default_ethernet_conf.h and mii_ethernet_rt_mac.xc
+ETHERNET_NUM_PACKET_POINTERS = 32
+ETHERNET_RX_CLIENT_QUEUE_SIZE = 4
+MII_RX_THRESHOLD_BYTES = 2000
+
+HP_CLIENT = 0
+
+
+class Frame(object):
+    """ A frame received by the MAC. num_bytes does not include the preamble or
+        CRC. The filter passes the frame to the clients in the clients bitmask,
+        through the HP queue if is_hp is set.
+    """
+
+    def __init__(self, start, end, num_bytes, is_hp, clients):
+        self.start = start
+        self.end = end
+        self.num_bytes = num_bytes
+        self.is_hp = is_hp
+        self.clients = clients
+
+
+def frames_from_schedule(schedule, bit_time, filter_fn):
+    """ Returns the Frames of a TrafficSchedule. filter_fn(class_name) returns the
+        (is_hp, clients) filter result of the frames of each class.
+    """
+    num_bytes = schedule.get_num_bytes()
+    durations = (num_bytes + PREAMBLE_BYTES + CRC_BYTES) * 8 * bit_time
+    starts = np.cumsum(schedule.get_ifgs()) + np.cumsum(durations) - durations
+    results = {}
+    frames = []
+    for (name, start, duration, n) in zip(schedule.get_class_names(), starts.tolist(),
+                                          durations.tolist(), num_bytes.tolist()):
+        if name not in results:
+            results[name] = filter_fn(name)
+        (is_hp, clients) = results[name]
+        frames.append(Frame(start, start + duration, n, is_hp, clients))
+    return frames
+
+
+class Mempool(object):
+    """ mempool_info_t with the pointers as word offsets from the start
+    """
+
+    def __init__(self, size_bytes):
+        # The last word holds the pointer back to the start
+        self.num_words = (size_bytes - MEMPOOL_INFO_BYTES - 4) // 4
+        self.last_safe_wrptr = self.num_words - (MIN_USAGE + 3) // 4
+        self.wrptr = 0
+
+    def get_distance(self, from_ptr, to_ptr):
+        """ Returns the words from one pointer to another, going forwards
+        """
+        return (to_ptr - from_ptr) % self.num_words
+
+    def reserve(self, rdptr):
+        """ mii_reserve(): returns the end pointer that the frame must not reach,
+            False for the dummy buffer or None if there is no limit
+        """
+        if rdptr is None:
+            return None
+        if rdptr > self.wrptr and (rdptr - self.wrptr) * 4 < MIN_USAGE:
+            return False
+        return rdptr
+
+    def reserve_at_least(self, rdptr, min_bytes):
+        """ mii_reserve_at_least(): returns True if there are min_bytes free
+        """
+        if rdptr is None:
+            return True
+        space_left = rdptr - self.wrptr
+        if space_left <= 0:
+            space_left += self.num_words
+        return space_left * 4 >= min_bytes
+
+    def write(self, end_ptr, num_words):
+        """ Write num_words of data after the header at wrptr, stopping at the end
+            pointer. Returns the pointer after the data or None if the frame does
+            not fit.
+        """
+        if end_ptr is False:
+            return None
+        dptr = self.wrptr + MII_PACKET_HEADER_WORDS
+        if end_ptr is not None and self.get_distance(dptr, end_ptr) <= num_words:
+            return None
+        return (dptr + num_words) % self.num_words
+
+    def commit(self, end_ptr):
+        """ mii_commit(): returns the number of words skipped at the end
+        """
+        skipped = 0
+        if end_ptr > self.last_safe_wrptr:
+            skipped = self.num_words - end_ptr
+            end_ptr = 0
+        self.wrptr = end_ptr
+        return skipped
+
+
+class PacketQueue(object):
+    """ packet_queue_info_t, holding the packets rather than pointers to them
+    """
+
+    def __init__(self):
+        self.rd_index = 0
+        self.wr_index = 0
+        self.ptrs = [None] * ETHERNET_NUM_PACKET_POINTERS
+
+    def _increment(self, index):
+        return (index + 1) % ETHERNET_NUM_PACKET_POINTERS
+
+    def is_full(self):
+        return self.ptrs[self.wr_index] is not None
+
+    def add(self, packet):
+        self.ptrs[self.wr_index] = packet
+        self.wr_index = self._increment(self.wr_index)
+
+    def move_my_rd_index(self, rd_index):
+        while True:
+            rd_index = self._increment(rd_index)
+            if rd_index == self.wr_index or self.ptrs[rd_index] is not None:
+                return rd_index
+
+    def free_index(self, index):
+        if self.rd_index == index:
+            self.rd_index = self.move_my_rd_index(index)
+        self.ptrs[index] = None
+        return self.rd_index
+
+    def get_my_next_buf(self, rd_index):
+        if self.rd_index == self.wr_index:
+            return None
+        return self.ptrs[rd_index]
+
+    def get_rdptr(self):
+        packet = self.ptrs[self.rd_index]
+        return packet.ptr if packet else None
+
+    def get_num_packets(self):
+        return sum(1 for p in self.ptrs if p is not None)
+
+
+class Packet(object):
+    """ A frame held in the mempool
+    """
+
+    def __init__(self, frame, ptr, num_words):
+        self.frame = frame
+        self.ptr = ptr
+        self.num_words = num_words
+        self.tcount = 0
+
+
+class Client(object):
+    """ An LP client, with its queue of packet indices and the packet it is reading
+    """
+
+    def __init__(self, drain_mbps):
+        self.drain_mbps = drain_mbps
+        self.fifo = []
+        self.reading = None
+        self.received = 0
+        self.dropped = 0
+
+
+class MiiRxBufferModel(object):
+    """ The receive buffering of mii_ethernet_rt_mac(). rx_bufsize_words is the
+        size of the receive buffer, lp_drain_mbps the rate at which each LP client
+        takes its packets and hp_drain_mbps the rate the HP client is streamed
+        packets at (None if the HP client is not connected, in which case the
+        filter does not pass any frames to the HP queue).
+    """
+
+    def __init__(self, rx_bufsize_words, lp_drain_mbps, hp_drain_mbps=None):
+        self.mempool = Mempool(rx_bufsize_words * 4)
+        self.lp_queue = PacketQueue()
+        self.hp_queue = PacketQueue()
+        self.clients = [Client(mbps) for mbps in lp_drain_mbps]
+        self.hp_drain_mbps = hp_drain_mbps
+        self.hp_received = 0
+
+        self._rd_index_lp = 0
+        self._rd_index_hp = 0
+        self._rdptr = None
+        self._server_busy_until = 0
+        self._hp_streaming = False
+        self._live = set()
+
+        self.drops = {"no_buffer": 0, "hp_queue_full": 0, "lp_queue_full": 0,
+                      "client_queue_full": 0, "threshold": 0}
+        self.overwritten = 0
+        self.max_occupancy_bytes = 0
+        self.max_fragmented_bytes = 0
+        self.skipped_bytes = 0
+        self.max_hp_queue = 0
+        self.max_lp_queue = 0
+
+    def _get_drain_time(self, num_bytes, mbps):
+        # 1 Mb/s is one bit every 1e9 fs
+        return num_bytes * 8 * 1e9 / mbps if mbps else 0
+
+    def _free(self, queue, index):
+        self._live.discard(queue.ptrs[index])
+        return queue.free_index(index)
+
+    def _update_rdptr(self):
+        # mii_get_next_rdptr(): the LP packets are assumed to be the oldest
+        rdptr = self.lp_queue.get_rdptr()
+        self._rdptr = rdptr if rdptr is not None else self.hp_queue.get_rdptr()
+
+    def _handle_incoming_packet(self):
+        """ handle_incoming_packet(): pass the next LP packet to the clients
+        """
+        packet = self.lp_queue.get_my_next_buf(self._rd_index_lp)
+        if packet is None:
+            return False
+
+        tcount = 0
+        for (i, client) in enumerate(self.clients):
+            if not (packet.frame.clients >> i) & 1:
+                continue
+            in_use = len(client.fifo) + (client.reading is not None)
+            if in_use < ETHERNET_RX_CLIENT_QUEUE_SIZE - 1:
+                client.fifo.append(self._rd_index_lp)
+                tcount += 1
+            else:
+                client.dropped += 1
+                self.drops["client_queue_full"] += 1
+
+        if tcount == 0:
+            self._free(self.lp_queue, self._rd_index_lp)
+        else:
+            packet.tcount = tcount - 1
+        self._rd_index_lp = self.lp_queue.move_my_rd_index(self._rd_index_lp)
+        return True
+
+    def _release(self, index):
+        """ mii_get_and_dec_transmit_count() and free the packet if it was the last
+        """
+        packet = self.lp_queue.ptrs[index]
+        if packet.tcount:
+            packet.tcount -= 1
+        else:
+            self._free(self.lp_queue, index)
+
+    def _drop_lp_packets(self):
+        dropped = False
+        for client in self.clients:
+            if client.fifo:
+                self._release(client.fifo.pop(0))
+                client.dropped += 1
+                self.drops["threshold"] += 1
+                dropped = True
+        return dropped
+
+    def _poll(self, time, events):
+        """ Run the server loop until there is nothing more it can do
+        """
+        if time < self._server_busy_until:
+            return
+        if self._hp_streaming:
+            self._hp_streaming = False
+            self.hp_received += 1
+            self._rd_index_hp = self._free(self.hp_queue, self._rd_index_hp)
+
+        while True:
+            progress = False
+            if self.hp_drain_mbps is not None:
+                packet = self.hp_queue.get_my_next_buf(self._rd_index_hp)
+                if packet is not None:
+                    if (packet.frame.clients >> HP_CLIENT) & 1:
+                        # The server is blocked while the packet is streamed
+                        self._hp_streaming = True
+                        self._server_busy_until = time + self._get_drain_time(packet.frame.num_bytes,
+                                                                               self.hp_drain_mbps)
+                        heapq.heappush(events, (self._server_busy_until, 1, "server", 0))
+                        self._update_rdptr()
+                        return
+                    self._rd_index_hp = self._free(self.hp_queue, self._rd_index_hp)
+                    progress = True
+
+            progress |= self._handle_incoming_packet()
+            self._update_rdptr()
+
+            if self.hp_drain_mbps is not None:
+                lp_rdptr = self.lp_queue.get_rdptr()
+                if not self.mempool.reserve_at_least(lp_rdptr, MII_RX_THRESHOLD_BYTES):
+                    progress |= self._drop_lp_packets()
+                    self._update_rdptr()
+
+            for (i, client) in enumerate(self.clients):
+                if client.reading is None and client.fifo:
+                    client.reading = client.fifo.pop(0)
+                    packet = self.lp_queue.ptrs[client.reading]
+                    done = time + self._get_drain_time(packet.frame.num_bytes, client.drain_mbps)
+                    heapq.heappush(events, (done, 2, "client", i))
+
+            if not progress:
+                return
+
+    def _receive(self, frame, end_ptr):
+        """ The end of a frame: write it into the mempool and queue it
+        """
+        mempool = self.mempool
+        ptr = mempool.wrptr
+        # Every full word of the frame and CRC is stored
+        data_end = mempool.write(end_ptr, (frame.num_bytes + CRC_BYTES) // 4)
+        if data_end is None:
+            self.drops["no_buffer"] += 1
+            return
+
+        # Any packet still in use that the frame has been written over is corrupted
+        num_words = mempool.get_distance(ptr, data_end) or mempool.num_words
+        for packet in list(self._live):
+            if (mempool.get_distance(ptr, packet.ptr) < num_words or
+                    mempool.get_distance(packet.ptr, ptr) < packet.num_words):
+                self.overwritten += 1
+                self._live.discard(packet)
+
+        self.skipped_bytes += 4 * mempool.commit(data_end)
+        packet = Packet(frame, ptr, mempool.get_distance(ptr, mempool.wrptr) or mempool.num_words)
+
+        queue = self.hp_queue if frame.is_hp else self.lp_queue
+        if queue.is_full():
+            self.drops["hp_queue_full" if frame.is_hp else "lp_queue_full"] += 1
+            return
+        queue.add(packet)
+        self._live.add(packet)
+        self.max_hp_queue = max(self.max_hp_queue, self.hp_queue.get_num_packets())
+        self.max_lp_queue = max(self.max_lp_queue, self.lp_queue.get_num_packets())
+
+        # The space between the oldest packet and the write pointer
+        self._update_rdptr()
+        used = mempool.get_distance(self._rdptr, mempool.wrptr) or mempool.num_words
+        live = sum(p.num_words for p in self._live)
+        self.max_occupancy_bytes = max(self.max_occupancy_bytes, 4 * used)
+        self.max_fragmented_bytes = max(self.max_fragmented_bytes, 4 * max(used - live, 0))
+
+    def run(self, frames):
+        """ Replay the frames and return the results
+        """
+        events = []
+        for (i, frame) in enumerate(frames):
+            events.append((frame.start, 0, "start", i))
+        heapq.heapify(events)
+        reservations = {}
+
+        while events:
+            (time, priority, kind, data) = heapq.heappop(events)
+            if kind == "start":
+                # The receiver reserves space with the read pointer at the start of the frame
+                reservations[data] = self.mempool.reserve(self._rdptr)
+                heapq.heappush(events, (frames[data].end, 0, "end", data))
+            elif kind == "end":
+                self._receive(frames[data], reservations.pop(data))
+            elif kind == "client":
+                client = self.clients[data]
+                self._release(client.reading)
+                client.reading = None
+                client.received += 1
+            self._poll(time, events)
+
+        return self.get_results(len(frames))
+
+    def get_results(self, num_frames):
+        return {
+            "frames": num_frames,
+            "hp_received": self.hp_received,
+            "lp_received": [client.received for client in self.clients],
+            "drops": dict(self.drops),
+            "overwritten": self.overwritten,
+            "max_occupancy_bytes": self.max_occupancy_bytes,
+            "max_fragmented_bytes": self.max_fragmented_bytes,
+            "skipped_bytes": self.skipped_bytes,
+            "max_hp_queue": self.max_hp_queue,
+            "max_lp_queue": self.max_lp_queue,
+          }
+
+
+def sweep(frames, rx_bufsize_words, lp_drain_mbps, hp_drain_mbps=None):
+    """ Returns the results of the frames for each of a list of buffer sizes
+    """
+    return {size: MiiRxBufferModel(size, lp_drain_mbps, hp_drain_mbps).run(frames)
+            for size in rx_bufsize_words}
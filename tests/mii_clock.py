@@ -29,17 +29,54 @@ class Clock(px.SimThread):
             self._name = '2.5Mhz'
             self._bit_time = 100*1e6
         self._min_ifg = 96 * self._bit_time
+        self._half_period = self._period / 2
         self._val = 0
         self._port = port
 
+        # The time of edge 0 of the clock. The clock keeps toggling while it is
+        # stopped so all edge times are relative to this reference.
+        self._phase_ref = 0
+
     def run(self):
+        self._phase_ref = self.xsi.get_time()
+        edge = 0
         while True:
-            self.wait_until(self.xsi.get_time() + self._period/2)
+            edge += 1
+            self.wait_until(self.edge_time(edge))
             self._val = 1 - self._val
 
             if self._running:
                 self.xsi.drive_port_pins(self._port, self._val)
 
+    def edge_time(self, n):
+        """ Returns the time of edge n of the clock. The clock starts low so odd
+            edges are rising and even edges are falling.
+        """
+        return self._phase_ref + n * self._half_period
+
+    def edge_index(self, t):
+        """ Returns the index of the last edge at or before time t
+        """
+        return int((t - self._phase_ref) // self._half_period)
+
+    def next_rising_edge(self, t):
+        """ Returns the time of the first rising edge strictly after time t
+        """
+        n = self.edge_index(t) + 1
+        return self.edge_time(n | 1)
+
+    def next_falling_edge(self, t):
+        """ Returns the time of the first falling edge strictly after time t
+        """
+        n = self.edge_index(t) + 1
+        return self.edge_time(n + (n & 1))
+
+    def is_high_at(self, t):
+        """ Returns whether the clock is high at time t. The clock is considered
+            to have changed value at the time of an edge.
+        """
+        return (self.edge_index(t) & 1) == 1
+
     def is_high(self):
         return (self._val == 1)
 
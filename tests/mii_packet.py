@@ -1,10 +1,7 @@
 # Copyright 2014-2024 XMOS LIMITED.
 # This Software is subject to the terms of the XMOS Public Licence: Version 1.
 
-import Pyxsim as px
-import sys
 import zlib
-import random
 
 
 # Functions for creating the data contents of packets
@@ -38,6 +35,36 @@ def create_data_expect_same(args):
     return "Value = {0}\n".format(value)
 
 
+# Translation tables to split bytes into the nibbles sent on the wire
+_LOW_NIBBLES = bytes(i & 0xf for i in range(256))
+_HIGH_NIBBLES = bytes(i >> 4 for i in range(256))
+
+
+class _WireField(object):
+    """ A packet field that is part of the wire encoding. Assigning to the field
+        invalidates the cached encoding of the packet. Byte fields are stored as
+        bytearrays and values are converted on assignment so that tests can
+        continue to pass lists of ints for the packet fields.
+    """
+
+    def __init__(self, is_bytes=False):
+        self._is_bytes = is_bytes
+
+    def __set_name__(self, owner, name):
+        self._slot = '_' + name
+
+    def __get__(self, packet, owner=None):
+        if packet is None:
+            return self
+        return getattr(packet, self._slot)
+
+    def __set__(self, packet, value):
+        if self._is_bytes and value is not None:
+            value = bytearray(value)
+        setattr(packet, self._slot, value)
+        packet._encoding = None
+
+
 class MiiPacket(object):
     """ The MiiPacket class contains all the data to represent a packet on the wire.
         This includes the inter-frame gap (IFG), preamble and CRC.
@@ -45,26 +72,51 @@ class MiiPacket(object):
         The packet structure is able to represent both valid and invalid packets
         for the purpose of testing.
 
+        The header fields, preamble and data are held as bytearrays and the class
+        uses __slots__ so that large packet corpora can be held in memory.
+
+        The packet bytes, CRC and nibble stream are computed once and cached. The
+        cache is invalidated by assigning to a field or using one of the mutating
+        methods. Modifying one of the bytearrays in place is not detected.
     """
 
     # The maximum payload value (1500 bytes)
     MAX_ETHER_LEN = 0x5dc
 
+    __slots__ = ('dropped', 'num_preamble_nibbles', 'num_data_bytes',
+                 'inter_frame_gap', 'seed', 'create_data_args', 'send_header',
+                 'nibble', 'packet_crc', 'error_nibbles', '_encoding',
+                 '_sfd_nibble', '_send_crc_word', '_corrupt_crc', '_extra_nibble',
+                 '_preamble_nibbles', '_dst_mac_addr', '_src_mac_addr',
+                 '_vlan_prio_tag', '_ether_len_type', '_data_bytes')
+
+    sfd_nibble = _WireField()
+    send_crc_word = _WireField()
+    corrupt_crc = _WireField()
+    extra_nibble = _WireField()
+    preamble_nibbles = _WireField(is_bytes=True)
+    dst_mac_addr = _WireField(is_bytes=True)
+    src_mac_addr = _WireField(is_bytes=True)
+    vlan_prio_tag = _WireField(is_bytes=True)
+    ether_len_type = _WireField(is_bytes=True)
+    data_bytes = _WireField(is_bytes=True)
+
     def __init__(self, rand, **kwargs):
         blank = kwargs.pop('blank', False)
 
         self.dropped = False
+        self._encoding = None
 
         if blank:
             self.num_preamble_nibbles = 0
             self.sfd_nibble = 0
             self.num_data_bytes = 0
             self.inter_frame_gap = 0.0
-            self.dst_mac_addr = []
-            self.src_mac_addr = []
-            self.vlan_prio_tag = []
-            self.ether_len_type = []
-            self.data_bytes = []
+            self.dst_mac_addr = b''
+            self.src_mac_addr = b''
+            self.vlan_prio_tag = b''
+            self.ether_len_type = b''
+            self.data_bytes = b''
         else:
             self.num_preamble_nibbles = 15
             self.sfd_nibble = 0xd
@@ -94,7 +146,7 @@ class MiiPacket(object):
 
         # Preamble nibbles - define valid preamble by default
         if self.preamble_nibbles is None:
-            self.preamble_nibbles = [0x5 for x in range(self.num_preamble_nibbles)]
+            self.preamble_nibbles = b'\x05' * self.num_preamble_nibbles
 
         # Destination MAC address - use a random one if not user-defined
         if self.dst_mac_addr is None:
@@ -133,62 +185,104 @@ class MiiPacket(object):
         return self.inter_frame_gap
 
     def set_ifg(self, inter_frame_gap):
+        # The IFG is not part of the encoding, so the cache is kept
         self.inter_frame_gap = inter_frame_gap
 
-    def get_packet_bytes(self):
-        """ Returns all the data bytes of the packet. This does not include preamble or CRC
+    def _get_encoding(self):
+        """ Returns the [packet bytes, CRC, nibbles] encoding of the packet,
+            computing it if it is not already cached. The nibbles are only
+            filled in when they are first requested.
         """
-        packet_bytes = []
+        encoding = self._encoding
+        if encoding is not None:
+            return encoding
+
         if self.vlan_prio_tag:
-            packet_bytes = self.dst_mac_addr + self.src_mac_addr + self.vlan_prio_tag + \
-                                         self.ether_len_type + self.data_bytes
+            packet_bytes = b''.join((self.dst_mac_addr, self.src_mac_addr, self.vlan_prio_tag,
+                                     self.ether_len_type, self.data_bytes))
         else:
-            packet_bytes = self.dst_mac_addr + self.src_mac_addr + \
-                                         self.ether_len_type + self.data_bytes
+            packet_bytes = b''.join((self.dst_mac_addr, self.src_mac_addr,
+                                     self.ether_len_type, self.data_bytes))
+
+        crc = zlib.crc32(packet_bytes) & 0xFFFFFFFF
+        if self.corrupt_crc:
+            crc = ~crc & 0xFFFFFFFF
+
+        encoding = self._encoding = [packet_bytes, crc, None]
+        return encoding
+
+    def get_packet_bytes(self):
+        """ Returns all the data bytes of the packet. This does not include preamble or CRC
+        """
+        return self._get_encoding()[0]
+
+    def get_frame_bytes(self):
+        """ Returns the bytes of the packet as sent after the SFD. This includes
+            the CRC if it is being sent.
+        """
+        (packet_bytes, crc, nibbles) = self._get_encoding()
+        if self.send_crc_word:
+            return packet_bytes + crc.to_bytes(4, 'little')
         return packet_bytes
 
-    def get_crc(self, packet_bytes):
+    def get_crc(self, packet_bytes=None):
         # Finally the CRC
-        data = bytes(self.get_packet_bytes())
-        crc = zlib.crc32(data) & 0xFFFFFFFF
+        if packet_bytes is None:
+            return self._get_encoding()[1]
+
+        crc = zlib.crc32(packet_bytes) & 0xFFFFFFFF
         if self.corrupt_crc:
-            crc = ~crc
+            crc = ~crc & 0xFFFFFFFF
         return crc
 
+    def get_num_nibbles(self):
+        """ Returns the number of nibbles sent on the wire for this packet without
+            building the nibble stream.
+        """
+        num_nibbles = len(self.preamble_nibbles) + 2 * len(self.get_packet_bytes())
+        if self.sfd_nibble is not None:
+            num_nibbles += 1
+        if self.send_crc_word:
+            num_nibbles += 8
+        if self.extra_nibble:
+            num_nibbles += 1
+        return num_nibbles
+
     def get_packet_time(self, bit_time):
-        data_time = len(self.get_nibbles()) * 4 * bit_time
+        data_time = self.get_num_nibbles() * 4 * bit_time
         return data_time + self.inter_frame_gap
 
     def get_nibbles(self):
-        nibbles = []
+        encoding = self._get_encoding()
+        if encoding[2] is not None:
+            return encoding[2]
 
-        for nibble in self.preamble_nibbles:
-            nibbles.append(nibble)
+        nibbles = bytearray(self.preamble_nibbles)
 
         if self.sfd_nibble is not None:
             nibbles.append(self.sfd_nibble)
 
-        packet_bytes = self.get_packet_bytes()
-        for byte in packet_bytes:
-            nibbles.append(byte & 0xf)
-            nibbles.append((byte>>4) & 0xf)
+        # Each byte is sent low nibble first
+        wire_bytes = self.get_frame_bytes()
 
-        if self.send_crc_word:
-            crc = self.get_crc(packet_bytes)
-            for i in range(0, 8):
-                nibbles.append((crc >> (4*i)) & 0xf)
+        start = len(nibbles)
+        nibbles.extend(bytes(2 * len(wire_bytes)))
+        nibbles[start::2] = wire_bytes.translate(_LOW_NIBBLES)
+        nibbles[start+1::2] = wire_bytes.translate(_HIGH_NIBBLES)
 
         # Add an extra random nibble for alignment test
         if self.extra_nibble:
             nibbles.append(self.extra_nibble)
 
-        return nibbles
+        encoding[2] = bytes(nibbles)
+        return encoding[2]
 
     def append_preamble_nibble(self, nibble):
         if self.preamble_nibbles is None:
             self.preamble_nibbles = []
         self.preamble_nibbles.append(nibble)
         self.num_preamble_nibbles = len(self.preamble_nibbles)
+        self._encoding = None
 
     def set_sfd_nibble(self, nibble):
         self.sfd_nibble = nibble
@@ -207,6 +301,8 @@ class MiiPacket(object):
         self.append_data_byte(byte)
 
     def append_data_byte(self, byte):
+        self._encoding = None
+
         if len(self.dst_mac_addr) < 6:
             self.dst_mac_addr.append(byte)
             return
@@ -238,12 +334,12 @@ class MiiPacket(object):
         """ When a packet has been fully received then move the CRC from the data
         """
         if len(self.data_bytes) >= 4:
-            self.packet_crc = (self.data_bytes[-4] + (self.data_bytes[-3] << 8) +
-                              (self.data_bytes[-2] << 16) + (self.data_bytes[-1] << 24))
+            self.packet_crc = int.from_bytes(self.data_bytes[-4:], 'little')
         else:
             self.packet_crc = 0
-        self.data_bytes = self.data_bytes[:-4]
+        del self.data_bytes[-4:]
         self.num_data_bytes -= 4
+        self._encoding = None
 
     def get_error_nibbles(self):
         return self.error_nibbles
@@ -279,9 +375,12 @@ class MiiPacket(object):
                 if len_type > self.num_data_bytes:
                     print(f"ERROR: len/type field value ({len_type}) != packet bytes ({self.num_data_bytes})")
 
-        # Check the CRC
-        data = bytes(self.get_packet_bytes())
-        expected_crc = zlib.crc32(data) & 0xFFFFFFFF
+        # Check the CRC. For frames from a FrameAssembler with a valid CRC this is
+        # already cached
+        if self.corrupt_crc:
+            expected_crc = zlib.crc32(self.get_packet_bytes()) & 0xFFFFFFFF
+        else:
+            expected_crc = self.get_crc()
 
         # UNH-IOL MAC Test 4.2.3
         if self.packet_crc != expected_crc:
@@ -310,8 +409,8 @@ class MiiPacket(object):
             output += "0x{0:0>2x}, ".format(x)
         output += "\n]\n"
         if self.send_crc_word:
-            crc = self.get_crc(self.get_packet_bytes())
-            output += "CRC: 0x{0:0>8x}".format(crc & 0xffffffff)
+            crc = self.get_crc()
+            output += "CRC: 0x{0:0>8x}".format(crc)
             if show_ifg:
                 output += ", IFG: {i}\n".format(i=self.inter_frame_gap)
             else:
@@ -331,6 +430,28 @@ class MiiPacket(object):
         return "{0} preamble nibbles, {1} data bytes".format(
             self.num_preamble_nibbles, len(self.data_bytes))
 
+    def diff(self, other):
+        """ Returns a list describing each field that differs from the other packet
+        """
+        diffs = []
+        for field in ['dst_mac_addr', 'src_mac_addr', 'vlan_prio_tag', 'ether_len_type']:
+            value = getattr(self, field) or b''
+            other_value = getattr(other, field) or b''
+            if value != other_value:
+                diffs.append("{0}: [{1}] != [{2}]".format(field,
+                    " ".join(["0x{0:0>2x}".format(i) for i in value]),
+                    " ".join(["0x{0:0>2x}".format(i) for i in other_value])))
+
+        if self.data_bytes != other.data_bytes:
+            if len(self.data_bytes) != len(other.data_bytes):
+                diffs.append(f"data_bytes: length {len(self.data_bytes)} != {len(other.data_bytes)}")
+            for (i, (a, b)) in enumerate(zip(self.data_bytes, other.data_bytes)):
+                if a != b:
+                    diffs.append(f"data_bytes: first difference at byte {i}: 0x{a:0>2x} != 0x{b:0>2x}")
+                    break
+
+        return diffs
+
     def __ne__(self, other):
         return not self.__eq__(other)
 
@@ -346,6 +467,104 @@ class MiiPacket(object):
         if ((self.vlan_prio_tag is not None and len(self.vlan_prio_tag) > 0) or
                 (other.vlan_prio_tag is not None and len(other.vlan_prio_tag) > 0)):
             if self.vlan_prio_tag != other.vlan_prio_tag:
-                return false
+                return False
 
         return True
+
+
+class FrameAssembler(object):
+    """ Assembles the bytes of a frame as they are received into a preallocated
+        buffer, keeping a running CRC of the frame as it goes. The header fields
+        are only split out of the buffer once the frame is complete.
+
+        The resulting packet is the same as one built with append_data_nibble()
+        or append_data_byte() followed by complete(), including for runt frames
+        and frames with an odd number of nibbles.
+    """
+
+    # The CRC of a frame including a valid FCS
+    CRC_RESIDUE = 0x2144DF1C
+
+    # The number of bytes received between updates of the running CRC
+    CRC_CHUNK_BYTES = 64
+
+    def __init__(self, max_frame_bytes=1600):
+        self._buffer = bytearray(max_frame_bytes)
+        self.start()
+
+    def start(self):
+        """ Start a new frame
+        """
+        self._count = 0
+        self._crc = 0
+        self._crc_count = 0
+        self._nibble = None
+
+    def append_nibble(self, nibble):
+        """ Add a nibble to the frame. Nibbles are received low nibble first.
+        """
+        if self._nibble is None:
+            self._nibble = nibble
+        else:
+            self.append_byte(self._nibble | (nibble << 4))
+            self._nibble = None
+
+    def append_byte(self, byte):
+        count = self._count
+        if count == len(self._buffer):
+            self._buffer.extend(bytes(count))
+
+        self._buffer[count] = byte
+        count += 1
+        self._count = count
+
+        if count - self._crc_count >= self.CRC_CHUNK_BYTES:
+            self._update_crc()
+
+    def _update_crc(self):
+        with memoryview(self._buffer) as view:
+            self._crc = zlib.crc32(view[self._crc_count:self._count], self._crc)
+        self._crc_count = self._count
+
+    def get_frame_bytes(self):
+        """ Returns the bytes received for the frame so far, including the FCS
+        """
+        return bytes(self._buffer[:self._count])
+
+    def complete(self, packet):
+        """ Fill in the header fields, data and CRC of a blank packet from the
+            received frame
+        """
+        self._update_crc()
+        frame = self._buffer[:self._count]
+
+        packet.dst_mac_addr = frame[0:6]
+        packet.src_mac_addr = frame[6:12]
+
+        # Detect the fact that this is actually a VLAN/Priority tag
+        if frame[12:14] == b'\x81\x00':
+            packet.vlan_prio_tag = frame[12:16]
+            offset = 16
+        else:
+            offset = 12
+        packet.ether_len_type = frame[offset:offset+2]
+
+        # When the frame is complete then move the CRC from the data
+        data_bytes = frame[offset+2:]
+        packet.num_data_bytes = len(data_bytes) - 4
+        crc_valid = False
+        if len(data_bytes) >= 4:
+            packet.packet_crc = int.from_bytes(data_bytes[-4:], 'little')
+            crc_valid = (self._crc == self.CRC_RESIDUE)
+        else:
+            packet.packet_crc = 0
+        del data_bytes[-4:]
+        packet.data_bytes = data_bytes
+        packet.nibble = self._nibble
+
+        if crc_valid:
+            # The packet bytes are contiguous in the frame and the CRC has already
+            # been validated, so prime the encoding of the packet
+            packet._encoding = [bytes(frame[:-4]), packet.packet_crc, None]
+
+        return packet
@@ -0,0 +1,269 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# Streaming pcap/pcapng import and export of MiiPacket streams. Captures are
+# read a record at a time through a buffered file so that arbitrarily large
+# captures can be replayed, and received frames are written out as nanosecond
+# resolution pcap files that can be opened in Wireshark.
+#
+
+import random
+import struct
+
+from mii_packet import MiiPacket
+
+# Only Ethernet captures are supported
+LINKTYPE_ETHERNET = 1
+
+# The minimum frame size (without FCS) that is sent on the wire
+MIN_FRAME_BYTES = 60
+
+# The preamble, SFD and FCS bytes that are on the wire but not in the capture
+WIRE_OVERHEAD_BYTES = 8 + 4
+
+_BUFFER_SIZE = 1 << 20
+
+# The packets are fully specified so the random number generator is not used
+_rand = random.Random(0)
+
+_PCAP_MAGIC_US = 0xa1b2c3d4
+_PCAP_MAGIC_NS = 0xa1b23c4d
+_PCAPNG_SHB = 0x0a0d0d0a
+_PCAPNG_BYTE_ORDER_MAGIC = 0x1a2b3c4d
+_PCAPNG_IDB = 1
+_PCAPNG_SPB = 3
+_PCAPNG_EPB = 6
+
+_PCAPNG_IF_TSRESOL = 9
+_PCAPNG_IF_FCSLEN = 13
+
+
+def _pcap_fcs_bytes(network):
+    """ Returns the number of FCS bytes in each frame given the network field of
+        a pcap file header
+    """
+    if network & 0x10000000:
+        return 2 * ((network >> 29) & 0x7)
+    return 0
+
+
+def _read_pcap(f, header):
+    """ Yield (timestamp in fs, frame bytes, fcs bytes) for each record of a pcap file
+    """
+    header += f.read(20)
+    if len(header) != 24:
+        raise ValueError("Truncated pcap file header")
+
+    (magic,) = struct.unpack('<I', header[:4])
+    endian = '<' if magic in (_PCAP_MAGIC_US, _PCAP_MAGIC_NS) else '>'
+    (magic, _, _, _, _, _, network) = struct.unpack(endian + 'IHHiIII', header)
+
+    if (network & 0xffff) != LINKTYPE_ETHERNET:
+        raise ValueError(f"Unsupported pcap link type {network & 0xffff}")
+    fcs_bytes = _pcap_fcs_bytes(network)
+
+    frac_scale = 1000000 if magic == _PCAP_MAGIC_NS else 1000000000
+    record = struct.Struct(endian + 'IIII')
+    while True:
+        record_header = f.read(record.size)
+        if len(record_header) < record.size:
+            return
+        (ts_sec, ts_frac, incl_len, orig_len) = record.unpack(record_header)
+        frame = f.read(incl_len)
+        if len(frame) < incl_len:
+            raise ValueError("Truncated pcap record")
+        if incl_len < orig_len:
+            # Frames truncated by the snap length cannot be replayed
+            continue
+        yield (ts_sec * 1000000000000000 + ts_frac * frac_scale, frame, fcs_bytes)
+
+
+def _tsresol_to_fs(tsresol):
+    """ Returns a function converting pcapng timestamps with the given if_tsresol
+        to femtoseconds
+    """
+    if tsresol & 0x80:
+        shift = tsresol & 0x7f
+        return lambda ts: (ts * 1000000000000000) >> shift
+    if tsresol <= 15:
+        scale = 10 ** (15 - tsresol)
+        return lambda ts: ts * scale
+    scale = 10 ** (tsresol - 15)
+    return lambda ts: ts // scale
+
+
+def _read_options(endian, options):
+    """ Yield (code, value) for each option in a pcapng block
+    """
+    offset = 0
+    while offset + 4 <= len(options):
+        (code, length) = struct.unpack_from(endian + 'HH', options, offset)
+        if code == 0:
+            return
+        yield (code, options[offset+4:offset+4+length])
+        offset += 4 + ((length + 3) & ~3)
+
+
+def _read_pcapng(f):
+    """ Yield (timestamp in fs, frame bytes, fcs bytes) for each packet of a pcapng file
+    """
+    endian = '<'
+    interfaces = []
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            return
+
+        # The section header block type reads the same in either byte order and
+        # each section header sets the byte order of its section
+        (block,) = struct.unpack('<I', header[:4])
+        if block == _PCAPNG_SHB:
+            (byte_order,) = struct.unpack('<I', f.read(4))
+            endian = '<' if byte_order == _PCAPNG_BYTE_ORDER_MAGIC else '>'
+            (length,) = struct.unpack(endian + 'I', header[4:])
+            f.read(length - 12)
+            interfaces = []
+            continue
+
+        (block, length) = struct.unpack(endian + 'II', header)
+
+        body = f.read(length - 8)
+        if len(body) < length - 8:
+            raise ValueError("Truncated pcapng block")
+
+        if block == _PCAPNG_IDB:
+            (link_type, _, _) = struct.unpack_from(endian + 'HHI', body)
+            tsresol = 6
+            fcs_bytes = 0
+            for (code, value) in _read_options(endian, body[8:-4]):
+                if code == _PCAPNG_IF_TSRESOL:
+                    tsresol = value[0]
+                elif code == _PCAPNG_IF_FCSLEN:
+                    fcs_bytes = value[0]
+            interfaces.append((link_type, _tsresol_to_fs(tsresol), fcs_bytes))
+
+        elif block == _PCAPNG_EPB:
+            (interface, ts_high, ts_low, incl_len, orig_len) = struct.unpack_from(endian + 'IIIII', body)
+            (link_type, to_fs, fcs_bytes) = interfaces[interface]
+            if link_type != LINKTYPE_ETHERNET:
+                raise ValueError(f"Unsupported pcapng link type {link_type}")
+            if incl_len < orig_len:
+                continue
+            yield (to_fs((ts_high << 32) | ts_low), body[20:20+incl_len], fcs_bytes)
+
+        elif block == _PCAPNG_SPB:
+            # Simple packet blocks have no timestamp
+            (link_type, to_fs, fcs_bytes) = interfaces[0]
+            (orig_len,) = struct.unpack_from(endian + 'I', body)
+            if link_type != LINKTYPE_ETHERNET:
+                raise ValueError(f"Unsupported pcapng link type {link_type}")
+            if len(body) - 8 < orig_len:
+                continue
+            yield (None, body[4:4+orig_len], fcs_bytes)
+
+
+def read_frames(filename):
+    """ Yield (timestamp in fs, frame bytes, fcs bytes) for each frame in a pcap or
+        pcapng file. The timestamp is None if the capture does not record one.
+    """
+    with open(filename, 'rb', buffering=_BUFFER_SIZE) as f:
+        magic = f.read(4)
+        if len(magic) < 4:
+            return
+        pcap_magics = (_PCAP_MAGIC_US, _PCAP_MAGIC_NS)
+        if struct.unpack('<I', magic)[0] == _PCAPNG_SHB:
+            f.seek(0)
+            yield from _read_pcapng(f)
+        elif struct.unpack('<I', magic)[0] in pcap_magics or struct.unpack('>I', magic)[0] in pcap_magics:
+            yield from _read_pcap(f, magic)
+        else:
+            raise ValueError(f"{filename} is not a pcap or pcapng file")
+
+
+def packet_from_frame(frame, fcs_bytes=0, **kwargs):
+    """ Create an MiiPacket from the bytes of a captured Ethernet frame. Frames
+        shorter than the minimum frame size are padded as they would be on the wire.
+    """
+    if fcs_bytes:
+        frame = frame[:-fcs_bytes]
+    if len(frame) < MIN_FRAME_BYTES:
+        frame = frame + bytes(MIN_FRAME_BYTES - len(frame))
+
+    if frame[12:14] == b'\x81\x00':
+        vlan_prio_tag = frame[12:16]
+        offset = 16
+    else:
+        vlan_prio_tag = None
+        offset = 12
+
+    return MiiPacket(_rand, dst_mac_addr=frame[0:6], src_mac_addr=frame[6:12],
+                     vlan_prio_tag=vlan_prio_tag, ether_len_type=frame[offset:offset+2],
+                     data_bytes=frame[offset+2:], **kwargs)
+
+
+def read_packets(filename, bit_time, min_ifg=None, max_ifg=None):
+    """ Yield an MiiPacket for each frame in a pcap or pcapng file. The inter-frame
+        gap of each packet is the gap between the end of the previous frame on the
+        wire and the timestamp of the frame, limited to [min_ifg, max_ifg]. The
+        minimum defaults to the 96 bit time minimum gap.
+    """
+    if min_ifg is None:
+        min_ifg = 96 * bit_time
+
+    last_time = None
+    last_wire_time = 0
+    for (timestamp, frame, fcs_bytes) in read_frames(filename):
+        ifg = min_ifg
+        if timestamp is not None and last_time is not None:
+            ifg = max(min_ifg, timestamp - last_time - last_wire_time)
+            if max_ifg is not None:
+                ifg = min(ifg, max_ifg)
+
+        packet = packet_from_frame(frame, fcs_bytes, inter_frame_gap=ifg)
+
+        if timestamp is not None:
+            last_time = timestamp
+        last_wire_time = (len(packet.get_packet_bytes()) + WIRE_OVERHEAD_BYTES) * 8 * bit_time
+        yield packet
+
+
+class PcapWriter(object):
+    """ Write frames to a nanosecond resolution pcap file. Timestamps are given in
+        femtoseconds of simulated time. The FCS of each frame is only written if
+        include_fcs is set.
+    """
+
+    def __init__(self, filename, include_fcs=False, snaplen=65535):
+        self._include_fcs = include_fcs
+        self._record = struct.Struct('<IIII')
+        self._file = open(filename, 'wb', buffering=_BUFFER_SIZE)
+
+        network = LINKTYPE_ETHERNET
+        if include_fcs:
+            # FCS present, length in 16-bit words
+            network |= 0x10000000 | (2 << 29)
+        self._file.write(struct.pack('<IHHiIII', _PCAP_MAGIC_NS, 2, 4, 0, 0, snaplen, network))
+
+    def write_frame(self, frame, timestamp):
+        """ Write the bytes of a frame received at the given time. The frame
+            includes the FCS.
+        """
+        if not self._include_fcs:
+            frame = frame[:-4]
+        ns = int(timestamp // 1000000)
+        self._file.write(self._record.pack(ns // 1000000000, ns % 1000000000, len(frame), len(frame)))
+        self._file.write(frame)
+
+    def write_packet(self, packet, timestamp):
+        """ Write an MiiPacket sent at the given time
+        """
+        self.write_frame(packet.get_packet_bytes() + packet.get_crc().to_bytes(4, 'little'), timestamp)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
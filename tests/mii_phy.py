@@ -4,15 +4,42 @@ import random
 import Pyxsim as px
 import sys
 import zlib
-from mii_packet import MiiPacket
+from collections import deque
+from itertools import islice
+from mii_packet import MiiPacket, FrameAssembler
+from mii_schedule import encode_nibbles
 
-class TxPhy(px.SimThread):
+class ClockedPhy(px.SimThread):
+    """ Base for the PHY threads. Waits for the clock are computed from the edge
+        times of the clock rather than polling its value on every simulator step.
+    """
+
+    def wait_for_clock_low(self):
+        """ Wait until the clock is low, returning immediately if it already is
+        """
+        now = self.xsi.get_time()
+        if self._clock.is_high_at(now):
+            self.wait_until(self._clock.next_falling_edge(now))
+
+    def wait_for_clock_high(self):
+        """ Wait until the clock is high, returning immediately if it already is
+        """
+        now = self.xsi.get_time()
+        if not self._clock.is_high_at(now):
+            self.wait_until(self._clock.next_rising_edge(now))
+
+
+class TxPhy(ClockedPhy):
 
     # Time in fs from the last packet being sent until the end of test is signalled to the DUT
     END_OF_TEST_TIME = 5000*1e6
 
+    # The number of packets compiled into each schedule in compiled mode
+    SCHEDULE_CHUNK_PACKETS = 1024
+
     def __init__(self, name, rxd, rxdv, rxer, clock, initial_delay, verbose,
-                 test_ctrl, do_timeout, complete_fn, expect_loopback, dut_exit_time):
+                 test_ctrl, do_timeout, complete_fn, expect_loopback, dut_exit_time,
+                 compiled=False):
         self._name = name
         self._test_ctrl = test_ctrl
         self._rxd = rxd
@@ -26,6 +53,18 @@ class TxPhy(px.SimThread):
         self._complete_fn = complete_fn
         self._expect_loopback = expect_loopback
         self._dut_exit_time = dut_exit_time
+        self._compiled = compiled
+        self._metrics = None
+
+        # Running totals of what has been sent
+        self.num_packets_sent = 0
+        self.num_bytes_sent = 0
+
+        # The ports driven with the data / data valid and the value driven on the
+        # data ports between frames (if any)
+        self._data_ports = [rxd]
+        self._dv_ports = [rxdv]
+        self._idle_data = None
 
     def get_name(self):
         return self._name
@@ -35,8 +74,8 @@ class TxPhy(px.SimThread):
 
     def start_test(self):
         self.wait_until(self.xsi.get_time() + self._initial_delay)
-        self.wait(lambda x: self._clock.is_high())
-        self.wait(lambda x: self._clock.is_low())
+        self.wait_for_clock_high()
+        self.wait_for_clock_low()
 
     def end_test(self):
         if self._verbose:
@@ -54,9 +93,7 @@ class TxPhy(px.SimThread):
 
             if self._expect_loopback:
                 # If looping back then take into account all the data
-                total_packet_bytes = sum([len(packet.get_packet_bytes()) for packet in self._packets])
-
-                total_data_bits = total_packet_bytes * 8
+                total_data_bits = self.num_bytes_sent * 8
 
                 # Allow 2 cycles per bit
                 timeout_time += 2 * total_data_bits * 1e6 # scale to femtoseconds vs nanoseconds in old xsim
@@ -83,26 +120,148 @@ class TxPhy(px.SimThread):
         self._clock = clock
 
     def set_packets(self, packets):
+        """ Set the packets to send. This can be any iterable (including a generator)
+            and it is only consumed as the packets are sent.
+        """
         self._packets = packets
 
+    def set_metrics(self, metrics):
+        """ Set a MetricsCollector that the start of every frame sent is reported to
+        """
+        self._metrics = metrics
+
+    def frame_started(self, packet):
+        """ Called as the first nibble of a frame is driven
+        """
+        if self._metrics:
+            self._metrics.frame_started(packet, self.xsi.get_time())
+
+    def packet_sent(self, packet):
+        """ Update the running totals once a packet has been sent
+        """
+        self.num_packets_sent += 1
+        self.num_bytes_sent += len(packet.get_packet_bytes())
+
     def drive_error(self, value):
         self.xsi.drive_port_pins(self._rxer, value)
 
+    def compile_schedule(self, packets):
+        """ Lower the packets to a WireSchedule of the values to drive on the data
+            pins each clock cycle. Implemented by each PHY.
+        """
+        raise NotImplementedError
+
+    def get_schedule_key(self):
+        """ Returns the state of the PHY that a compiled schedule depends on. A
+            schedule is only used while this is unchanged.
+        """
+        return None
+
+    def run_compiled(self):
+        """ Send all the packets by replaying pre-compiled schedules. The data for
+            every clock cycle of a chunk of packets is computed before the chunk is
+            sent so the per-cycle work is just driving the pins that change.
+        """
+        packets = iter(self._packets)
+
+        self.start_test()
+
+        # The packets of a chunk that were not sent because the schedule became
+        # invalid, which are compiled again with the next chunk
+        pending = []
+        while True:
+            chunk = pending + list(islice(packets, self.SCHEDULE_CHUNK_PACKETS - len(pending)))
+            if not chunk:
+                break
+            num_sent = self.send_schedule(chunk, self.compile_schedule(chunk))
+            pending = chunk[num_sent:]
+
+        self.end_test()
+
+    def send_schedule(self, packets, schedule):
+        """ Drive the pins for the packets from a schedule compiled for them.
+            Returns the number of packets sent, which is less than all of them
+            if the schedule key changes (such as the clock rate), as the rest
+            have to be compiled again.
+        """
+        key = self.get_schedule_key()
+        xsi = self.xsi
+        drive = xsi.drive_port_pins
+        data_ports = self._data_ports
+        dv_ports = self._dv_ports
+
+        data = schedule.data.tolist()
+        errors = schedule.errors.astype("u1").tolist()
+        offsets = schedule.offsets.tolist()
+        ifgs = schedule.ifgs.tolist()
+
+        for (i, packet) in enumerate(packets):
+            if self.get_schedule_key() != key:
+                return i
+
+            self.wait_until(xsi.get_time() + ifgs[i])
+
+            if self._verbose:
+                print(f"Sending packet {self.num_packets_sent}: {packet}")
+                sys.stdout.write(packet.dump())
+
+            # Always drive the error signal on the first cycle of a packet
+            start = offsets[i]
+            error = None
+            for j in range(start, offsets[i+1]):
+                self.wait_for_clock_low()
+                if j == start:
+                    self.frame_started(packet)
+                    for port in dv_ports:
+                        drive(port, 1)
+
+                value = data[j]
+                for port in data_ports:
+                    drive(port, value)
+
+                # Signal an error if required
+                if errors[j] != error:
+                    error = errors[j]
+                    drive(self._rxer, error)
+
+                self.wait_for_clock_high()
+
+            self.wait_for_clock_low()
+            if self._idle_data is not None:
+                for port in data_ports:
+                    drive(port, self._idle_data)
+            for port in dv_ports:
+                drive(port, 0)
+            drive(self._rxer, 0)
+            self.packet_sent(packet)
+
+            if self._verbose:
+                print("Sent")
+
+        return len(packets)
+
 
 class MiiTransmitter(TxPhy):
 
     def __init__(self, rxd, rxdv, rxer, clock,
                  initial_delay=85000*1e6, verbose=False, test_ctrl=None,
                  do_timeout=True, complete_fn=None, expect_loopback=True,
-                 dut_exit_time=25000*1e6):
+                 dut_exit_time=25000*1e6, compiled=False):
         super(MiiTransmitter, self).__init__('mii', rxd, rxdv, rxer, clock,
                                              initial_delay, verbose, test_ctrl,
                                              do_timeout, complete_fn, expect_loopback,
-                                             dut_exit_time)
+                                             dut_exit_time, compiled)
+
+    def compile_schedule(self, packets):
+        return encode_nibbles(packets)
 
     def run(self):
         xsi = self.xsi
 
+        if self._compiled:
+            self.run_compiled()
+            return
+
         self.start_test()
 
         for i,packet in enumerate(self._packets):
@@ -115,7 +274,9 @@ class MiiTransmitter(TxPhy):
                 sys.stdout.write(packet.dump())
 
             for (i, nibble) in enumerate(packet.get_nibbles()):
-                self.wait(lambda x: self._clock.is_low())
+                self.wait_for_clock_low()
+                if i == 0:
+                    self.frame_started(packet)
                 xsi.drive_port_pins(self._rxdv, 1)
                 xsi.drive_port_pins(self._rxd, nibble)
 
@@ -125,11 +286,12 @@ class MiiTransmitter(TxPhy):
                 else:
                     xsi.drive_port_pins(self._rxer, 0)
 
-                self.wait(lambda x: self._clock.is_high())
+                self.wait_for_clock_high()
 
-            self.wait(lambda x: self._clock.is_low())
+            self.wait_for_clock_low()
             xsi.drive_port_pins(self._rxdv, 0)
             xsi.drive_port_pins(self._rxer, 0)
+            self.packet_sent(packet)
 
             if self._verbose:
                 print("Sent")
@@ -137,7 +299,10 @@ class MiiTransmitter(TxPhy):
         self.end_test()
 
 
-class RxPhy(px.SimThread):
+class RxPhy(ClockedPhy):
+
+    # The maximum number of expected packets that can be looked ahead at
+    EXPECTED_PACKET_WINDOW = 64
 
     def __init__(self, name, txd, txen, clock, print_packets, packet_fn, verbose, test_ctrl):
         self._name = name
@@ -152,10 +317,10 @@ class RxPhy(px.SimThread):
         self.expected_packets = None
         self.expect_packet_index = 0
         self.num_expected_packets = 0
-
-        self.expected_packets = None
-        self.expect_packet_index = 0
-        self.num_expected_packets = 0
+        self._expected_iter = iter(())
+        self._expected_window = deque()
+        self._capture = None
+        self._metrics = None
 
     def get_name(self):
         return self._name
@@ -164,12 +329,58 @@ class RxPhy(px.SimThread):
         return self._clock
 
     def set_expected_packets(self, packets):
-        self.expect_packet_index = 0;
+        """ Set the packets the receiver expects. This can be any iterable (including
+            a generator). It is consumed lazily through a look-ahead window of at most
+            EXPECTED_PACKET_WINDOW packets so the expected packets are never all held
+            in memory. num_expected_packets is None if the number is not known.
+        """
+        self.expect_packet_index = 0
         self.expected_packets = packets
+        self._expected_window.clear()
         if self.expected_packets is None:
             self.num_expected_packets = 0
+            self._expected_iter = iter(())
         else:
-            self.num_expected_packets = len(self.expected_packets)
+            self.num_expected_packets = len(packets) if hasattr(packets, '__len__') else None
+            self._expected_iter = iter(packets)
+
+    def set_capture(self, capture):
+        """ Set a writer (e.g. mii_pcap.PcapWriter) that every received frame is
+            written to with the time at which the frame started
+        """
+        self._capture = capture
+
+    def set_metrics(self, metrics):
+        """ Set a MetricsCollector that the end of every frame received is reported to
+        """
+        self._metrics = metrics
+
+    def get_metrics(self):
+        return self._metrics
+
+    def peek_expected_packet(self, offset=0):
+        """ Returns the expected packet at expect_packet_index + offset, or None if
+            there are not that many expected packets left
+        """
+        if offset >= self.EXPECTED_PACKET_WINDOW:
+            raise ValueError(f"Look-ahead of {offset} packets is beyond the window of {self.EXPECTED_PACKET_WINDOW}")
+
+        window = self._expected_window
+        while len(window) <= offset:
+            packet = next(self._expected_iter, None)
+            if packet is None:
+                return None
+            window.append(packet)
+        return window[offset]
+
+    def pop_expected_packet(self):
+        """ Move on past the next expected packet and return it
+        """
+        packet = self.peek_expected_packet()
+        if packet is not None:
+            self._expected_window.popleft()
+            self.expect_packet_index += 1
+        return packet
 
 class MiiReceiver(RxPhy):
 
@@ -185,6 +396,7 @@ class MiiReceiver(RxPhy):
         # Need a random number generator for the MiiPacket constructor but it shouldn't
         # have any affect as only blank packets are being created
         rand = random.Random()
+        frame = FrameAssembler()
 
         packet_count = 0
         last_frame_end_time = None
@@ -202,6 +414,7 @@ class MiiReceiver(RxPhy):
 
             # Start with a blank packet to ensure they are filled in by the receiver
             packet = MiiPacket(rand, blank=True)
+            frame.start()
 
             frame_start_time = self.xsi.get_time()
             in_preamble = True
@@ -211,12 +424,10 @@ class MiiReceiver(RxPhy):
                 packet.inter_frame_gap = ifgap
 
             while True:
-                # Wait for a falling clock edge or enable low
-                self.wait(lambda x: self._clock.is_low() or \
-                                   xsi.sample_port_pins(self._txen) == 0)
-
+                # Wait for a falling clock edge. TXEN is checked on both edges
+                # of the clock to find the end of the frame
+                self.wait_for_clock_low()
                 if xsi.sample_port_pins(self._txen) == 0:
-                    last_frame_end_time = self.xsi.get_time()
                     break
 
                 nibble = xsi.sample_port_pins(self._txd)
@@ -227,11 +438,20 @@ class MiiReceiver(RxPhy):
                     else:
                         packet.append_preamble_nibble(nibble)
                 else:
-                    packet.append_data_nibble(nibble)
+                    frame.append_nibble(nibble)
+
+                self.wait_for_clock_high()
+                if xsi.sample_port_pins(self._txen) == 0:
+                    break
+
+            last_frame_end_time = self.xsi.get_time()
+            frame.complete(packet)
 
-                self.wait(lambda x: self._clock.is_high())
+            if self._capture:
+                self._capture.write_frame(frame.get_frame_bytes(), frame_start_time)
 
-            packet.complete()
+            if self._metrics:
+                self._metrics.frame_received(packet, last_frame_end_time)
 
             if self._print_packets:
                 sys.stdout.write(packet.dump())
@@ -0,0 +1,106 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# Batch wire encoding of MiiPacket schedules. Rather than expanding each packet
+# into nibbles in Python, the bytes of all the packets are gathered once and the
+# nibble (MII and 10/100 RGMII) or nibble pair (1Gb/s RGMII) stream for the whole
+# schedule is built with NumPy.
+#
+
+from collections import namedtuple
+import numpy as np
+
+
+# data:    the values driven on the data pins, one entry per clock cycle
+# offsets: data[offsets[i]:offsets[i+1]] are the values for packet i
+# errors:  True where RXER is driven high for that data value
+# ifgs:    the inter-frame gap (in fs) before each packet
+WireSchedule = namedtuple('WireSchedule', ['data', 'offsets', 'errors', 'ifgs'])
+
+
+def _scatter_index(lengths, dest_starts):
+    """ Returns the destination index of every element of the concatenation of
+        segments with the given lengths, where segment i starts at dest_starts[i].
+    """
+    src_starts = np.cumsum(lengths) - lengths
+    return np.arange(lengths.sum()) + np.repeat(dest_starts - src_starts, lengths)
+
+
+def encode_nibbles(packets):
+    """ Encode a list or iterator of packets into a WireSchedule of nibbles,
+        exactly as MiiPacket.get_nibbles() would produce for each packet.
+    """
+    heads = []
+    bodies = []
+    tails = []
+    tail_packets = []
+    error_packets = []
+    error_nibbles = []
+    ifgs = []
+
+    for (i, packet) in enumerate(packets):
+        head = bytes(packet.preamble_nibbles)
+        if packet.sfd_nibble is not None:
+            head += bytes((packet.sfd_nibble,))
+        heads.append(head)
+        bodies.append(packet.get_frame_bytes())
+        if packet.extra_nibble:
+            tails.append(packet.extra_nibble)
+            tail_packets.append(i)
+        for nibble in packet.get_error_nibbles():
+            error_packets.append(i)
+            error_nibbles.append(nibble)
+        ifgs.append(packet.inter_frame_gap)
+
+    num_packets = len(heads)
+    head_lens = np.fromiter((len(x) for x in heads), dtype=np.int64, count=num_packets)
+    body_lens = 2 * np.fromiter((len(x) for x in bodies), dtype=np.int64, count=num_packets)
+    tail_lens = np.zeros(num_packets, dtype=np.int64)
+    tail_lens[tail_packets] = 1
+
+    lengths = head_lens + body_lens + tail_lens
+    offsets = np.zeros(num_packets + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    starts = offsets[:-1]
+
+    data = np.empty(offsets[-1], dtype=np.uint8)
+
+    data[_scatter_index(head_lens, starts)] = np.frombuffer(b''.join(heads), dtype=np.uint8)
+
+    # Each byte is sent low nibble first
+    body_bytes = np.frombuffer(b''.join(bodies), dtype=np.uint8)
+    body_nibbles = np.empty(2 * len(body_bytes), dtype=np.uint8)
+    body_nibbles[0::2] = body_bytes & 0xf
+    body_nibbles[1::2] = body_bytes >> 4
+    data[_scatter_index(body_lens, starts + head_lens)] = body_nibbles
+
+    data[starts[tail_packets] + head_lens[tail_packets] + body_lens[tail_packets]] = tails
+
+    # Error nibbles beyond the end of a packet are never driven
+    errors = np.zeros(len(data), dtype=bool)
+    error_packets = np.array(error_packets, dtype=np.int64)
+    error_nibbles = np.array(error_nibbles, dtype=np.int64)
+    valid = (error_nibbles >= 0) & (error_nibbles < lengths[error_packets])
+    errors[starts[error_packets[valid]] + error_nibbles[valid]] = True
+
+    return WireSchedule(data, offsets, errors, np.array(ifgs, dtype=np.float64))
+
+
+def encode_nibble_pairs(packets):
+    """ Encode a list or iterator of packets into a WireSchedule of bytes as sent
+        by the 1Gb/s RGMII PHY. Each byte holds a pair of nibbles (first nibble in
+        the low bits) and a trailing odd nibble is not sent. A byte is in error if
+        either of its nibbles is.
+    """
+    nibbles = encode_nibbles(packets)
+    starts = nibbles.offsets[:-1]
+    num_pairs = np.diff(nibbles.offsets) // 2
+
+    offsets = np.zeros(len(num_pairs) + 1, dtype=np.int64)
+    np.cumsum(num_pairs, out=offsets[1:])
+
+    first = 2 * np.arange(offsets[-1]) + np.repeat(starts - 2 * offsets[:-1], num_pairs)
+    data = nibbles.data[first] | (nibbles.data[first + 1] << 4)
+    errors = nibbles.errors[first] | nibbles.errors[first + 1]
+
+    return WireSchedule(data, offsets, errors, nibbles.ifgs)
@@ -0,0 +1,96 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# Match received packets against the expected packets when the DUT can reorder
+# them, for example between its high and low priority queues. The expected
+# packets are indexed on a digest of their bytes so each received packet is
+# matched in constant time, and ordering can still be checked within a stream.
+#
+
+import hashlib
+from collections import deque
+
+
+def packet_digest(packet):
+    """ Returns a digest of the bytes of a packet (dst, src, tag, len/type and data)
+    """
+    return hashlib.blake2b(packet.get_packet_bytes(), digest_size=16).digest()
+
+
+class PacketMatcher(object):
+    """ An index of expected packets keyed on their digests. Identical packets are
+        held as a multiset and matched in the order they were expected.
+
+        The expected packets are pulled lazily from next_packet(), a function that
+        returns the next expected packet or None when there are no more. At most
+        lookahead packets are held waiting to be matched. Dropped packets are
+        counted but never matched.
+
+        If stream_fn is given then it maps a packet to its stream (e.g. its queue
+        or VLAN priority) and packets within each stream must arrive in order.
+    """
+
+    def __init__(self, next_packet, stream_fn=None, lookahead=1024):
+        self._next_packet = next_packet
+        self._stream_fn = stream_fn
+        self._lookahead = lookahead
+        self._index = {}
+        self._streams = {}
+        self._num_pulled = 0
+        self._num_outstanding = 0
+        self._exhausted = False
+
+    def _pull(self):
+        packet = self._next_packet()
+        if packet is None:
+            self._exhausted = True
+            return
+
+        index = self._num_pulled
+        self._num_pulled += 1
+        if packet.dropped:
+            return
+
+        self._index.setdefault(packet_digest(packet), deque()).append((index, packet))
+        if self._stream_fn:
+            self._streams.setdefault(self._stream_fn(packet), deque()).append(index)
+        self._num_outstanding += 1
+
+    def match(self, packet):
+        """ Match a received packet. Returns (index, error) where index is the index
+            of the matching expected packet (None if there is none) and error is a
+            description of any problem with the match (None if there is none).
+        """
+        digest = packet_digest(packet)
+        while (digest not in self._index and not self._exhausted and
+               self._num_outstanding < self._lookahead):
+            self._pull()
+
+        entries = self._index.get(digest)
+        if not entries or entries[0][1] != packet:
+            return (None, f"does not match any of the {self._num_outstanding} outstanding expected packets")
+
+        (index, expected) = entries.popleft()
+        if not entries:
+            del self._index[digest]
+        self._num_outstanding -= 1
+
+        if self._stream_fn:
+            stream = self._streams[self._stream_fn(expected)]
+            if stream[0] != index:
+                first = stream[0]
+                stream.remove(index)
+                return (index, f"received before packet {first} of the same stream")
+            stream.popleft()
+
+        return (index, None)
+
+    def get_num_outstanding(self):
+        return self._num_outstanding
+
+    def is_complete(self):
+        """ Returns True once every expected packet has been matched
+        """
+        while self._num_outstanding == 0 and not self._exhausted:
+            self._pull()
+        return self._exhausted and self._num_outstanding == 0
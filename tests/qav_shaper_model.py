@@ -0,0 +1,210 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# A model of the 802.1Qav credit based shaper of the transmit paths of the MACs
+# that predicts when each frame starts on the wire. It uses the fixed-point
+# arithmetic of mii_master_tx_pins() (mii_master.xc) and rgmii_ethernet_tx_server()
+# (rgmii_buffering.xc):
+#
+#  - the credit is a 32-bit int that accrues elapsed * qav_idle_slope for the
+#    100MHz reference timer ticks since it was last updated,
+#  - each HP frame costs its length with the preamble, IFG and CRC, shifted
+#    left by MII_CREDIT_FRACTIONAL_BITS + 3,
+#  - while there is no HP frame waiting the credit is not allowed above 0, and
+#    an HP frame is only taken once the credit is not negative.
+#
+# The MII MAC transmits a frame at a time and only updates the credit again once
+# the frame has been sent, so the whole frame time is multiplied by the slope at
+# once (and can overflow at 10Mb/s with large slopes, as on the device). The
+# RGMII server hands up to two frames to the outputter, updating the credit
+# every time round its loop and charging HP frames as they are handed over.
+#
+# Times are in femtoseconds, as in the simulator.
+#
+
+from collections import deque
+
+from traffic import PREAMBLE_BYTES, CRC_BYTES, MIN_IFG_BITS
+
+# server_state.h
+MII_CREDIT_FRACTIONAL_BITS = 16
+
+# The reference timer runs at 100MHz
+TIMER_TICK_FS = 10e6
+
+IFG_BYTES = MIN_IFG_BITS // 8
+
+# The number of frames each MAC can have been given to transmit at a time
+TX_DEPTHS = {"mii": 1, "rgmii": 2}
+
+
+def to_int32(value):
+    """ Returns the value wrapped to a signed 32-bit int
+    """
+    return ((value + (1 << 31)) & 0xffffffff) - (1 << 31)
+
+
+def calc_idle_slope(bps):
+    """ Returns the slope for a bandwidth, as calc_idle_slope() of test_shaper
+    """
+    return (bps << MII_CREDIT_FRACTIONAL_BITS) // 100000000
+
+
+def get_credit_cost(num_bytes):
+    """ Returns the credit used by an HP frame of num_bytes (not including the
+        preamble or CRC)
+    """
+    num_bytes += PREAMBLE_BYTES + IFG_BYTES + CRC_BYTES
+    return to_int32(num_bytes << (MII_CREDIT_FRACTIONAL_BITS + 3))
+
+
+class ShaperFrame(object):
+    """ A frame given to the MAC to transmit at the ready time. num_bytes does
+        not include the preamble or CRC.
+    """
+
+    def __init__(self, ready, num_bytes, is_hp):
+        self.ready = ready
+        self.num_bytes = num_bytes
+        self.is_hp = is_hp
+
+
+class QavShaperModel(object):
+    """ The transmit path of the MAC for the phy ("mii" or "rgmii") with the
+        given idle slope and bit time in femtoseconds.
+    """
+
+    def __init__(self, idle_slope, bit_time, phy="mii", enable_shaper=True, ifg_bits=MIN_IFG_BITS):
+        if phy not in TX_DEPTHS:
+            raise ValueError(f"Unsupported phy {phy}")
+        self.idle_slope = idle_slope
+        self.bit_time = bit_time
+        self.phy = phy
+        self.enable_shaper = enable_shaper
+        self.ifg_time = ifg_bits * bit_time
+        self.credit = 0
+        self._credit_tick = 0
+
+    def get_frame_time(self, num_bytes):
+        return (num_bytes + PREAMBLE_BYTES + CRC_BYTES) * 8 * self.bit_time
+
+    def _update_credit(self, time, hp_waiting, single_step):
+        """ Bring the credit up to the time. If single_step is set the credit is
+            updated once for the whole time (the MII MAC after a frame), otherwise
+            the loop has been polling all along.
+        """
+        tick = int(time // TIMER_TICK_FS)
+        elapsed = tick - self._credit_tick
+        self._credit_tick = tick
+        if not self.enable_shaper:
+            return
+
+        if single_step:
+            credit = self.credit + to_int32(to_int32(elapsed) * self.idle_slope)
+            credit = to_int32(credit)
+            if not hp_waiting and credit > 0:
+                credit = 0
+        else:
+            credit = self.credit + elapsed * self.idle_slope
+            if not hp_waiting:
+                credit = min(credit, 0)
+        self.credit = to_int32(credit)
+
+    def _get_credit_time(self):
+        """ Returns the time at which the credit stops being negative
+        """
+        if self.idle_slope <= 0:
+            return None
+        ticks = -(self.credit // self.idle_slope)
+        return (self._credit_tick + ticks) * TIMER_TICK_FS
+
+    def run(self, frames, observed=None):
+        """ Returns the time each frame starts on the wire, or None for frames
+            that are never sent. If the observed start times are given they are
+            used in place of the predicted ones to carry on, so that errors do
+            not accumulate.
+        """
+        order = sorted(range(len(frames)), key=lambda i: frames[i].ready)
+        depth = TX_DEPTHS[self.phy]
+        starts = [None] * len(frames)
+        (hp, lp) = (deque(), deque())
+        in_flight = deque()
+        next_arrival = 0
+        wire_free = 0
+        single_step = False
+
+        time = frames[order[0]].ready if frames else 0
+        self.credit = 0
+        self._credit_tick = int(time // TIMER_TICK_FS)
+
+        while True:
+            # Frames are queued at their ready times; the MII MAC polls once when
+            # it has finished a frame
+            if not single_step:
+                self._update_credit(time, bool(hp), False)
+            while next_arrival < len(order) and frames[order[next_arrival]].ready <= time:
+                i = order[next_arrival]
+                (hp if frames[i].is_hp else lp).append(i)
+                next_arrival += 1
+            self._update_credit(time, bool(hp), single_step)
+            single_step = False
+
+            while in_flight and in_flight[0] <= time:
+                in_flight.popleft()
+
+            if len(in_flight) < depth:
+                i = None
+                if hp and self.credit >= 0:
+                    i = hp.popleft()
+                elif lp:
+                    i = lp.popleft()
+
+                if i is not None:
+                    frame = frames[i]
+                    starts[i] = max(time, wire_free)
+                    start = starts[i]
+                    if observed is not None and observed[i] is not None:
+                        start = observed[i]
+                    end = start + self.get_frame_time(frame.num_bytes)
+                    wire_free = end + self.ifg_time
+                    in_flight.append(end)
+                    if self.enable_shaper and frame.is_hp:
+                        self.credit = to_int32(self.credit - get_credit_cost(frame.num_bytes))
+
+                    if depth == 1:
+                        # The loop is blocked until the frame has been sent
+                        (time, single_step) = (end, True)
+                    continue
+
+            # Nothing can be sent until the next event
+            times = []
+            if next_arrival < len(order):
+                times.append(frames[order[next_arrival]].ready)
+            if len(in_flight) == depth:
+                times.append(in_flight[0])
+            elif hp:
+                times.append(self._get_credit_time())
+            times = [t for t in times if t is not None]
+            if not times:
+                return starts
+            time = max(min(times), time)
+
+
+def check_egress(frames, observed, model, tolerance, hp_only=False):
+    """ Check the observed start times of the frames against those predicted by
+        the model, following the observed times. If hp_only is set only the HP
+        frames are checked. Returns a list of errors.
+    """
+    expected = model.run(frames, observed)
+    errors = []
+    for (i, (exp, obs)) in enumerate(zip(expected, observed)):
+        if hp_only and not frames[i].is_hp:
+            continue
+        kind = "HP" if frames[i].is_hp else "LP"
+        if exp is None and obs is None:
+            continue
+        if exp is None or obs is None:
+            errors.append(f"{kind} frame {i}: expected at {exp}, seen at {obs}")
+        elif abs(obs - exp) > tolerance:
+            errors.append(f"{kind} frame {i}: expected at {exp/1e9:.3f}us, seen at {obs/1e9:.3f}us")
+    return errors
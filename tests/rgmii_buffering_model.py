@@ -0,0 +1,345 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# A discrete-event model of the receive buffering of the 10/100/1000 Mb/s RGMII
+# MAC, so that buffer counts can be chosen for a traffic profile and drops put
+# down to a lack of buffers or to the time the server takes. It models the
+# structures of lib_ethernet/src/rgmii_buffering.xc:
+#
+#  - the stack of free buffers (buffers_free_take() and buffers_free_add()) of
+#    RGMII_MAC_BUFFER_COUNT_RX buffers, two of which are always held by the
+#    receiver,
+#  - rgmii_buffer_manager(), which drops a frame when there is no free buffer to
+#    replace it and otherwise adds it to the HP or LP ring of used buffers,
+#  - rgmii_ethernet_rx_server(), which every time round its loop serves at most
+#    one client request, streams all of the HP packets, passes one LP packet to
+#    the client queues and, when the HP client is connected, calls
+#    drop_lp_packets() while there are RGMII_RX_BUFFERS_THRESHOLD or fewer free
+#    buffers.
+#
+# Each LP client takes a packet with get_packet() as soon as it has finished the
+# last one, taking lp_drain_mbps to process each. The server is blocked while it
+# streams an HP packet at hp_drain_mbps and, if copy_mbps is set, while it copies
+# an LP packet to a client. The filter is assumed to keep up.
+#
+# The model reports the drops of each kind, the free buffers over time, the
+# time the server was busy and, for each LP client, the periods in which every
+# frame for it was dropped.
+#
+
+import heapq
+from collections import deque
+import numpy as np
+
+from mii_buffering_model import Frame, frames_from_schedule
+from mii_buffering_model import ETHERNET_RX_CLIENT_QUEUE_SIZE
+
+# default_ethernet_conf.h
+RGMII_MAC_BUFFER_COUNT_RX = 32
+RGMII_MAC_BUFFER_COUNT_TX = 8
+
+# The buffers held by the receiver, the one being filled and the next one
+RX_HELD_BUFFERS = 2
+
+
+class BuffersFree(object):
+    """ buffers_free_t, holding buffer numbers
+    """
+
+    def __init__(self, buffer_count):
+        self.stack = list(range(buffer_count))
+
+    def take(self):
+        return self.stack.pop() if self.stack else None
+
+    def add(self, buf):
+        self.stack.append(buf)
+
+    def available(self):
+        return len(self.stack)
+
+
+class BuffersUsed(object):
+    """ buffers_used_t. The ring is not checked for being full, as on the
+        device, which is safe as long as it has a slot for every buffer.
+    """
+
+    def __init__(self, buffer_count):
+        self.head_index = 0
+        self.tail_index = 0
+        self.pointers = [None] * buffer_count
+
+    def add(self, packet):
+        if self.head_index - self.tail_index == len(self.pointers):
+            raise RuntimeError("Used buffer ring overflow")
+        self.pointers[self.head_index % len(self.pointers)] = packet
+        self.head_index += 1
+
+    def take(self):
+        packet = self.pointers[self.tail_index % len(self.pointers)]
+        self.tail_index += 1
+        return packet
+
+    def empty(self):
+        return self.head_index == self.tail_index
+
+
+class RxPacket(object):
+    """ A frame held in a buffer
+    """
+
+    def __init__(self, frame, buf):
+        self.frame = frame
+        self.buf = buf
+        self.tcount = 0
+
+
+class RxClient(object):
+    """ An LP client, with its queue of packets
+    """
+
+    def __init__(self, drain_mbps):
+        self.drain_mbps = drain_mbps
+        self.fifo = deque()
+        self.busy = False
+        self.received = 0
+        self.dropped = 0
+        self.starved = []
+        self._starved_since = None
+
+    def record_drop(self, time):
+        self.dropped += 1
+        if self._starved_since is None:
+            self._starved_since = time
+            self.starved.append([time, time, 0])
+        self.starved[-1][1:] = [time, self.starved[-1][2] + 1]
+
+    def record_queued(self):
+        self._starved_since = None
+
+
+class RgmiiRxBufferModel(object):
+    """ The receive buffering of the RGMII MAC with buffer_count buffers.
+        lp_drain_mbps is the rate at which each LP client takes its packets and
+        hp_drain_mbps the rate the HP client is streamed packets at (None if
+        the HP client is not connected, in which case the HP packets are freed
+        straight away). copy_mbps is the rate at which the server copies LP
+        packets to the clients (None to take no time).
+    """
+
+    def __init__(self, lp_drain_mbps, hp_drain_mbps=None, buffer_count=RGMII_MAC_BUFFER_COUNT_RX,
+                 threshold=None, copy_mbps=None):
+        self.buffer_count = buffer_count
+        self.threshold = buffer_count // 2 if threshold is None else threshold
+        self.free_buffers = BuffersFree(buffer_count)
+        self.used_lp = BuffersUsed(buffer_count)
+        self.used_hp = BuffersUsed(buffer_count)
+        self.clients = [RxClient(mbps) for mbps in lp_drain_mbps]
+        self.hp_drain_mbps = hp_drain_mbps
+        self.copy_mbps = copy_mbps
+        self.hp_received = 0
+
+        # The receiver starts with two buffers
+        self.rx_buffers = [self.free_buffers.take() for i in range(RX_HELD_BUFFERS)]
+
+        self._busy_until = 0
+        self._busy_time = 0
+        self._pending = None
+        self._requests = deque()
+
+        self.drops = {"no_buffer": 0, "client_queue_full": 0, "threshold": 0}
+        self.free_timeline = [(0, self.free_buffers.available())]
+        self.min_free = self.free_buffers.available()
+
+    def _get_drain_time(self, num_bytes, mbps):
+        # 1 Mb/s is one bit every 1e9 fs
+        return num_bytes * 8 * 1e9 / mbps if mbps else 0
+
+    def _record_free(self, time):
+        available = self.free_buffers.available()
+        self.min_free = min(self.min_free, available)
+        if self.free_timeline[-1][0] == time:
+            self.free_timeline[-1] = (time, available)
+        else:
+            self.free_timeline.append((time, available))
+
+    def _free(self, time, packet):
+        self.free_buffers.add(packet.buf)
+        self._record_free(time)
+
+    def _release(self, time, packet):
+        """ mii_get_and_dec_transmit_count() and free the packet if it was the last
+        """
+        if packet.tcount:
+            packet.tcount -= 1
+        else:
+            self._free(time, packet)
+
+    def _receive(self, time, frame):
+        """ rgmii_buffer_manager(): the receiver has filled a buffer
+        """
+        buf = self.free_buffers.take()
+        if buf is None:
+            # The frame is dropped and its buffer reused
+            self.drops["no_buffer"] += 1
+            for (i, client) in enumerate(self.clients):
+                if not frame.is_hp and (frame.clients >> i) & 1:
+                    client.record_drop(time)
+            return
+        self._record_free(time)
+
+        packet = RxPacket(frame, self.rx_buffers.pop(0))
+        self.rx_buffers.append(buf)
+        if frame.is_hp:
+            self.used_hp.add(packet)
+        elif frame.clients:
+            self.used_lp.add(packet)
+        else:
+            self._free(time, packet)
+
+    def _handle_incoming_packet(self, time):
+        if self.used_lp.empty():
+            return False
+
+        packet = self.used_lp.take()
+        tcount = 0
+        for (i, client) in enumerate(self.clients):
+            if not (packet.frame.clients >> i) & 1:
+                continue
+            if len(client.fifo) < ETHERNET_RX_CLIENT_QUEUE_SIZE - 1:
+                client.fifo.append(packet)
+                client.record_queued()
+                tcount += 1
+                if not client.busy:
+                    self._requests.append(i)
+                    client.busy = True
+            else:
+                self.drops["client_queue_full"] += 1
+                client.record_drop(time)
+
+        if tcount == 0:
+            self._free(time, packet)
+        else:
+            packet.tcount = tcount - 1
+        return True
+
+    def _drop_lp_packets(self, time):
+        dropped = False
+        for client in self.clients:
+            if client.fifo:
+                self._release(time, client.fifo.popleft())
+                self.drops["threshold"] += 1
+                client.record_drop(time)
+                dropped = True
+        return dropped
+
+    def _block(self, time, duration, action, events):
+        """ Block the server for a time, after which the action is completed
+        """
+        self._busy_until = time + duration
+        self._busy_time += duration
+        self._pending = action
+        heapq.heappush(events, (self._busy_until, 1, "server", 0))
+
+    def _poll(self, time, events):
+        """ Run the server loop until there is nothing more it can do
+        """
+        if time < self._busy_until:
+            return
+        if self._pending:
+            (action, self._pending) = (self._pending, None)
+            action(time)
+
+        while True:
+            progress = False
+
+            # Serve a client that is waiting for a packet
+            while self._requests:
+                i = self._requests.popleft()
+                client = self.clients[i]
+                if not client.fifo:
+                    client.busy = False
+                    continue
+                packet = client.fifo.popleft()
+
+                def done(time, i=i, packet=packet):
+                    client = self.clients[i]
+                    self._release(time, packet)
+                    client.received += 1
+                    drain_time = self._get_drain_time(packet.frame.num_bytes, client.drain_mbps)
+                    heapq.heappush(events, (time + drain_time, 2, "client", i))
+
+                copy_time = self._get_drain_time(packet.frame.num_bytes, self.copy_mbps)
+                if copy_time:
+                    self._block(time, copy_time, done, events)
+                    return
+                done(time)
+                progress = True
+                break
+
+            # Stream the HP packets
+            while not self.used_hp.empty():
+                packet = self.used_hp.take()
+
+                def streamed(time, packet=packet):
+                    self.hp_received += 1
+                    self._free(time, packet)
+
+                if self.hp_drain_mbps is None:
+                    self._free(time, packet)
+                    continue
+                self._block(time, self._get_drain_time(packet.frame.num_bytes, self.hp_drain_mbps),
+                            streamed, events)
+                return
+
+            progress |= self._handle_incoming_packet(time)
+
+            if self.hp_drain_mbps is not None:
+                if self.free_buffers.available() <= self.threshold:
+                    progress |= self._drop_lp_packets(time)
+
+            if not progress and not self._requests:
+                return
+
+    def run(self, frames):
+        """ Replay the frames and return the results
+        """
+        events = [(frame.end, 0, "end", i) for (i, frame) in enumerate(frames)]
+        heapq.heapify(events)
+        end_time = 0
+
+        while events:
+            (time, priority, kind, data) = heapq.heappop(events)
+            end_time = max(end_time, time)
+            if kind == "end":
+                self._receive(time, frames[data])
+            elif kind == "client":
+                client = self.clients[data]
+                if client.fifo:
+                    self._requests.append(data)
+                else:
+                    client.busy = False
+            self._poll(time, events)
+
+        return self.get_results(len(frames), end_time)
+
+    def get_results(self, num_frames, end_time):
+        (times, free) = zip(*self.free_timeline)
+        return {
+            "frames": num_frames,
+            "hp_received": self.hp_received,
+            "lp_received": [client.received for client in self.clients],
+            "lp_dropped": [client.dropped for client in self.clients],
+            "drops": dict(self.drops),
+            "min_free": self.min_free,
+            "server_busy": self._busy_time / end_time if end_time else 0,
+            "free_timeline": (np.array(times), np.array(free)),
+            "starved": [[tuple(s) for s in client.starved] for client in self.clients],
+          }
+
+
+def sweep(frames, buffer_counts, lp_drain_mbps, hp_drain_mbps=None, copy_mbps=None):
+    """ Returns the results of the frames for each of a list of buffer counts
+    """
+    return {count: RgmiiRxBufferModel(lp_drain_mbps, hp_drain_mbps, count, copy_mbps=copy_mbps).run(frames)
+            for count in buffer_counts}
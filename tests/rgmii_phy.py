@@ -5,8 +5,9 @@ import Pyxsim as px
 import sys
 import zlib
 from mii_phy import TxPhy, RxPhy
-from mii_packet import MiiPacket
+from mii_packet import MiiPacket, FrameAssembler
 from mii_clock import Clock
+from mii_schedule import encode_nibbles, encode_nibble_pairs
 
 def pairwise(t):
     it = iter(t)
@@ -21,11 +22,11 @@ class RgmiiTransmitter(TxPhy):
     def __init__(self, rxd, rxd_100, rxdv, mode_rxd, mode_rxdv, rxer, clock,
                  initial_delay=130000*1e6, verbose=False, test_ctrl=None,
                  do_timeout=True, complete_fn=None, expect_loopback=True,
-                 dut_exit_time=25000*1e6):
+                 dut_exit_time=25000*1e6, compiled=False):
         super(RgmiiTransmitter, self).__init__('rgmii', rxd, rxdv, rxer, clock,
                                                initial_delay, verbose, test_ctrl,
                                                do_timeout, complete_fn, expect_loopback,
-                                               dut_exit_time)
+                                               dut_exit_time, compiled)
         self._mode_rxd = mode_rxd
         self._rxd_100 = rxd_100
         self._mode_rxdv = mode_rxdv
@@ -34,6 +35,10 @@ class RgmiiTransmitter(TxPhy):
         # Create the byte-wide version of the data
         self._phy_status = (self._phy_status << 4) | self._phy_status
 
+        self._data_ports = [rxd, rxd_100, mode_rxd]
+        self._dv_ports = [rxdv, mode_rxdv]
+        self._idle_data = self._phy_status
+
     def set_dv(self, value):
         self.xsi.drive_port_pins(self._rxdv, value)
         self.xsi.drive_port_pins(self._mode_rxdv, value)
@@ -43,12 +48,31 @@ class RgmiiTransmitter(TxPhy):
         self.xsi.drive_port_pins(self._rxd_100, value)
         self.xsi.drive_port_pins(self._mode_rxd, value)
 
+    def compile_schedule(self, packets):
+        if self._clock.get_rate() == Clock.CLK_125MHz:
+            # The RGMII phy puts a nibble on each edge at 1Gb/s. This is mapped
+            # to having a byte every clock by the shim in the DUT
+            return encode_nibble_pairs(packets)
+
+        # The RGMII phy will replicate the data on both edges at 10/100Mb/s
+        schedule = encode_nibbles(packets)
+        return schedule._replace(data=schedule.data | (schedule.data << 4))
+
+    def get_schedule_key(self):
+        # The rate is read at the start of each packet, so the schedule is
+        # compiled again from the next packet when it changes
+        return self._clock.get_rate()
+
     def run(self):
         xsi = self.xsi
 
         # When DV is low, the PHY should indicate its mode on the DATA pins
         self.set_data(self._phy_status)
 
+        if self._compiled:
+            self.run_compiled()
+            return
+
         self.start_test()
 
         for i,packet in enumerate(self._packets):
@@ -68,7 +92,9 @@ class RgmiiTransmitter(TxPhy):
                 i = 0
                 for (a,b) in pairwise(packet.get_nibbles()):
                     byte = a | (b << 4)
-                    self.wait(lambda x: self._clock.is_low())
+                    self.wait_for_clock_low()
+                    if i == 0:
+                        self.frame_started(packet)
                     self.set_dv(1)
                     self.set_data(byte)
 
@@ -78,13 +104,15 @@ class RgmiiTransmitter(TxPhy):
                     else:
                         xsi.drive_port_pins(self._rxer, 0)
 
-                    self.wait(lambda x: self._clock.is_high())
+                    self.wait_for_clock_high()
                     i += 2
             else:
                 # The RGMII phy will replicate the data on both edges at 10/100Mb/s
                 for (i, nibble) in enumerate(packet.get_nibbles()):
                     byte = nibble | (nibble << 4)
-                    self.wait(lambda x: self._clock.is_low())
+                    self.wait_for_clock_low()
+                    if i == 0:
+                        self.frame_started(packet)
                     self.set_dv(1)
                     self.set_data(byte)
 
@@ -94,14 +122,15 @@ class RgmiiTransmitter(TxPhy):
                     else:
                         xsi.drive_port_pins(self._rxer, 0)
 
-                    self.wait(lambda x: self._clock.is_high())
+                    self.wait_for_clock_high()
 
-            self.wait(lambda x: self._clock.is_low())
+            self.wait_for_clock_low()
 
             # When DV is low, the PHY should indicate its mode on the DATA pins
             self.set_data(self._phy_status)
             self.set_dv(0)
             xsi.drive_port_pins(self._rxer, 0)
+            self.packet_sent(packet)
 
             if self._verbose:
                 print("Sent")
@@ -123,6 +152,7 @@ class RgmiiReceiver(RxPhy):
         # Need a random number generator for the MiiPacket constructor but it shouldn't
         # have any affect as only blank packets are being created
         rand = random.Random()
+        frame = FrameAssembler()
 
         packet_count = 0
         last_frame_end_time = None
@@ -139,6 +169,7 @@ class RgmiiReceiver(RxPhy):
 
             # Start with a blank packet to ensure they are filled in by the receiver
             packet = MiiPacket(rand, blank=True)
+            frame.start()
 
             frame_start_time = self.xsi.get_time()
             in_preamble = True
@@ -149,12 +180,10 @@ class RgmiiReceiver(RxPhy):
                 packet.inter_frame_gap = ifgap
 
             while True:
-                # Wait for a falling clock edge or enable low
-                self.wait(lambda x: self._clock.is_low() or \
-                                   xsi.sample_port_pins(self._txen) == 0)
-
+                # Wait for a falling clock edge. TXEN is checked on both edges
+                # of the clock to find the end of the frame
+                self.wait_for_clock_low()
                 if xsi.sample_port_pins(self._txen) == 0:
-                    last_frame_end_time = self.xsi.get_time()
                     break
 
                 byte = xsi.sample_port_pins(self._txd)
@@ -171,7 +200,7 @@ class RgmiiReceiver(RxPhy):
                             packet.append_preamble_nibble(byte & 0xf)
                             packet.append_preamble_nibble(byte >> 4)
                     else:
-                        packet.append_data_byte(byte)
+                        frame.append_byte(byte)
                 else:
                     # The RGMII phy at 10/100Mb/s only gets one nibble of data per clock
                     nibble = byte & 0xf
@@ -182,11 +211,20 @@ class RgmiiReceiver(RxPhy):
                         else:
                             packet.append_preamble_nibble(nibble)
                     else:
-                        packet.append_data_nibble(nibble)
+                        frame.append_nibble(nibble)
+
+                self.wait_for_clock_high()
+                if xsi.sample_port_pins(self._txen) == 0:
+                    break
+
+            last_frame_end_time = self.xsi.get_time()
+            frame.complete(packet)
 
-                self.wait(lambda x: self._clock.is_high())
+            if self._capture:
+                self._capture.write_frame(frame.get_frame_bytes(), frame_start_time)
 
-            packet.complete()
+            if self._metrics:
+                self._metrics.frame_received(packet, last_frame_end_time)
 
             if self._print_packets:
                 sys.stdout.write(packet.dump())
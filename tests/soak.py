@@ -0,0 +1,309 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# A soak runner for the randomized tests. Each test (or test id) is run with many
+# seeds, each run a separate pytest process with the seed passed in SOAK_SEED,
+# spread across a process pool. The result of each run, the metrics it recorded
+# (see helpers.record_soak_metrics) and the tail of its output are stored in an
+# SQLite database so that runs can be reported and failing runs re-run by ID.
+#
+# The packet schedule of a failing run can be minimized. The runs only send the
+# packets selected in SOAK_PACKETS, and the selection is narrowed down by
+# bisecting the packet list while the run still fails.
+#
+# The DUT configs that the collected tests run are built before the runs are
+# started, so that the runs never race to build them.
+#
+# Usage (from the tests directory):
+#   python soak.py run test_rx_queues.py test_rx.py --seeds 1000 [--jobs N]
+#   python soak.py report [--failed]
+#   python soak.py rerun ID
+#   python soak.py minimize ID
+#
+
+import argparse
+import json
+import os
+import random
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from helpers import tests_dir, build_if_needed, get_app_configs, parse_packet_selection, format_packet_selection
+
+default_db = tests_dir / "soak.sqlite"
+
+# The number of characters of the output of a run kept in the database
+OUTPUT_TAIL = 20000
+
+schema = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    nodeid TEXT NOT NULL,
+    seed INTEGER NOT NULL,
+    packets TEXT,
+    passed INTEGER NOT NULL,
+    duration_s REAL NOT NULL,
+    metrics TEXT NOT NULL,
+    output TEXT NOT NULL,
+    minimized_from INTEGER,
+    created TEXT NOT NULL
+)
+"""
+
+
+def open_db(filename):
+    db = sqlite3.connect(filename)
+    db.row_factory = sqlite3.Row
+    db.execute(schema)
+    return db
+
+
+def add_run(db, run, minimized_from=None):
+    """ Store the result of a run, returns its ID
+    """
+    cursor = db.execute(
+        "INSERT INTO runs (nodeid, seed, packets, passed, duration_s, metrics, output, minimized_from, created)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))",
+        (run["nodeid"], run["seed"], run["packets"], int(run["passed"]), run["duration_s"],
+         json.dumps(run["metrics"]), run["output"], minimized_from))
+    db.commit()
+    return cursor.lastrowid
+
+
+def get_run(db, run_id):
+    row = db.execute("SELECT * FROM runs WHERE id = ?", (run_id,)).fetchone()
+    if row is None:
+        raise ValueError(f"There is no run {run_id}")
+    return row
+
+
+def run_test(nodeid, seed, packets=None, capture=True):
+    """ Run one test in a new pytest process with the given seed and, if set, only
+        the selected packets. Returns the result of the run.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        metrics_file = Path(tmp_dir) / "metrics.json"
+        env = dict(os.environ, SOAK_SEED=str(seed), SOAK_METRICS=str(metrics_file))
+        env.pop("SOAK_PACKETS", None)
+        if packets:
+            env["SOAK_PACKETS"] = packets
+
+        command = [sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider", nodeid]
+        if not capture:
+            command.append("-s")
+
+        start_time = time.perf_counter()
+        result = subprocess.run(command, cwd=tests_dir, env=env, text=True,
+                                stdout=subprocess.PIPE if capture else None,
+                                stderr=subprocess.STDOUT if capture else None)
+        duration = time.perf_counter() - start_time
+
+        metrics = json.loads(metrics_file.read_text()) if metrics_file.is_file() else {}
+
+    return {"nodeid": nodeid, "seed": seed, "packets": packets,
+            "passed": result.returncode == 0, "duration_s": duration, "metrics": metrics,
+            "output": (result.stdout or "")[-OUTPUT_TAIL:]}
+
+
+def collect_tests(tests):
+    """ Returns the pytest node IDs of the given tests
+    """
+    result = subprocess.run([sys.executable, "-m", "pytest", "--collect-only", "-q",
+                             "-p", "no:cacheprovider"] + tests,
+                            cwd=tests_dir, text=True, stdout=subprocess.PIPE, check=True)
+    return [line for line in result.stdout.splitlines() if "::" in line]
+
+
+def get_dut_app(test_file):
+    """ Returns the test application that the tests in a file run, which is the
+        directory of the same name or the one the file passes as override_dut_dir.
+        Returns None for tests that do not run a DUT.
+    """
+    if (tests_dir / Path(test_file).stem / "CMakeLists.txt").is_file():
+        return Path(test_file).stem
+
+    match = re.search(r"override_dut_dir=[\"'](\w+)[\"']", (tests_dir / test_file).read_text())
+    return match.group(1) if match else None
+
+
+def get_build_configs(nodeids):
+    """ Returns the (application, config) pairs that the tests need built. A test is
+        matched to the profiles of its application by its parameter ID, and needs
+        all of them if none match.
+    """
+    configs = set()
+    for nodeid in nodeids:
+        (test_file, _, name) = nodeid.partition("::")
+        app = get_dut_app(test_file)
+        if app is None:
+            continue
+
+        test_id = name.partition("[")[2].rstrip("]").split("-")
+        app_configs = get_app_configs(app)
+        matched = [config for (profile, config) in app_configs
+                   if is_sublist([str(v) for v in profile.values()], test_id)]
+        configs.update((app, config) for config in (matched or [c for (p, c) in app_configs]))
+    return sorted(configs)
+
+
+def is_sublist(items, values):
+    return any(values[i:i + len(items)] == items for i in range(len(values) - len(items) + 1))
+
+
+def build_collected(nodeids):
+    """ Build the DUT configs that the collected tests run, unless already built
+    """
+    for (app, config) in get_build_configs(nodeids):
+        build_if_needed(app, config)
+
+
+def minimize(indices, fails):
+    """ Returns a minimal subset of the indices for which fails(indices) is True,
+        which must be True for all the indices to begin with. The indices are split
+        into chunks and any chunk (or the rest of the indices without a chunk) that
+        still fails is kept, with the chunks halved each time none do.
+    """
+    num_chunks = 2
+    while len(indices) > 1:
+        size = -(-len(indices) // num_chunks)
+        chunks = [indices[i:i + size] for i in range(0, len(indices), size)]
+
+        for chunk in chunks:
+            if fails(chunk):
+                (indices, num_chunks) = (chunk, 2)
+                break
+        else:
+            for (i, chunk) in enumerate(chunks):
+                rest = [x for c in chunks[:i] + chunks[i + 1:] for x in c]
+                if len(chunks) > 2 and fails(rest):
+                    (indices, num_chunks) = (rest, max(num_chunks - 1, 2))
+                    break
+            else:
+                if num_chunks >= len(indices):
+                    break
+                num_chunks = min(num_chunks * 2, len(indices))
+    return indices
+
+
+def do_run(args):
+    nodeids = collect_tests(args.tests)
+    if not nodeids:
+        sys.exit("No tests collected")
+
+    if not args.no_build:
+        build_collected(nodeids)
+
+    rand = random.Random(args.seed)
+    jobs = [(nodeid, rand.randint(0, sys.maxsize)) for nodeid in nodeids for i in range(args.seeds)]
+    print(f"Running {len(nodeids)} tests with {args.seeds} seeds each on {args.jobs} processes")
+
+    db = open_db(args.db)
+    num_failed = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [pool.submit(run_test, nodeid, seed) for (nodeid, seed) in jobs]
+        for (i, future) in enumerate(as_completed(futures)):
+            run = future.result()
+            run_id = add_run(db, run)
+            if not run["passed"]:
+                num_failed += 1
+                print(f"FAILED {run_id}: {run['nodeid']} seed {run['seed']}")
+            if (i + 1) % 100 == 0 or i + 1 == len(futures):
+                print(f"{i + 1}/{len(futures)} runs, {num_failed} failed")
+    sys.exit(1 if num_failed else 0)
+
+
+def do_report(args):
+    db = open_db(args.db)
+    query = "SELECT id, nodeid, seed, packets, passed, duration_s FROM runs"
+    if args.failed:
+        query += " WHERE passed = 0"
+    for row in db.execute(query + " ORDER BY id"):
+        result = "PASSED" if row["passed"] else "FAILED"
+        packets = f" packets {row['packets']}" if row["packets"] else ""
+        print(f"{row['id']:>6} {result} {row['duration_s']:8.1f}s {row['nodeid']} seed {row['seed']}{packets}")
+
+    for row in db.execute("SELECT nodeid, COUNT(*) AS runs, SUM(1 - passed) AS failed FROM runs"
+                          " GROUP BY nodeid ORDER BY nodeid"):
+        print(f"{row['nodeid']}: {row['runs']} runs, {row['failed']} failed")
+
+
+def do_rerun(args):
+    db = open_db(args.db)
+    row = get_run(db, args.id)
+    print(f"Re-running {row['nodeid']} seed {row['seed']}")
+    run = run_test(row["nodeid"], row["seed"], row["packets"], capture=False)
+    sys.exit(0 if run["passed"] else 1)
+
+
+def do_minimize(args):
+    db = open_db(args.db)
+    row = get_run(db, args.id)
+    if row["passed"]:
+        sys.exit(f"Run {args.id} passed")
+
+    if row["packets"]:
+        indices = parse_packet_selection(row["packets"])
+    else:
+        num_packets = json.loads(row["metrics"]).get("num_packets")
+        if not num_packets:
+            sys.exit(f"{row['nodeid']} does not support selecting its packets")
+        indices = list(range(num_packets))
+
+    failing = {}
+
+    def fails(selection):
+        packets = format_packet_selection(selection)
+        run = run_test(row["nodeid"], row["seed"], packets)
+        print(f"{len(selection)} packets: {'FAILED' if not run['passed'] else 'passed'}")
+        if not run["passed"]:
+            failing[packets] = run
+        return not run["passed"]
+
+    print(f"Minimizing {row['nodeid']} seed {row['seed']} from {len(indices)} packets")
+    indices = minimize(indices, fails)
+    packets = format_packet_selection(indices)
+    if packets not in failing:
+        print(f"No smaller failing schedule found than run {args.id}")
+        return
+
+    run_id = add_run(db, failing[packets], minimized_from=args.id)
+    print(f"Run {run_id} fails with packets {packets}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the randomized tests with many seeds")
+    parser.add_argument("--db", default=default_db, help="The results database")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Run tests with many seeds")
+    run.add_argument("tests", nargs="+", help="The test files or node IDs to run")
+    run.add_argument("--seeds", type=int, default=100, help="The number of seeds to run each test with")
+    run.add_argument("--jobs", type=int, default=os.cpu_count(), help="The number of runs at a time")
+    run.add_argument("--seed", type=int, default=None, help="The seed used to choose the seeds of the runs")
+    run.add_argument("--no-build", action="store_true", help="Do not build the test applications first")
+    run.set_defaults(fn=do_run)
+
+    report = commands.add_parser("report", help="List the runs")
+    report.add_argument("--failed", action="store_true", help="Only list the failed runs")
+    report.set_defaults(fn=do_report)
+
+    rerun = commands.add_parser("rerun", help="Re-run a run with its output shown")
+    rerun.add_argument("id", type=int)
+    rerun.set_defaults(fn=do_rerun)
+
+    minimize_run = commands.add_parser("minimize", help="Minimize the packets of a failing run")
+    minimize_run.add_argument("id", type=int)
+    minimize_run.set_defaults(fn=do_minimize)
+
+    args = parser.parse_args()
+    args.fn(args)
+
+
+if __name__ == "__main__":
+    main()
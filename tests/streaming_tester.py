@@ -0,0 +1,130 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# An ordered output tester that checks the output of a simulation while it is
+# running. A monitor thread periodically takes the output captured so far and
+# compares it line by line with the expected output. On the first mismatch the
+# simulation is terminated rather than running on to the end of the test.
+#
+
+import re
+import sys
+import Pyxsim as px
+
+
+class StreamingTester(object):
+    """ Compare the output of a simulation with the lines of a golden file (or
+        any iterable of lines) in order. Empty lines are ignored, as are output
+        lines matching one of the ignore regular expressions. If regexp is set
+        then each expected line is a regular expression to match.
+
+        This is the tester passed to run_on_simulator_(). The thread returned by
+        get_monitor() must also be run so that the output is checked as it is
+        produced.
+    """
+
+    def __init__(self, golden, regexp=False, ignore=[]):
+        self._expected = (line.strip() for line in golden if line.strip())
+        self._regexp = regexp
+        self._ignore = [re.compile(x) for x in ignore]
+        self._line_num = 0
+        self._partial = ''
+        self._output = []
+        self._errors = []
+        self.failure = None
+
+    def get_monitor(self, capfd, poll_period=None):
+        """ Returns the thread that checks the output while the simulation runs
+        """
+        return OutputMonitor(self, capfd, poll_period)
+
+    def _fail(self, reason, time):
+        if self.failure is None:
+            when = "" if time is None else f" (at simulated time {time/1e6:.0f} ns)"
+            self.failure = f"Line {self._line_num} of output {reason}{when}"
+
+    def check_line(self, line, time=None):
+        """ Check the next line of output. Returns False once a mismatch has been found.
+        """
+        self._output.append(line)
+        line = line.strip()
+        if self.failure is not None or not line:
+            return self.failure is None
+        if any(pattern.match(line) for pattern in self._ignore):
+            return True
+
+        self._line_num += 1
+        expected = next(self._expected, None)
+        if expected is None:
+            self._fail(f"was not expected, got:\n `{line}`", time)
+        elif self._regexp and not re.match(expected, line):
+            self._fail(f"does not match:\n `{expected}`\n got:\n `{line}`", time)
+        elif not self._regexp and line != expected:
+            self._fail(f"expected:\n `{expected}`\n got:\n `{line}`", time)
+
+        return self.failure is None
+
+    def check_output(self, text, errors='', time=None):
+        """ Check a chunk of captured output, which may end part way through a line.
+            Returns False once a mismatch has been found.
+        """
+        self._errors.append(errors)
+        lines = (self._partial + text).split('\n')
+        self._partial = lines.pop()
+        for line in lines:
+            if not self.check_line(line, time):
+                return False
+        return True
+
+    def get_output(self):
+        return self._output
+
+    def run(self, output):
+        """ Check the output remaining at the end of the simulation
+        """
+        lines = list(output)
+        if self._partial:
+            lines = [self._partial + (lines[0] if lines else '')] + lines[1:]
+            self._partial = ''
+        for line in lines:
+            self.check_line(line)
+
+        if self.failure is None:
+            missing = next(self._expected, None)
+            if missing is not None:
+                self._line_num += 1
+                self._fail(f"missing, expected:\n `{missing}`", None)
+
+        # The errors were consumed while checking the output so report them again
+        sys.stderr.write(''.join(self._errors))
+        self._errors = []
+
+        if self.failure is not None:
+            sys.stderr.write(f"ERROR: {self.failure}\n")
+            return False
+        return True
+
+
+class OutputMonitor(px.SimThread):
+    """ Periodically pass the captured output to a StreamingTester and terminate
+        the simulation as soon as it reports a mismatch
+    """
+
+    # Default time between checks of the output in fs
+    POLL_PERIOD = 20000*1e6
+
+    def __init__(self, tester, capfd, poll_period=None):
+        self._tester = tester
+        self._capfd = capfd
+        self._poll_period = poll_period if poll_period else self.POLL_PERIOD
+
+    def check(self):
+        (out, err) = self._capfd.readouterr()
+        if not self._tester.check_output(out, err, self.xsi.get_time()):
+            print(f"ERROR: {self._tester.failure}")
+            self.xsi.terminate()
+
+    def run(self):
+        while True:
+            self.wait_until(self.xsi.get_time() + self._poll_period)
+            self.check()
@@ -15,6 +15,7 @@ from rgmii_phy import RgmiiTransmitter, RgmiiReceiver
 from mii_packet import MiiPacket
 from helpers import do_rx_test, get_dut_mac_address, check_received_packet, packet_processing_time
 from helpers import get_sim_args, get_mii_tx_clk_phy, get_rgmii_tx_clk_phy
+from helpers import run_on_simulator
 
 with open(Path(__file__).parent / "test_appdata/test_params.json") as f:
     params = json.load(f)
@@ -55,12 +56,12 @@ def do_test(capfd, mac, arch, tx_clk, tx_phy):
     tester = px.testers.ComparisonTester(open('test_appdata_{phy}_{mac}.expect'.format(phy=tx_phy.get_name(), mac=mac)), ordered=False)
     simargs = get_sim_args(testname, mac, tx_clk, tx_phy)
 
-    result = px.run_on_simulator_(  binary,
-                                    simthreads=[tx_clk, tx_phy],
-                                    tester=tester,
-                                    simargs=simargs,
-                                    do_xe_prebuild=False,
-                                    capfd=capfd)
+    result = run_on_simulator(binary,
+                              simthreads=[tx_clk, tx_phy],
+                              tester=tester,
+                              simargs=simargs,
+                              do_xe_prebuild=False,
+                              capfd=capfd)
 
     assert result is True, f"{result}"
 
@@ -0,0 +1,42 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# Check the comparison of benchmark results with the baseline and tolerances.
+#
+
+from bench.baseline import load_baseline, compare, update_baseline
+
+tolerances = {
+    "throughput_mbps": {"better": "higher", "relative": 0.02},
+    "drops": {"better": "lower", "absolute": 0},
+    "latency_p99_ns": {"better": "lower", "relative": 0.05, "absolute": 10},
+  }
+
+
+def test_compare():
+    baseline = {"tolerances": tolerances,
+                "results": {"rt-mii-25MHz-imix": {"throughput_mbps": 90.0, "drops": 0,
+                                                  "latency_p99_ns": 1000.0, "wall_time_s": 10}}}
+
+    # Within tolerance, better than the baseline or not compared at all
+    result = {"throughput_mbps": 88.5, "drops": 0, "latency_p99_ns": 1055.0, "wall_time_s": 100}
+    assert compare("rt-mii-25MHz-imix", result, baseline) == []
+    assert compare("rt-mii-25MHz-imix", dict(result, throughput_mbps=95.0), baseline) == []
+    assert compare("rt-rgmii-25MHz-imix", {"drops": 10}, baseline) == []
+
+    regressions = compare("rt-mii-25MHz-imix", dict(result, throughput_mbps=88.0, drops=1,
+                                                    latency_p99_ns=1061.0), baseline)
+    assert len(regressions) == 3
+    assert regressions[0].startswith("rt-mii-25MHz-imix: throughput_mbps 88 is worse than the baseline 90")
+
+
+def test_update(tmp_path):
+    filename = tmp_path / "baseline.json"
+    assert load_baseline(filename) == {"tolerances": {}, "results": {}}
+
+    update_baseline(filename, "b", {"drops": 1})
+    update_baseline(filename, "a", {"drops": 2})
+    update_baseline(filename, "b", {"drops": 0})
+    baseline = load_baseline(filename)
+    assert list(baseline["results"]) == ["a", "b"]
+    assert baseline["results"]["b"] == {"drops": 0}
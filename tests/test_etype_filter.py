@@ -15,16 +15,14 @@ from rgmii_phy import RgmiiTransmitter, RgmiiReceiver
 from mii_packet import MiiPacket
 from helpers import do_rx_test, get_dut_mac_address, check_received_packet
 from helpers import get_sim_args, get_mii_tx_clk_phy, get_rgmii_tx_clk_phy
+from helpers import run_on_simulator
 
 with open(Path(__file__).parent / "test_etype_filter/test_params.json") as f:
     params = json.load(f)
 
-def do_test(capfd, mac, arch, tx_clk, tx_phy, seed):
+def do_test(capfd, mac, arch, tx_clk, tx_phy, packets, expect_file):
     testname = 'test_etype_filter'
 
-    rand = random.Random()
-    rand.seed(seed)
-
     profile = f'{mac}_{tx_phy.get_name()}'
     binary = f'{testname}/bin/{profile}/{testname}_{profile}.xe'
     assert os.path.isfile(binary)
@@ -32,49 +30,79 @@ def do_test(capfd, mac, arch, tx_clk, tx_phy, seed):
     with capfd.disabled():
         print(f"Running {testname}: {tx_phy.get_name()} phy at {tx_clk.get_name()}")
 
-    dut_mac_address = get_dut_mac_address()
-    packets = [
-        MiiPacket(rand, dst_mac_addr=dut_mac_address, src_mac_addr=[0 for x in range(6)],
-                  ether_len_type=[0x11, 0x11], data_bytes=[1,2,3,4] + [0 for x in range(50)]),
-        MiiPacket(rand, dst_mac_addr=dut_mac_address, src_mac_addr=[0 for x in range(6)],
-                  ether_len_type=[0x22, 0x22], data_bytes=[5,6,7,8] + [0 for x in range(60)])
-      ]
-
     tx_phy.set_packets(packets)
 
-    tester = px.testers.ComparisonTester(open('test_etype_filter.expect'), ordered=False)
+    tester = px.testers.ComparisonTester(open(expect_file), ordered=False)
 
     simargs = get_sim_args(testname, mac, tx_clk, tx_phy)
 
-    result = px.run_on_simulator_(  binary,
-                                    simthreads=[tx_clk, tx_phy],
-                                    tester=tester,
-                                    simargs=simargs,
-                                    do_xe_prebuild=False,
-                                    capfd=capfd)
+    result = run_on_simulator(binary,
+                              simthreads=[tx_clk, tx_phy],
+                              tester=tester,
+                              simargs=simargs,
+                              do_xe_prebuild=False,
+                              capfd=capfd)
 
     assert result is True, f"{result}"
 
-@pytest.mark.parametrize("params", params["PROFILES"], ids=["-".join(list(profile.values())) for profile in params["PROFILES"]])
-def test_etype_filter(capfd, params):
-    seed = 1
-
-      # Test 100 MBit - MII XS2
+def get_tx_clk_phy(params, verbose):
     if params["phy"] == "mii":
-        (tx_clk_25, tx_mii) = get_mii_tx_clk_phy(verbose=True, test_ctrl="tile[0]:XS1_PORT_1A")
-        do_test(capfd, params["mac"], params["arch"], tx_clk_25, tx_mii, seed)
+        # Test 100 MBit - MII XS2
+        return get_mii_tx_clk_phy(verbose=verbose, test_ctrl="tile[0]:XS1_PORT_1A")
 
     elif params["phy"] == "rgmii":
         # Test 100 MBit - RGMII
         if params["clk"] == "25MHz":
-            (tx_clk_25, tx_rgmii) = get_rgmii_tx_clk_phy(Clock.CLK_25MHz, verbose=True, test_ctrl="tile[0]:XS1_PORT_1A")
-            do_test(capfd, params["mac"], params["arch"], tx_clk_25, tx_rgmii, seed)
+            return get_rgmii_tx_clk_phy(Clock.CLK_25MHz, verbose=verbose, test_ctrl="tile[0]:XS1_PORT_1A")
         # Test 1000 MBit - RGMII
         elif params["clk"] == "125MHz":
-            (tx_clk_125, tx_rgmii) = get_rgmii_tx_clk_phy(Clock.CLK_125MHz, verbose=True, test_ctrl="tile[0]:XS1_PORT_1A")
-            do_test(capfd, params["mac"], params["arch"], tx_clk_125, tx_rgmii, seed)
-        else:
-            assert 0, f"Invalid params: {params}"
+            return get_rgmii_tx_clk_phy(Clock.CLK_125MHz, verbose=verbose, test_ctrl="tile[0]:XS1_PORT_1A")
+
+    assert 0, f"Invalid params: {params}"
+
+@pytest.mark.parametrize("params", params["PROFILES"], ids=["-".join(list(profile.values())) for profile in params["PROFILES"]])
+def test_etype_filter(capfd, params):
+    seed = 1
+    rand = random.Random()
+    rand.seed(seed)
+
+    dut_mac_address = get_dut_mac_address()
+    packets = [
+        MiiPacket(rand, dst_mac_addr=dut_mac_address, src_mac_addr=[0 for x in range(6)],
+                  ether_len_type=[0x11, 0x11], data_bytes=[1,2,3,4] + [0 for x in range(50)]),
+        MiiPacket(rand, dst_mac_addr=dut_mac_address, src_mac_addr=[0 for x in range(6)],
+                  ether_len_type=[0x22, 0x22], data_bytes=[5,6,7,8] + [0 for x in range(60)])
+      ]
+
+    (tx_clk, tx_phy) = get_tx_clk_phy(params, verbose=True)
+    do_test(capfd, params["mac"], params["arch"], tx_clk, tx_phy, packets, 'test_etype_filter.expect')
+
+# The Ethertypes sent by test_etype_filter_large. The DUT clients each add a
+# large set of Ethertypes, some of which are shared, and both add and then
+# delete 0x3333. Client 2 adds 0x89db when the entries from its hash are full
+LARGE_SET_ETYPES = [
+    0x88f7, # Client 1 only
+    0x86dd, # Client 2 only
+    0x0800, # Both clients
+    0x3333, # Deleted
+    0x4444, # Never added
+    0x9000, # Client 1 only
+    0x89db, # Client 2 only, added after the entries from its hash are full
+  ]
+
+@pytest.mark.parametrize("params", params["PROFILES"], ids=["-".join(list(profile.values())) for profile in params["PROFILES"]])
+def test_etype_filter_large(capfd, params):
+    seed = 1
+    rand = random.Random()
+    rand.seed(seed)
+
+    # The second data byte identifies the packet in the DUT output
+    dut_mac_address = get_dut_mac_address()
+    packets = [
+        MiiPacket(rand, dst_mac_addr=dut_mac_address, src_mac_addr=[0 for x in range(6)],
+                  ether_len_type=[etype >> 8, etype & 0xff], data_bytes=[0, 0x10 + i] + [0 for x in range(52)])
+        for (i, etype) in enumerate(LARGE_SET_ETYPES)
+      ]
 
-    else:
-        assert 0, f"Invalid params: {params}"
+    (tx_clk, tx_phy) = get_tx_clk_phy(params, verbose=False)
+    do_test(capfd, params["mac"], params["arch"], tx_clk, tx_phy, packets, 'test_etype_filter_large.expect')
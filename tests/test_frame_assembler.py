@@ -0,0 +1,90 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# Check that frames built by the receive-side FrameAssembler are the same as
+# those built a nibble at a time with MiiPacket.append_data_nibble().
+#
+
+import random
+import pytest
+
+from mii_packet import MiiPacket, FrameAssembler
+
+
+class FakeClock(object):
+    def get_min_ifg(self):
+        return 960 * 1e6
+
+
+def create_frames(rand):
+    frames = []
+    for num_data_bytes in [46, 100, 1500, 1600]:
+        frames.append(MiiPacket(rand, num_data_bytes=num_data_bytes).get_frame_bytes())
+    frames.append(MiiPacket(rand, vlan_prio_tag=[0x81, 0x00, 0x12, 0x34]).get_frame_bytes())
+    frames.append(MiiPacket(rand, corrupt_crc=True).get_frame_bytes())
+
+    # Runt frames of every length, with and without a VLAN tag
+    frame = MiiPacket(rand, vlan_prio_tag=[0x81, 0x00, 0x00, 0x01], num_data_bytes=0).get_frame_bytes()
+    frames += [frame[:i] for i in range(len(frame) + 1)]
+    frame = MiiPacket(rand, num_data_bytes=0).get_frame_bytes()
+    frames += [frame[:i] for i in range(len(frame) + 1)]
+    return frames
+
+
+def nibbles_of(frame):
+    for byte in frame:
+        yield byte & 0xf
+        yield byte >> 4
+
+
+def check_same(expected, packet, capsys):
+    for field in ['dst_mac_addr', 'src_mac_addr', 'vlan_prio_tag', 'ether_len_type',
+                  'data_bytes', 'num_data_bytes', 'packet_crc', 'nibble']:
+        assert getattr(packet, field) == getattr(expected, field), field
+    assert packet.get_packet_bytes() == expected.get_packet_bytes()
+
+    expected.check(FakeClock())
+    expected_output = capsys.readouterr().out
+    packet.check(FakeClock())
+    assert capsys.readouterr().out == expected_output
+
+
+@pytest.mark.parametrize("odd_nibble", [False, True])
+def test_assemble_nibbles(capsys, odd_nibble):
+    rand = random.Random(1)
+    assembler = FrameAssembler(max_frame_bytes=64)
+
+    for frame in create_frames(rand):
+        nibbles = list(nibbles_of(frame))
+        if odd_nibble:
+            nibbles.append(0x7)
+
+        expected = MiiPacket(rand, blank=True)
+        for nibble in nibbles:
+            expected.append_data_nibble(nibble)
+        expected.complete()
+
+        assembler.start()
+        for nibble in nibbles:
+            assembler.append_nibble(nibble)
+        packet = assembler.complete(MiiPacket(rand, blank=True))
+
+        check_same(expected, packet, capsys)
+
+
+def test_assemble_bytes(capsys):
+    rand = random.Random(2)
+    assembler = FrameAssembler()
+
+    for frame in create_frames(rand):
+        expected = MiiPacket(rand, blank=True)
+        for byte in frame:
+            expected.append_data_byte(byte)
+        expected.complete()
+
+        assembler.start()
+        for byte in frame:
+            assembler.append_byte(byte)
+        packet = assembler.complete(MiiPacket(rand, blank=True))
+
+        check_same(expected, packet, capsys)
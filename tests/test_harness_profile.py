@@ -0,0 +1,68 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# Check the counts made by the HarnessProfiler for an instrumented thread.
+#
+
+from harness_profile import HarnessProfiler
+
+
+class FakeXsi(object):
+    def __init__(self):
+        self.time = 0
+
+    def get_time(self):
+        return self.time
+
+    def set_time(self, time):
+        self.time = time
+
+    def drive_port_pins(self, port, value):
+        pass
+
+    def sample_port_pins(self, port):
+        return 1
+
+
+class FakeThread(object):
+    """ A thread whose waits advance the time of the fake simulator
+    """
+
+    def __init__(self):
+        self.xsi = FakeXsi()
+
+    def wait(self, fn):
+        while not fn(self):
+            self.xsi.set_time(self.xsi.get_time() + 1e6)
+
+    def wait_until(self, t):
+        self.xsi.set_time(t)
+
+    def run(self):
+        xsi = self.xsi
+        for i in range(3):
+            self.wait_until(xsi.get_time() + 1e9)
+            xsi.drive_port_pins('tile[0]:XS1_PORT_1A', 1)
+        self.wait(lambda x: xsi.sample_port_pins('tile[0]:XS1_PORT_1B') and xsi.get_time() >= 5e9)
+
+
+def test_counts():
+    profiler = HarnessProfiler()
+    thread = profiler.instrument(FakeThread())
+
+    profiler.start()
+    thread.run()
+    profiler.stop()
+
+    (stats,) = profiler.get_stats()
+    assert stats.name == "FakeThread"
+    assert stats.wait_until_calls == 3
+    assert stats.drive_calls == 3
+    assert stats.predicate_calls == 2001
+    assert stats.sample_calls == 2001
+    assert stats.sim_time == 5e9
+    assert stats.get_python_time() > 0
+
+    summary = profiler.get_summary()
+    assert "FakeThread" in summary
+    assert "for 5.000 us simulated" in summary
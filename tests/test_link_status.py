@@ -14,6 +14,7 @@ from mii_phy import MiiTransmitter, MiiReceiver
 from rgmii_phy import RgmiiTransmitter, RgmiiReceiver
 from mii_packet import MiiPacket
 from helpers import get_sim_args, get_mii_tx_clk_phy, get_rgmii_tx_clk_phy
+from helpers import run_on_simulator
 
 with open(Path(__file__).parent / "test_link_status/test_params.json") as f:
     params = json.load(f)
@@ -32,12 +33,12 @@ def do_test(capfd, mac, arch, tx_clk, tx_phy):
     tester = px.testers.ComparisonTester(open(f'{testname}.expect'))
 
     simargs = get_sim_args(testname, mac, tx_clk, tx_phy, arch=arch)
-    result = px.run_on_simulator_(  binary,
-                                    simthreads=[tx_clk, tx_phy],
-                                    tester=tester,
-                                    simargs=simargs,
-                                    do_xe_prebuild=False,
-                                    capfd=capfd)
+    result = run_on_simulator(binary,
+                              simthreads=[tx_clk, tx_phy],
+                              tester=tester,
+                              simargs=simargs,
+                              do_xe_prebuild=False,
+                              capfd=capfd)
 
     assert result is True, f"{result}"
 
@@ -0,0 +1,150 @@
+// Copyright 2024 XMOS LIMITED.
+// This Software is subject to the terms of the XMOS Public Licence: Version 1.
+
+// Fill the RGMII MAC address hash table with random multicast addresses and
+// time the adds and lookups at each load. The times are in 100MHz reference
+// timer ticks and are printed one line per load for bench_macaddr_hash.py:
+//
+//   load 50 entries 128 insert_mean 96 insert_max 410 ... failed 0
+
+#include <print.h>
+#include "macaddr_filter_hash.h"
+
+// The loads in percent of the table size
+static const unsigned loads[] = {50, 80, 95};
+#define NUM_LOADS (sizeof(loads) / sizeof(loads[0]))
+
+// The number of addresses not in the table that are looked up at each load
+#define NUM_MISSES 256
+
+// The number of failed adds after which the table is taken to be full
+#define MAX_FAILED 64
+
+static ethernet_macaddr_filter_t entries[MII_MACADDR_HASH_TABLE_SIZE];
+
+static inline unsigned get_time(void)
+{
+  unsigned t;
+  asm volatile("gettime %0" : "=r"(t));
+  return t;
+}
+
+static unsigned next_random(unsigned *state)
+{
+  // A 32-bit LCG is enough to spread the addresses over the table
+  *state = *state * 1664525 + 1013904223;
+  return *state;
+}
+
+static void random_address(unsigned *state, ethernet_macaddr_filter_t *entry)
+{
+  unsigned r0 = next_random(state);
+  unsigned r1 = next_random(state);
+  entry->addr[0] = (r0 & 0xff) | 0x1;
+  entry->addr[1] = r0 >> 8;
+  entry->addr[2] = r0 >> 16;
+  entry->addr[3] = r0 >> 24;
+  entry->addr[4] = r1;
+  entry->addr[5] = r1 >> 8;
+  entry->appdata = 0;
+}
+
+static void to_keys(ethernet_macaddr_filter_t *entry, unsigned *key0, unsigned *key1)
+{
+  *key0 = entry->addr[0] | entry->addr[1] << 8 | entry->addr[2] << 16 | entry->addr[3] << 24;
+  *key1 = entry->addr[4] | entry->addr[5] << 8;
+}
+
+typedef struct stats_t {
+  unsigned count;
+  unsigned total;
+  unsigned max;
+} stats_t;
+
+static void add_sample(stats_t *stats, unsigned ticks)
+{
+  stats->count++;
+  stats->total += ticks;
+  if (ticks > stats->max)
+    stats->max = ticks;
+}
+
+static unsigned get_mean(stats_t *stats)
+{
+  return stats->count ? (stats->total + stats->count / 2) / stats->count : 0;
+}
+
+static void print_stat(const char *name, unsigned value)
+{
+  printstr(" ");
+  printstr(name);
+  printstr(" ");
+  printuint(value);
+}
+
+static unsigned time_lookup(mii_macaddr_hash_table_t *table, ethernet_macaddr_filter_t *entry,
+                            unsigned *result)
+{
+  unsigned key0, key1, appdata;
+  to_keys(entry, &key0, &key1);
+  unsigned start = get_time();
+  *result = mii_macaddr_hash_lookup(table, key0, key1, &appdata);
+  return get_time() - start;
+}
+
+void macaddr_hash_bench(unsigned seed)
+{
+  mii_macaddr_hash_table_t *table = mii_macaddr_get_hash_table(0);
+  unsigned state = seed;
+  unsigned num_entries = 0;
+  unsigned failed = 0;
+
+  mii_macaddr_hash_table_init();
+
+  for (unsigned l = 0; l < NUM_LOADS; l++) {
+    unsigned target = MII_MACADDR_HASH_TABLE_SIZE * loads[l] / 100;
+    stats_t insert = {0}, hit = {0}, miss = {0};
+
+    // Time the adds that take the table from the last load to this one
+    while (num_entries < target && failed < MAX_FAILED) {
+      ethernet_macaddr_filter_t *entry = &entries[num_entries];
+      random_address(&state, entry);
+      unsigned start = get_time();
+      ethernet_macaddr_filter_result_t result =
+        mii_macaddr_hash_table_add_entry(0, 0, *entry);
+      add_sample(&insert, get_time() - start);
+      if (result == ETHERNET_MACADDR_FILTER_SUCCESS)
+        num_entries++;
+      else
+        failed++;
+    }
+
+    for (unsigned i = 0; i < num_entries; i++) {
+      unsigned result;
+      add_sample(&hit, time_lookup(table, &entries[i], &result));
+      if (!result) {
+        printstr("ERROR: address ");
+        printuint(i);
+        printstrln(" not found");
+      }
+    }
+
+    for (unsigned i = 0; i < NUM_MISSES; i++) {
+      ethernet_macaddr_filter_t entry;
+      unsigned result;
+      random_address(&state, &entry);
+      add_sample(&miss, time_lookup(table, &entry, &result));
+    }
+
+    printstr("load ");
+    printuint(loads[l]);
+    print_stat("entries", num_entries);
+    print_stat("insert_mean", get_mean(&insert));
+    print_stat("insert_max", insert.max);
+    print_stat("lookup_hit_mean", get_mean(&hit));
+    print_stat("lookup_miss_mean", get_mean(&miss));
+    print_stat("lookup_max", hit.max > miss.max ? hit.max : miss.max);
+    print_stat("failed", failed);
+    printstrln("");
+  }
+}
@@ -0,0 +1,16 @@
+// Copyright 2024 XMOS LIMITED.
+// This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#ifndef __macaddr_hash_bench_h__
+#define __macaddr_hash_bench_h__
+
+#ifdef __XC__
+extern "C" {
+#endif
+
+void macaddr_hash_bench(unsigned seed);
+
+#ifdef __XC__
+}
+#endif
+
+#endif // __macaddr_hash_bench_h__
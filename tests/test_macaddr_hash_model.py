@@ -0,0 +1,126 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# Check the model of the MAC address hash filter.
+#
+
+import binascii
+import struct
+import numpy as np
+import pytest
+
+from macaddr_hash_model import crc32, crc32_array, get_hash, get_keys, MacAddrHashFilter
+from macaddr_hash_model import TABLE_SIZE, MII_TABLE_SIZE, BUCKET_SIZE, NUM_BUCKETS
+from macaddr_hash_model import random_multicast_addresses, avb_multicast_addresses, analyze
+
+
+def test_crc32():
+    # With the Ethernet polynomial the hash is the CRC of the address and two zero
+    # bytes, without the initial and final inversion
+    addr = [0x91, 0xe0, 0xf0, 0x00, 0x12, 0x34]
+    (key0, key1) = get_keys(addr)
+    crc = ~binascii.crc32(bytes(addr) + bytes(2), 0xffffffff) & 0xffffffff
+    assert get_hash(key0, key1, 0xedb88320) == (crc & (NUM_BUCKETS - 1)) * BUCKET_SIZE
+
+    gen = np.random.default_rng(1)
+    (crcs, data) = gen.integers(0, 1 << 32, (2, 100), dtype=np.uint64)
+    for poly in [0xedb88320, 0xba75fe21]:
+        expected = [crc32(c, d, poly) for (c, d) in zip(crcs.tolist(), data.tolist())]
+        assert crc32_array(crcs, data, poly).tolist() == expected
+
+
+def test_add_lookup():
+    hash_filter = MacAddrHashFilter()
+    addrs = avb_multicast_addresses(np.random.default_rng(1), 20)
+    for (i, addr) in enumerate(addrs):
+        hash_filter.add_entry(i % 2, i < 10, addr, appdata=i)
+
+    (results, appdata, slots) = hash_filter.lookup(addrs + [[1, 2, 3, 4, 5, 6], [0] * 6])
+    assert results.tolist() == [(1 << 31) | 1, (1 << 31) | 2] * 5 + [1, 2] * 5 + [0, 0]
+    assert appdata.tolist() == list(range(20)) + [0, 0]
+    assert np.all(slots[:20]) and not np.any(slots[20:])
+
+    # A second client is ORed into the existing entry
+    hash_filter.add_entry(1, False, addrs[10])
+    (results, appdata, slots) = hash_filter.lookup(addrs[10:11])
+    assert results.tolist() == [3]
+
+
+def test_full():
+    # Addresses that all hash to the same pair of buckets only fill those buckets
+    hash_filter = MacAddrHashFilter()
+    addrs = random_multicast_addresses(np.random.default_rng(1), 5000)
+    buckets = {}
+    for addr in addrs:
+        key = get_keys(addr)
+        buckets.setdefault(tuple(sorted(hash_filter._hashes(key))), []).append(addr)
+    addrs = max(buckets.values(), key=len)[:2 * BUCKET_SIZE + 1]
+    assert len(addrs) == 2 * BUCKET_SIZE + 1
+
+    stats = [hash_filter.add_entry(0, False, addr) for addr in addrs]
+    assert [s.added for s in stats] == [True] * 2 * BUCKET_SIZE + [False]
+    assert hash_filter.num_entries == 2 * BUCKET_SIZE
+
+
+def test_moves():
+    # Fill the table until entries have to be moved, which must stay reachable
+    hash_filter = MacAddrHashFilter()
+    addrs = random_multicast_addresses(np.random.default_rng(1), TABLE_SIZE)
+    moved = 0
+    for (i, addr) in enumerate(addrs):
+        stats = hash_filter.add_entry(0, False, addr)
+        moved += stats.moves
+        if not stats.added:
+            break
+    assert moved > 0
+    assert hash_filter.num_entries >= 0.8 * TABLE_SIZE
+
+    added = [addr for addr in addrs[:i] if hash_filter._find_entry(get_keys(addr)) is not None]
+    (results, appdata, slots) = hash_filter.lookup(added)
+    assert len(added) == hash_filter.num_entries
+    assert np.all(slots) and np.all(slots <= 2 * BUCKET_SIZE)
+
+
+def test_delete():
+    hash_filter = MacAddrHashFilter()
+    addrs = avb_multicast_addresses(np.random.default_rng(1), 4)
+    hash_filter.add_entry(0, True, addrs[0])
+    hash_filter.add_entry(1, True, addrs[0])
+    hash_filter.add_entry(0, False, addrs[1])
+
+    # The priority has to match and the entry goes with its last client
+    hash_filter.delete_entry(0, False, addrs[0])
+    hash_filter.delete_entry(0, True, addrs[0])
+    (results, appdata, slots) = hash_filter.lookup(addrs[:2])
+    assert results.tolist() == [(1 << 31) | 2, 1]
+    hash_filter.delete_entry(1, True, addrs[0])
+    hash_filter.delete_entry(0, False, addrs[1])
+    assert hash_filter.num_entries == 0
+    (results, appdata, slots) = hash_filter.lookup(addrs[:2])
+    assert not np.any(slots)
+
+
+def test_analyze():
+    analysis = analyze(24, 2, addresses=avb_multicast_addresses)
+    assert analysis["groups"] == list(range(1, 25))
+    assert analysis["occupancy"][-1] == 24 / TABLE_SIZE
+    assert analysis["failure_rate"] == [0.0] * 24
+
+
+def test_mii_table():
+    # The MII MACs had a table of 30 entries, which must still always fit
+    gen = np.random.default_rng(1)
+    for trial in range(50):
+        hash_filter = MacAddrHashFilter(MII_TABLE_SIZE)
+        addrs = random_multicast_addresses(gen, 30)
+        assert all(hash_filter.add_entry(0, False, addr).added for addr in addrs)
+        (results, appdata, slots) = hash_filter.lookup(addrs)
+        assert np.all(results == 1)
+
+    # The addresses added by mac_addr_filler() in include/helpers.xc
+    hash_filter = MacAddrHashFilter(MII_TABLE_SIZE)
+    addrs = [bytes([0x20, 0x21, 0x22, 0x23, 0x24, i + 1]) for i in range(30)]
+    assert all(hash_filter.add_entry(0, False, addr).added for addr in addrs)
+
+    with pytest.raises(ValueError):
+        MacAddrHashFilter(48)
@@ -0,0 +1,126 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# Check the latency, IFG and throughput figures produced by the MetricsCollector
+# from the frame events reported by the PHYs.
+#
+
+import json
+import random
+
+import pytest
+
+from mii_clock import Clock
+from mii_packet import MiiPacket
+from metrics import MetricsCollector
+from test_tx_phy_compiled import FakeMiiTransmitter, MII_PORTS
+from test_rx_phy_txen import FakeXsi, FakeMiiReceiver, Terminated
+
+
+def create_packets(rand, count, prio=None):
+    tag = [] if prio is None else [0x81, 0x00, prio << 5, 0x01]
+    return [MiiPacket(rand, num_data_bytes=46, vlan_prio_tag=tag) for i in range(count)]
+
+
+def test_latency_and_throughput(tmp_path):
+    rand = random.Random(1)
+    clock = Clock('tile[0]:XS1_PORT_1I', Clock.CLK_25MHz)
+    bit_time = clock.get_bit_time()
+    collector = MetricsCollector(clock)
+
+    packets = create_packets(rand, 10) + create_packets(rand, 10, prio=5)
+    wire_time = 64 * 8 * bit_time
+    frame_period = wire_time + clock.get_min_ifg()
+
+    # Each frame is looped back with a latency of i us and sent at line rate
+    for (i, packet) in enumerate(packets):
+        collector.frame_started(packet, i * frame_period)
+    for (i, packet) in enumerate(packets):
+        packet.inter_frame_gap = clock.get_min_ifg()
+        collector.frame_received(packet, i * frame_period + wire_time + i * 1e9)
+
+    results = collector.get_results()
+    assert sorted(results) == ["all", "prio_5", "untagged"]
+    assert results["untagged"]["frames"] == 10
+    assert results["prio_5"]["bytes"] == 10 * (64 + 4)
+
+    latency = results["all"]["latency_ns"]
+    assert latency["count"] == 20
+    assert latency["min"] == pytest.approx(wire_time / 1e6)
+    assert latency["max"] == pytest.approx(wire_time / 1e6 + 19000)
+    assert latency["p50"] == pytest.approx(wire_time / 1e6 + 9500)
+
+    # The first frame has no IFG and the rest are all at the minimum IFG
+    assert results["all"]["ifg_bits"]["histogram"] == {"96": 19}
+    assert results["untagged"]["ifg_bits"]["histogram"] == {"96": 9}
+
+    filename = tmp_path / "metrics" / "rt_mii_25MHz.json"
+    collector.export(filename, {"mac": "rt", "phy": "mii", "clk": "25MHz"})
+    with open(filename) as f:
+        exported = json.load(f)
+    assert exported["profile"]["mac"] == "rt"
+    assert exported["classes"]["all"]["frames"] == 20
+
+
+def test_unmatched_frames():
+    rand = random.Random(2)
+    clock = Clock('tile[0]:XS1_PORT_1I', Clock.CLK_25MHz)
+    bit_time = clock.get_bit_time()
+    collector = MetricsCollector(clock, class_fn=None)
+
+    # Frames never sent to the DUT have no latency but count towards throughput
+    packets = create_packets(rand, 4)
+    wire_time = len(packets[0].get_packet_bytes() + b'1234') * 8 * bit_time
+    for (i, packet) in enumerate(packets):
+        collector.frame_received(packet, (i + 1) * 2 * wire_time)
+
+    total = collector.get_total()
+    assert total.num_frames == 4
+    assert total.latencies == []
+    assert total.get_throughput() == pytest.approx(100 * 4 / 7)
+    assert total.get_efficiency(bit_time) == pytest.approx((4 * wire_time + 3 * 96 * bit_time) / (7 * wire_time) * 100)
+    assert "latency_ns" not in collector.get_results()["all"]
+
+
+def get_loopback_intervals(drives, rxd, rxdv, delay):
+    """ Returns the intervals during which the data valid pin was driven high,
+        with the value on the data pins, delayed by the given time
+    """
+    values = {}
+    intervals = []
+    for (i, (time, port, value)) in enumerate(drives):
+        values[port] = value
+        if values.get(rxdv) and i + 1 < len(drives) and drives[i+1][0] > time:
+            intervals.append((time + delay, drives[i+1][0] + delay, values[rxd]))
+    return intervals
+
+
+def test_loopback_latency():
+    # Frames sent by the transmit PHY are looped back to the receive PHY after a
+    # fixed delay, so the latency of each is its wire time plus the delay
+    rand = random.Random(3)
+    clock = Clock('clk', Clock.CLK_25MHz)
+    bit_time = clock.get_bit_time()
+    collector = MetricsCollector(clock)
+
+    packets = create_packets(rand, 5)
+    tx_phy = FakeMiiTransmitter(*MII_PORTS, clock, initial_delay=1000*1e6, do_timeout=False)
+    tx_phy.set_metrics(collector)
+    tx_phy.set_packets(packets)
+    tx_phy.run()
+
+    # The DUT drives its outputs on edges of the clock, so the delay is whole cycles
+    delay = 31 * clock._period
+    intervals = get_loopback_intervals(tx_phy.xsi.drives, 'rxd', 'rxdv', delay)
+    xsi = FakeXsi(intervals, intervals[-1][1] + 4 * clock._period)
+    rx_phy = FakeMiiReceiver(xsi, 'txd', 'txen', clock, test_ctrl='ctrl')
+    rx_phy.set_metrics(collector)
+    with pytest.raises(Terminated):
+        rx_phy.run()
+
+    # The preamble and SFD are 16 nibbles and the frames 64 bytes with the CRC
+    wire_time = (16 + 2 * 64) * 4 * bit_time
+    latency = collector.get_results()["all"]["latency_ns"]
+    assert latency["count"] == len(packets)
+    assert latency["min"] == pytest.approx((wire_time + delay) / 1e6)
+    assert latency["max"] == pytest.approx((wire_time + delay) / 1e6)
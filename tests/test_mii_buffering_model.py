@@ -0,0 +1,106 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# Check the model of the MII real-time MAC receive buffering.
+#
+
+import numpy as np
+
+from traffic import TrafficProfile, TrafficClass, PREAMBLE_BYTES, CRC_BYTES, MIN_IFG_BITS
+from mii_buffering_model import Frame, Mempool, PacketQueue, MiiRxBufferModel, frames_from_schedule
+from mii_buffering_model import ETHERNET_NUM_PACKET_POINTERS
+
+bit_time = 10e6
+
+
+def get_frames(num_frames, num_bytes, is_hp=False, clients=1):
+    """ Returns back-to-back frames at 100Mb/s
+    """
+    frames = []
+    time = 0
+    for i in range(num_frames):
+        end = time + (num_bytes + PREAMBLE_BYTES + CRC_BYTES) * 8 * bit_time
+        frames.append(Frame(time, end, num_bytes, is_hp, clients))
+        time = end + MIN_IFG_BITS * bit_time
+    return frames
+
+
+def test_mempool():
+    mempool = Mempool(400)
+    assert (mempool.num_words, mempool.last_safe_wrptr) == (94, 80)
+
+    # The frame must leave room for a header before the read pointer
+    assert mempool.reserve(None) is None
+    assert mempool.reserve(10) is False
+    assert mempool.reserve(20) == 20
+    assert mempool.write(False, 1) is None
+    assert mempool.write(20, 10) is None
+    assert mempool.write(20, 9) == 19
+
+    # A frame that ends after last_safe_wrptr skips the rest of the buffer
+    assert mempool.commit(75) == 0
+    end_ptr = mempool.write(None, 0)
+    assert end_ptr == 85
+    assert mempool.commit(end_ptr) == 9
+    assert mempool.wrptr == 0
+    assert mempool.reserve_at_least(50, 200) and not mempool.reserve_at_least(50, 201)
+
+
+def test_packet_queue():
+    queue = PacketQueue()
+    for i in range(3):
+        queue.add(i)
+
+    # The read index only moves on when the oldest packet is freed
+    assert queue.free_index(1) == 0
+    assert queue.free_index(0) == 2
+    assert queue.get_num_packets() == 1
+
+    for i in range(ETHERNET_NUM_PACKET_POINTERS - 1):
+        assert not queue.is_full()
+        queue.add(i)
+    assert queue.is_full()
+    queue.free_index(5)
+    assert queue.is_full()
+    queue.free_index(2)
+    assert not queue.is_full()
+
+
+def test_frames_from_schedule():
+    classes = [
+        TrafficClass("hp", [[0,1,2,3,4,5]], rate_mbps=30),
+        TrafficClass("lp", [[1,2,3,4,5,6]]),
+      ]
+    schedule = TrafficProfile(classes, bit_time).generate(1, num_frames=100)
+    frames = frames_from_schedule(schedule, bit_time, lambda name: (name == "hp", 1))
+
+    assert [f.num_bytes for f in frames] == [len(p.get_packet_bytes()) for p in schedule]
+    assert [f.is_hp for f in frames] == [n == "hp" for n in schedule.get_class_names()]
+    gaps = np.array([f.start for f in frames[1:]]) - np.array([f.end for f in frames[:-1]])
+    assert np.allclose(gaps, schedule.get_ifgs()[1:])
+
+
+def test_no_drops():
+    frames = get_frames(1000, 1500, clients=3)
+    results = MiiRxBufferModel(4000, [200, 200]).run(frames)
+    assert results["lp_received"] == [1000, 1000]
+    assert sum(results["drops"].values()) == 0
+    assert results["overwritten"] == 0
+    assert results["max_occupancy_bytes"] < 4 * 4000
+
+
+def test_slow_clients():
+    frames = get_frames(1000, 1500, clients=3)
+
+    # Without an HP client the frames are dropped when the buffer is full
+    results = MiiRxBufferModel(4000, [50, 25]).run(frames)
+    assert results["drops"]["no_buffer"] > 0
+    assert results["drops"]["threshold"] == 0
+    assert results["lp_received"][0] > results["lp_received"][1]
+
+    # With an HP client the LP packets are dropped to keep space free
+    frames = get_frames(1000, 1500, clients=3)
+    frames[::4] = get_frames(1000, 100, is_hp=True)[::4]
+    results = MiiRxBufferModel(4000, [50, 25], hp_drain_mbps=100).run(frames)
+    assert results["drops"]["threshold"] > 0
+    assert results["hp_received"] + results["drops"]["no_buffer"] >= 250
@@ -0,0 +1,23 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# Check that the cached wire encoding of MiiPacket is only dropped when a field
+# that is encoded changes.
+#
+
+import random
+
+from mii_packet import MiiPacket
+
+
+def test_set_ifg_keeps_encoding():
+    packet = MiiPacket(random.Random(3))
+    nibbles = packet.get_nibbles()
+
+    # Only the encoded fields invalidate the cache
+    packet.set_ifg(2000 * 1e6)
+    assert packet.get_nibbles() is nibbles
+    assert packet.get_packet_time(1) == len(nibbles) * 4 + 2000 * 1e6
+
+    packet.data_bytes = [0] * 46
+    assert packet.get_nibbles() is not nibbles
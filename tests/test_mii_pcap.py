@@ -0,0 +1,59 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# Check the pcap/pcapng reader against the checked in corpus and that frames
+# written by the PcapWriter are read back unchanged.
+#
+
+from pathlib import Path
+
+from mii_pcap import read_frames, read_packets, PcapWriter, MIN_FRAME_BYTES
+
+corpus = Path(__file__).parent / "pcap"
+bit_time = 10e6
+
+
+def test_pcap_and_pcapng_match():
+    pcap_packets = list(read_packets(corpus / "rx_corpus.pcap", bit_time))
+    pcapng_packets = list(read_packets(corpus / "rx_corpus.pcapng", bit_time))
+
+    assert len(pcap_packets) == 15
+    assert pcap_packets == pcapng_packets
+    assert [p.inter_frame_gap for p in pcap_packets] == [p.inter_frame_gap for p in pcapng_packets]
+
+    for packet in pcap_packets:
+        assert len(packet.get_packet_bytes()) >= MIN_FRAME_BYTES
+        assert packet.inter_frame_gap >= 96 * bit_time
+
+    # The pcapng capture includes the FCS of each frame
+    for (timestamp, frame, fcs_bytes) in read_frames(corpus / "rx_corpus.pcapng"):
+        assert fcs_bytes == 4
+
+
+def test_ifg_from_timestamps():
+    min_ifg = 96 * bit_time
+    max_ifg = 20000 * bit_time
+    frames = list(read_frames(corpus / "rx_corpus.pcap"))
+    packets = list(read_packets(corpus / "rx_corpus.pcap", bit_time, max_ifg=max_ifg))
+
+    for i in range(1, len(frames)):
+        wire_time = (len(packets[i-1].get_packet_bytes()) + 12) * 8 * bit_time
+        gap = frames[i][0] - frames[i-1][0] - wire_time
+        assert packets[i].inter_frame_gap == min(max(gap, min_ifg), max_ifg)
+
+
+def test_write_and_read_back(tmp_path):
+    packets = list(read_packets(corpus / "rx_corpus.pcap", bit_time))
+
+    for include_fcs in [False, True]:
+        filename = tmp_path / f"out_{include_fcs}.pcap"
+        with PcapWriter(filename, include_fcs=include_fcs) as capture:
+            time = 0
+            for packet in packets:
+                time += packet.inter_frame_gap
+                capture.write_packet(packet, time)
+                time += packet.get_packet_time(bit_time) - packet.inter_frame_gap
+
+        read_back = list(read_packets(filename, bit_time))
+        assert read_back == packets
+        assert [p.inter_frame_gap for p in read_back] == [p.inter_frame_gap for p in packets]
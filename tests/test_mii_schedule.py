@@ -0,0 +1,80 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# Check that the batch wire encoder produces exactly the same nibbles, nibble
+# pairs and error signalling as the per-packet encoding used by the PHYs.
+#
+
+import random
+
+from mii_packet import MiiPacket
+from mii_schedule import encode_nibbles, encode_nibble_pairs
+from rgmii_phy import pairwise
+
+
+def create_packets(rand):
+    packets = []
+    for i in range(50):
+        packets.append(MiiPacket(rand, num_data_bytes=rand.randint(46, 1500),
+                                 inter_frame_gap=rand.randint(960, 2000) * 1e6))
+
+    packets += [
+        MiiPacket(rand, vlan_prio_tag=[0x81, 0x00, 0x12, 0x34], create_data_args=['step', (3, 60)]),
+        MiiPacket(rand, num_preamble_nibbles=7, corrupt_crc=True),
+        MiiPacket(rand, extra_nibble=True),
+        MiiPacket(rand, preamble_nibbles=[0x5 for x in range(14)] + [0x9]),
+        MiiPacket(rand, num_preamble_nibbles=15, num_data_bytes=0, sfd_nibble=None,
+                  dst_mac_addr=[], src_mac_addr=[], ether_len_type=[], send_crc_word=False),
+        MiiPacket(rand, num_preamble_nibbles=int(143/3), num_data_bytes=0, sfd_nibble=None,
+                  dst_mac_addr=[], src_mac_addr=[], ether_len_type=[], send_crc_word=False),
+        MiiPacket(rand, error_nibbles=[0]),
+      ]
+
+    # Error nibbles in the middle and beyond the end of the packet
+    packet = MiiPacket(rand)
+    packet.error_nibbles = [20, len(packet.get_nibbles())]
+    packets.append(packet)
+
+    rand.shuffle(packets)
+    return packets
+
+
+def test_encode_nibbles():
+    packets = create_packets(random.Random(1))
+    schedule = encode_nibbles(iter(packets))
+
+    assert len(schedule.offsets) == len(packets) + 1
+    for (i, packet) in enumerate(packets):
+        start, end = schedule.offsets[i], schedule.offsets[i+1]
+        nibbles = packet.get_nibbles()
+        assert bytes(schedule.data[start:end]) == nibbles
+
+        errors = [j in packet.get_error_nibbles() for j in range(len(nibbles))]
+        assert list(schedule.errors[start:end]) == errors
+        assert schedule.ifgs[i] == packet.inter_frame_gap
+
+
+def test_encode_nibble_pairs():
+    packets = create_packets(random.Random(2))
+    schedule = encode_nibble_pairs(packets)
+
+    assert len(schedule.offsets) == len(packets) + 1
+    for (i, packet) in enumerate(packets):
+        start, end = schedule.offsets[i], schedule.offsets[i+1]
+        error_nibbles = packet.get_error_nibbles()
+
+        expected_data = []
+        expected_errors = []
+        for (j, (a, b)) in enumerate(pairwise(packet.get_nibbles())):
+            expected_data.append(a | (b << 4))
+            expected_errors.append(2*j in error_nibbles or 2*j+1 in error_nibbles)
+
+        assert list(schedule.data[start:end]) == expected_data
+        assert list(schedule.errors[start:end]) == expected_errors
+
+
+def test_encode_empty():
+    schedule = encode_nibbles([])
+    assert len(schedule.data) == 0
+    assert list(schedule.offsets) == [0]
+
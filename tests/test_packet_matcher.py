@@ -0,0 +1,84 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# Check matching of reordered packets against the expected packets.
+#
+
+import copy
+import random
+
+from mii_packet import MiiPacket
+from packet_matcher import PacketMatcher
+
+hp_mac_address = bytes([0, 1, 2, 3, 4, 5])
+lp_mac_address = bytes([0, 1, 2, 3, 4, 6])
+
+
+def create_packets(rand, count):
+    packets = []
+    for i in range(count):
+        dst = hp_mac_address if rand.randint(0, 1) else lp_mac_address
+        packets.append(MiiPacket(rand, dst_mac_addr=dst, src_mac_addr=[0, 0, 0, 0, 0, 1],
+                                 create_data_args=['same', (i % 4, 60)]))
+    return packets
+
+
+def get_matcher(packets, **kwargs):
+    source = iter(packets)
+    return PacketMatcher(lambda: next(source, None), **kwargs)
+
+
+def by_queue(packet):
+    return packet.dst_mac_addr == hp_mac_address
+
+
+def test_reordered_streams():
+    rand = random.Random(1)
+    packets = create_packets(rand, 200)
+    packets[3].dropped = True
+
+    # Deliver all the high priority packets first, in order within each queue
+    received = ([(i, p) for (i, p) in enumerate(packets) if by_queue(p) and not p.dropped] +
+                [(i, p) for (i, p) in enumerate(packets) if not by_queue(p) and not p.dropped])
+
+    matcher = get_matcher(packets, stream_fn=by_queue, lookahead=len(packets))
+    for (i, packet) in received:
+        assert not matcher.is_complete()
+        assert matcher.match(packet) == (i, None)
+    assert matcher.is_complete()
+
+
+def test_out_of_order_within_stream():
+    rand = random.Random(2)
+    packets = [MiiPacket(rand, dst_mac_addr=hp_mac_address) for i in range(3)]
+
+    matcher = get_matcher(packets, stream_fn=by_queue)
+    (index, error) = matcher.match(packets[1])
+    assert index == 1
+    assert error == "received before packet 0 of the same stream"
+
+    # Without a stream function any order is accepted
+    matcher = get_matcher(packets)
+    for i in [2, 0, 1]:
+        assert matcher.match(packets[i]) == (i, None)
+    assert matcher.is_complete()
+
+
+def test_unexpected_and_lookahead():
+    rand = random.Random(3)
+    packets = [MiiPacket(rand) for i in range(20)]
+
+    matcher = get_matcher(packets, lookahead=4)
+    (index, error) = matcher.match(packets[10])
+    assert index is None
+    assert matcher.get_num_outstanding() == 4
+
+    # Identical packets are matched as a multiset, earliest first
+    duplicates = [0, 5, 13]
+    for i in duplicates[1:]:
+        packets[i] = copy.deepcopy(packets[0])
+
+    matcher = get_matcher(packets)
+    for i in duplicates:
+        assert matcher.match(packets[0]) == (i, None)
+    assert matcher.match(packets[0])[0] is None
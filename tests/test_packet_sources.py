@@ -0,0 +1,70 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# Check that the receiver consumes generators of expected packets lazily and
+# that list and generator sources are checked in the same way.
+#
+
+import random
+import pytest
+
+from mii_packet import MiiPacket
+from mii_phy import MiiReceiver
+from helpers import PacketSource, move_to_next_valid_packet
+
+
+def create_packets(seed, count, pulled=None):
+    rand = random.Random(seed)
+    for i in range(count):
+        packet = MiiPacket(rand, num_data_bytes=46 + i)
+        packet.dropped = (i % 3 == 1)
+        if pulled is not None:
+            pulled.append(i)
+        yield packet
+
+
+def get_phy():
+    return MiiReceiver('txd', 'txen', None)
+
+
+def test_expected_packets_are_pulled_lazily():
+    pulled = []
+    phy = get_phy()
+    phy.set_expected_packets(create_packets(1, 2000, pulled))
+    assert phy.num_expected_packets is None
+    assert pulled == []
+
+    assert phy.peek_expected_packet(3).num_data_bytes == 49
+    assert len(pulled) == 4
+
+    for i in range(2000):
+        assert phy.pop_expected_packet().num_data_bytes == 46 + i
+        assert len(pulled) <= i + 4
+    assert phy.expect_packet_index == 2000
+    assert phy.peek_expected_packet() is None
+    assert phy.pop_expected_packet() is None
+
+    with pytest.raises(ValueError):
+        phy.peek_expected_packet(phy.EXPECTED_PACKET_WINDOW)
+
+
+def test_list_and_generator_sources_match():
+    list_phy = get_phy()
+    list_phy.set_expected_packets(list(create_packets(2, 20)))
+    assert list_phy.num_expected_packets == 20
+
+    source = PacketSource(create_packets, 2, 20)
+    gen_phy = get_phy()
+    gen_phy.set_expected_packets(source)
+
+    while True:
+        move_to_next_valid_packet(list_phy)
+        move_to_next_valid_packet(gen_phy)
+        assert list_phy.expect_packet_index == gen_phy.expect_packet_index
+        expected = list_phy.pop_expected_packet()
+        assert expected == gen_phy.pop_expected_packet()
+        if expected is None:
+            break
+
+    # Each iteration of a PacketSource recreates the same packets
+    assert list(source) == list(source)
@@ -0,0 +1,93 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# Check the model of the credit based shaper.
+#
+
+import numpy as np
+import pytest
+
+from qav_shaper_model import QavShaperModel, ShaperFrame, calc_idle_slope, get_credit_cost
+from qav_shaper_model import check_egress, to_int32, MII_CREDIT_FRACTIONAL_BITS, TIMER_TICK_FS
+
+bit_time = 10e6
+
+
+def get_backlog(num_hp, num_lp, hp_bytes=100, lp_bytes=1000):
+    """ Returns HP and LP frames that are all ready at the start
+    """
+    return ([ShaperFrame(0, hp_bytes, True) for i in range(num_hp)] +
+            [ShaperFrame(0, lp_bytes, False) for i in range(num_lp)])
+
+
+def test_fixed_point():
+    # As in test_shaper/src/main.xc
+    assert calc_idle_slope(5 * 1024 * 1024) == 3435
+    assert get_credit_cost(100) == 124 * 8 << MII_CREDIT_FRACTIONAL_BITS
+    assert to_int32(1 << 31) == -(1 << 31)
+    assert to_int32(-1) == -1
+
+
+@pytest.mark.parametrize("phy", ["mii", "rgmii"])
+def test_reserved_rate(phy):
+    # With both queues backlogged the HP frames are sent at the idle slope
+    slope = calc_idle_slope(5 * 1024 * 1024)
+    frames = get_backlog(20, 200)
+    starts = QavShaperModel(slope, bit_time, phy).run(frames)
+    assert None not in starts
+
+    hp_starts = np.array(starts[:20])
+    period = get_credit_cost(100) / slope * TIMER_TICK_FS
+    gaps = np.diff(hp_starts)
+    # An HP frame waits for the LP frame being sent when it gets credit, and the
+    # credit it gains while waiting lets the next one go sooner
+    max_wait = QavShaperModel(slope, bit_time, phy).get_frame_time(1000) + 96 * bit_time
+    assert np.all(gaps <= period + 2 * max_wait)
+    assert np.mean(gaps) == pytest.approx(period, rel=0.05)
+
+
+def test_no_shaper():
+    frames = get_backlog(5, 5)
+    starts = QavShaperModel(calc_idle_slope(5000000), bit_time, enable_shaper=False).run(frames)
+    assert starts == sorted(starts)
+    assert starts[5] == 5 * (112 + 12) * 8 * bit_time
+
+
+def test_idle_hp():
+    # An HP frame that arrives after the LP traffic has no credit saved up
+    slope = calc_idle_slope(5000000)
+    frames = get_backlog(0, 10) + [ShaperFrame(1e12, 100, True), ShaperFrame(1e12, 100, True)]
+    model = QavShaperModel(slope, bit_time, "rgmii")
+    starts = model.run(frames)
+    wire_free = max(starts[:10]) + (1012 * 8 + 96) * bit_time
+    assert starts[10] == max(1e12, wire_free)
+    assert starts[11] - starts[10] >= get_credit_cost(100) / slope * TIMER_TICK_FS - TIMER_TICK_FS
+
+
+def test_overflow():
+    # At 10Mb/s the MII MAC multiplies the time of a full frame by the slope
+    # in one go, which overflows above about 26Mb/s and holds the HP frame back
+    slow_bit_time = 100e6
+    frames = [ShaperFrame(0, 1500, False), ShaperFrame(1e9, 100, True)]
+    wire_free = (1512 * 8 + 96) * slow_bit_time
+    for (mbps, wraps) in [(20, False), (30, True)]:
+        model = QavShaperModel(calc_idle_slope(mbps * 1000000), slow_bit_time, "mii")
+        starts = model.run(frames)
+        assert (starts[1] > wire_free) == wraps
+
+
+def test_check_egress():
+    model = QavShaperModel(calc_idle_slope(5000000), bit_time, "rgmii")
+    frames = get_backlog(10, 100)
+    expected = model.run(frames)
+    assert check_egress(frames, expected, model, 0) == []
+
+    # Small delays are tolerated and do not accumulate
+    observed = [t + 50e6 for t in expected]
+    assert check_egress(frames, observed, model, 100e6) == []
+
+    # A stall delays the frames after it
+    observed = [t + 1e9 if t >= expected[100] else t for t in expected]
+    errors = check_egress(frames, observed, model, 100e6)
+    assert len(errors) == 1 and errors[0].startswith("LP frame 100")
+    assert check_egress(frames, observed, model, 100e6, hp_only=True) == []
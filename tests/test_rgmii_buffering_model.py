@@ -0,0 +1,81 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# Check the model of the RGMII MAC receive buffering.
+#
+
+import pytest
+
+from mii_buffering_model import Frame
+from rgmii_buffering_model import BuffersFree, BuffersUsed, RgmiiRxBufferModel, RGMII_MAC_BUFFER_COUNT_RX
+from traffic import PREAMBLE_BYTES, CRC_BYTES, MIN_IFG_BITS
+
+bit_time = 1e6
+
+
+def get_frames(num_frames, num_bytes, is_hp=False, clients=1):
+    """ Returns back-to-back frames at 1Gb/s
+    """
+    frames = []
+    time = 0
+    for i in range(num_frames):
+        end = time + (num_bytes + PREAMBLE_BYTES + CRC_BYTES) * 8 * bit_time
+        frames.append(Frame(time, end, num_bytes, is_hp, clients))
+        time = end + MIN_IFG_BITS * bit_time
+    return frames
+
+
+def test_buffers():
+    free = BuffersFree(4)
+    assert [free.take() for i in range(5)] == [3, 2, 1, 0, None]
+    free.add(2)
+    assert free.available() == 1
+
+    used = BuffersUsed(2)
+    used.add("a")
+    used.add("b")
+    with pytest.raises(RuntimeError):
+        used.add("c")
+    assert used.take() == "a"
+    used.add("c")
+    assert [used.take(), used.take()] == ["b", "c"]
+    assert used.empty()
+
+
+def test_no_drops():
+    frames = get_frames(1000, 1500, clients=3)
+    results = RgmiiRxBufferModel([2000, 2000]).run(frames)
+    assert results["lp_received"] == [1000, 1000]
+    assert sum(results["drops"].values()) == 0
+    assert results["min_free"] == RGMII_MAC_BUFFER_COUNT_RX - 3
+    assert results["starved"] == [[], []]
+
+
+def test_hp_holds_buffers():
+    # A slow HP client holds the buffers so the LP packets are dropped
+    frames = get_frames(1000, 500)
+    for frame in frames[::2]:
+        frame.is_hp = True
+    results = RgmiiRxBufferModel([2000], hp_drain_mbps=400).run(frames)
+    assert results["drops"]["threshold"] > 0
+    assert results["drops"]["no_buffer"] > 0
+    assert results["server_busy"] > 0.9
+
+    # Each period of starvation runs from its first drop to its last
+    starved = results["starved"][0]
+    assert sum(n for (start, end, n) in starved) == results["lp_dropped"][0]
+    assert all(start <= end for (start, end, n) in starved)
+
+    # Without the HP client the HP packets are freed straight away
+    results = RgmiiRxBufferModel([2000]).run(frames)
+    assert results["lp_received"] == [500]
+    assert results["hp_received"] == 0
+
+
+def test_buffer_count():
+    # A slow client is helped by its queue, not by more buffers
+    frames = get_frames(1000, 1500, clients=3)
+    results = [RgmiiRxBufferModel([2000, 200], buffer_count=count).run(frames) for count in (8, 32)]
+    assert results[0]["lp_received"] == results[1]["lp_received"]
+    assert results[0]["lp_received"][1] < 250
+    assert results[0]["min_free"] < results[1]["min_free"]
@@ -15,6 +15,7 @@ from mii_clock import Clock
 from helpers import get_sim_args, packet_processing_time, get_dut_mac_address
 from helpers import choose_small_frame_size, check_received_packet, args
 from helpers import get_mii_rx_clk_phy, get_mii_tx_clk_phy, get_rgmii_rx_clk_phy, get_rgmii_tx_clk_phy
+from helpers import run_on_simulator
 
 with open(Path(__file__).parent / "test_rx_backpressure/test_params.json") as f:
     params = json.load(f)
@@ -81,12 +82,12 @@ def do_rx_test(capfd, mac, arch, rx_clk, rx_phy, tx_clk, tx_phy, packets, test_f
 
     simargs = get_sim_args(testname, mac, tx_clk, tx_phy, arch)
 
-    result = px.run_on_simulator_(  binary,
-                                    simthreads=[rx_clk, rx_phy, tx_clk, tx_phy] + extra_tasks,
-                                    tester=tester,
-                                    simargs=simargs,
-                                    do_xe_prebuild=False,
-                                    capfd=capfd)
+    result = run_on_simulator(binary,
+                              simthreads=[rx_clk, rx_phy, tx_clk, tx_phy] + extra_tasks,
+                              tester=tester,
+                              simargs=simargs,
+                              do_xe_prebuild=False,
+                              capfd=capfd)
                                     # do_xe_prebuild=False)
 
     assert result is True, f"{result}"
@@ -0,0 +1,127 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# Check that a backlog of frames is received over several packet_ready()
+# notifications. The client of test_rx_batch holds off after the first frame
+# while more frames fill its queue. Each receive call then gets at most
+# ETHERNET_RX_MAX_BATCH_PACKETS of them, and the rest stay queued until the
+# next notification. The queue size and batch limit are set for each profile in
+# test_rx_batch/test_params.json.
+#
+
+import Pyxsim as px
+import os
+import json
+import math
+import random
+from pathlib import Path
+import pytest
+
+from mii_clock import Clock
+from mii_packet import MiiPacket
+from helpers import get_dut_mac_address, packet_processing_time
+from helpers import get_sim_args, get_mii_tx_clk_phy, get_rgmii_tx_clk_phy
+from helpers import run_on_simulator
+
+with open(Path(__file__).parent / "test_rx_batch/test_params.json") as f:
+    params = json.load(f)
+
+# Must match HOLD_ETHERTYPE and HOLD_TICKS (100MHz timer ticks) in the application
+HOLD_ETHERTYPE = [0x88, 0xb5]
+HOLD_TIME = 15000 * 10 * 1e6
+
+
+class BatchChecker(object):
+    """ Checks the counts printed by the application at the end of the test
+    """
+
+    def __init__(self, num_frames, batch, max_batch, backlog):
+        self._num_frames = num_frames
+        self._batch = batch
+        self._max_batch = max_batch
+        self._backlog = backlog
+
+    def run(self, output):
+        values = None
+        for line in output:
+            fields = line.split()
+            if fields and fields[0] == "received":
+                values = dict(zip(fields[0::2], [int(v) for v in fields[1::2]]))
+
+        if values is None:
+            print("ERROR: No results in the output:\n" + "".join(output))
+            return False
+
+        batch_size = min(self._batch, self._max_batch)
+        errors = []
+        if values["received"] != self._num_frames:
+            errors.append(f"received {values['received']} frames, expected {self._num_frames}")
+        if values["max_batch"] != min(batch_size, self._backlog):
+            errors.append(f"largest batch was {values['max_batch']}, expected {min(batch_size, self._backlog)}")
+
+        # The hold frame and the last frame are received on their own
+        min_calls = 2 + math.ceil(self._backlog / batch_size)
+        if values["calls"] < min_calls:
+            errors.append(f"{values['calls']} receive calls, expected at least {min_calls}")
+
+        for error in errors:
+            print(f"ERROR: {error}")
+        return not errors
+
+
+def do_test(capfd, mac, arch, batch, rx_queue, max_batch, tx_clk, tx_phy):
+    testname = 'test_rx_batch'
+
+    profile = f'{mac}_{tx_phy.get_name()}_batch{batch}'
+    binary = f'{testname}/bin/{profile}/{testname}_{profile}.xe'
+    assert os.path.isfile(binary)
+
+    with capfd.disabled():
+        print(f"Running {testname}: {tx_phy.get_name()} phy at {tx_clk.get_name()}, batch {batch}")
+
+    rand = random.Random()
+    rand.seed(1)
+
+    dut_mac_address = get_dut_mac_address()
+    # The client queue holds one less than ETHERNET_RX_CLIENT_QUEUE_SIZE frames,
+    # which is set larger than ETHERNET_RX_MAX_BATCH_PACKETS for every MAC
+    backlog = int(rx_queue) - 1
+    assert backlog > int(max_batch)
+
+    # The hold frame is received on its own, then the backlog arrives while the
+    # client holds off. The last frame arrives after the backlog has been received.
+    packets = [MiiPacket(rand, dst_mac_addr=dut_mac_address, ether_len_type=HOLD_ETHERTYPE)]
+    for i in range(backlog):
+        ifg = packet_processing_time(tx_phy, 46, mac) if i == 0 else tx_clk.get_min_ifg()
+        packets.append(MiiPacket(rand, dst_mac_addr=dut_mac_address,
+                                 create_data_args=['step', (i, 46)], inter_frame_gap=ifg))
+    packets.append(MiiPacket(rand, dst_mac_addr=dut_mac_address, inter_frame_gap=2 * HOLD_TIME))
+
+    tx_phy.set_packets(packets)
+
+    tester = BatchChecker(len(packets), int(batch), int(max_batch), backlog)
+
+    simargs = get_sim_args(testname, mac, tx_clk, tx_phy, arch)
+
+    result = run_on_simulator(binary,
+                              simthreads=[tx_clk, tx_phy],
+                              tester=tester,
+                              simargs=simargs,
+                              capfd=capfd,
+                              do_xe_prebuild=False)
+
+    assert result is True, f"{result}"
+
+
+@pytest.mark.parametrize("params", params["PROFILES"], ids=["-".join(list(profile.values())) for profile in params["PROFILES"]])
+def test_rx_batch(capfd, params):
+    if params["phy"] == "mii":
+        (tx_clk, tx_phy) = get_mii_tx_clk_phy(test_ctrl="tile[0]:XS1_PORT_1A", expect_loopback=False)
+    elif params["phy"] == "rgmii":
+        rate = Clock.CLK_125MHz if params["clk"] == "125MHz" else Clock.CLK_25MHz
+        (tx_clk, tx_phy) = get_rgmii_tx_clk_phy(rate, test_ctrl="tile[0]:XS1_PORT_1A", expect_loopback=False)
+    else:
+        assert 0, f"Invalid params: {params}"
+
+    do_test(capfd, params["mac"], params["arch"], params["batch"],
+            params["rx_queue"], params["max_batch"], tx_clk, tx_phy)
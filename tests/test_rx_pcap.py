@@ -0,0 +1,52 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# Replay the captures in the pcap corpus through the test_rx application and
+# check the frames looped back by the DUT. The frames received from the DUT are
+# written to a pcap file in the logs folder.
+#
+
+import random
+import json
+from pathlib import Path
+import pytest
+
+from mii_pcap import read_packets, PcapWriter
+from helpers import do_rx_test, packet_processing_time, get_dut_mac_address
+from helpers import create_if_needed, run_parametrised_test_rx, PacketSource
+
+with open(Path(__file__).parent / "test_tx/test_params.json") as f:
+    params = json.load(f)
+
+corpus = sorted((Path(__file__).parent / "pcap").glob("*.pcap*"))
+
+def replay_packets(filename, tx_phy, mac):
+    """ Yield the packets of a capture, marking those the DUT filters out as dropped
+    """
+    accepted = [bytes(get_dut_mac_address()), b'\xff\xff\xff\xff\xff\xff']
+
+    # The DUT needs time to process each frame, so the gaps in the capture are
+    # limited to the range the DUT can keep up with
+    min_ifg = packet_processing_time(tx_phy, 1500, mac)
+    for packet in read_packets(filename, tx_phy.get_clock().get_bit_time(),
+                               min_ifg=min_ifg, max_ifg=4*min_ifg):
+        packet.dropped = packet.dst_mac_addr not in accepted
+        yield packet
+
+
+def do_test(capfd, mac, arch, rx_clk, rx_phy, tx_clk, tx_phy, seed, filename):
+    log_folder = create_if_needed("logs")
+    capture_filename = f"{log_folder}/test_rx_pcap_{filename.stem}_{mac}_{tx_phy.get_name()}_{tx_clk.get_name()}_{arch}.pcap"
+
+    with PcapWriter(capture_filename, include_fcs=True) as capture:
+        rx_phy.set_capture(capture)
+        packets = PacketSource(replay_packets, filename, tx_phy, mac)
+        do_rx_test(capfd, mac, arch, rx_clk, rx_phy, tx_clk, tx_phy, packets, __file__, seed,
+                   override_dut_dir='test_rx')
+
+
+@pytest.mark.parametrize("filename", corpus, ids=[f.name for f in corpus])
+@pytest.mark.parametrize("params", params["PROFILES"], ids=["-".join(list(profile.values())) for profile in params["PROFILES"]])
+def test_rx_pcap(capfd, params, filename):
+    random.seed(1)
+    run_parametrised_test_rx(capfd, lambda *args: do_test(*args, filename), params)
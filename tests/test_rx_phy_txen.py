@@ -0,0 +1,135 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# Check that the receive PHYs find the end of a frame when TXEN is only low
+# for a single clock cycle. The PHYs sample TXEN on both edges of the clock, so
+# a drop of a whole cycle always covers an edge whatever its phase. The PHYs are
+# run against a fake simulator that plays back a waveform on the TX pins.
+#
+
+import random
+import pytest
+
+from mii_clock import Clock
+from mii_packet import MiiPacket
+from mii_phy import MiiReceiver
+from rgmii_phy import RgmiiReceiver
+
+
+class Terminated(Exception):
+    pass
+
+
+class FakeXsi(object):
+    """ Plays back a list of (start, end, txd) intervals during which TXEN is
+        high. The test control pin goes high at ctrl_time.
+    """
+
+    def __init__(self, intervals, ctrl_time):
+        self.time = 0
+        self._intervals = intervals
+        self._ctrl_time = ctrl_time
+
+    def get_time(self):
+        return self.time
+
+    def sample_port_pins(self, port):
+        if port == 'ctrl':
+            return 1 if self.time >= self._ctrl_time else 0
+
+        for (start, end, txd) in self._intervals:
+            if start <= self.time < end:
+                return 1 if port == 'txen' else txd
+        return 0
+
+    def terminate(self):
+        raise Terminated()
+
+
+class FakeSimThread(object):
+    """ Predicate waits step through time a fraction of a clock period at a time
+    """
+
+    def __init__(self, xsi, *args, **kwargs):
+        super(FakeSimThread, self).__init__(*args, **kwargs)
+        self.xsi = xsi
+        self._step = self._clock._period / 16
+
+    def wait_until(self, t):
+        assert t >= self.xsi.time
+        self.xsi.time = t
+
+    def wait(self, fn):
+        while not fn(self):
+            self.xsi.time += self._step
+
+
+class FakeMiiReceiver(FakeSimThread, MiiReceiver):
+    pass
+
+
+class FakeRgmiiReceiver(FakeSimThread, RgmiiReceiver):
+    pass
+
+
+def get_symbols(packet, rate):
+    """ Returns the values on TXD for each cycle of the frame
+    """
+    nibbles = packet.get_nibbles()
+    if rate == Clock.CLK_125MHz:
+        return [nibbles[i] | (nibbles[i+1] << 4) for i in range(0, len(nibbles), 2)]
+    return list(nibbles)
+
+
+def run_receiver(phy_class, rate, phase):
+    clock = Clock('clk', rate)
+    period = clock._period
+
+    rand = random.Random(1)
+    packets = [MiiPacket(rand, num_data_bytes=46) for i in range(2)]
+
+    # Frames are one clock cycle apart, starting at a phase of the clock
+    intervals = []
+    t = 10 * period + phase * period
+    for packet in packets:
+        for symbol in get_symbols(packet, rate):
+            intervals.append((t, t + period, symbol))
+            t += period
+        t += period
+
+    received = []
+    xsi = FakeXsi(intervals, t + 4 * period)
+    phy = phy_class(xsi, 'txd', 'txen', clock, test_ctrl='ctrl',
+                    packet_fn=lambda packet, phy: received.append(packet))
+
+    with pytest.raises(Terminated):
+        phy.run()
+
+    return (clock, packets, received)
+
+
+PHASES = [0, 0.25, 0.5, 0.75]
+
+
+@pytest.mark.parametrize("phase", PHASES)
+def test_mii_txen_drop(phase):
+    (clock, packets, received) = run_receiver(FakeMiiReceiver, Clock.CLK_25MHz, phase)
+    check_received(clock, packets, received)
+
+
+@pytest.mark.parametrize("rate", [Clock.CLK_25MHz, Clock.CLK_125MHz])
+@pytest.mark.parametrize("phase", PHASES)
+def test_rgmii_txen_drop(rate, phase):
+    (clock, packets, received) = run_receiver(FakeRgmiiReceiver, rate, phase)
+    check_received(clock, packets, received)
+
+
+def check_received(clock, packets, received):
+    assert len(received) == len(packets)
+    for (sent, packet) in zip(packets, received):
+        assert packet.get_frame_bytes() == sent.get_frame_bytes()
+
+    # The end of the first frame is found by the first edge after TXEN goes low,
+    # so the gap seen is between half a cycle and a cycle
+    period = clock._period
+    assert period / 2 - period / 16 <= received[1].inter_frame_gap <= period
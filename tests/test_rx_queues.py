@@ -24,61 +24,16 @@ import Pyxsim as px
 
 from mii_clock import Clock
 from mii_packet import MiiPacket
+from traffic import TrafficProfile, TrafficClass, UniformSizes
 from helpers import packet_processing_time, get_dut_mac_address, args
 from helpers import choose_small_frame_size, check_received_packet
 from helpers import get_mii_tx_clk_phy, get_rgmii_tx_clk_phy, create_if_needed, get_sim_args
+from helpers import run_on_simulator, get_seed, select_packets
 
 
 with open(Path(__file__).parent / "test_rx_queues/test_params.json") as f:
     params = json.load(f)
 
-def choose_data_size(rand, data_len_min, data_len_max):
-    return rand.randint(data_len_min, data_len_max)
-
-class DataLimiter(object):
-
-    HP_PACKET = 0
-    LP_PACKET = 1
-    OTHER_PACKET = 2
-
-    def __init__(self, limited_hp_mbps, bit_time):
-        self._limited_hp_mbps = limited_hp_mbps
-        self._credit = 0
-        self._bit_time = bit_time
-        self._max_mbps = 1000 / bit_time
-
-    def get_ifg(self, packet_type, num_data_bytes, tag):
-        preamble_bytes = 8
-        header_bytes = 14
-        tag_bytes = 4 if tag else 0
-        crc_bytes = 4
-        ifg_bytes = 12
-        num_packet_bytes = preamble_bytes + header_bytes + tag_bytes + num_data_bytes + crc_bytes + ifg_bytes
-        packet_time = num_packet_bytes * 8 * self._bit_time
-
-        self._credit += packet_time
-
-        if packet_type == self.HP_PACKET:
-            # Determine how long the packet should take at the limited rate
-            data_limited_time = packet_time * self._max_mbps / self._limited_hp_mbps
-
-            self._credit -= data_limited_time
-
-            if self._credit < 0:
-                ifg_time = -self._credit + ifg_bytes * 8 * self._bit_time
-                self._credit = 0
-            else:
-                ifg_time = ifg_bytes * 8 * self._bit_time
-        else:
-            data_limited_time = packet_time
-            ifg_time = ifg_bytes * 8 * self._bit_time
-
-        if 0:
-            print("Packet {n} bytes {ns} ns, limited means {scaled}ns -> {ifg}".format(
-               n=num_data_bytes, ns=packet_time, scaled=data_limited_time, ifg=ifg_time), file=sys.stderr)
-
-        return ifg_time
-
 class RxLpControl(px.SimThread):
 
     def __init__(self, rx_lp_ctl, bit_time, initial_value, randomise, seed):
@@ -136,117 +91,49 @@ def do_test(capfd, mac, arch, tx_clk, tx_phy, seed, test_id,
         print(f"weight_hp {weight_hp}, weight_lp {weight_lp}, weight_other {weight_other}, data_len_min {data_len_min}, data_len_max {data_len_max} weight_tagged {weight_tagged} weight_untagged {weight_untagged} max_hp_mbps {max_hp_mbps}")
 
     hp_mac_address = [0,1,2,3,4,5]
-    hp_seq_id = 0
-    hp_data_bytes = 0
-    lp_seq_id = 0
-    lp_data_bytes = 0
     other_mac_address = [12,13,14,15,16,17]
-    other_seq_id = 0
-    other_data_bytes = 0
-
-    packets = []
-    done = False
-
-    limiter = DataLimiter(max_hp_mbps, bit_time)
-    total_weight_tag = weight_tagged + weight_untagged
-    total_weight_tc = weight_hp + weight_lp + weight_other
-    while not done:
-        if (rand.randint(0, total_weight_tag) < weight_tagged):
-            tag = [0x81, 0x00, rand.randint(0,0xff), rand.randint(0, 0xff)]
-        else:
-            tag = None
-
-        mac_choice = rand.randint(0, total_weight_tc - 1)
-        if (mac_choice < weight_lp):
-            dst_mac_addr = rand.choice(lp_mac_addresses)
-        elif (mac_choice < weight_hp + weight_lp):
-            dst_mac_addr = hp_mac_address
-        else:
-            dst_mac_addr = other_mac_address
-
-        frame_size = choose_data_size(rand, data_len_min, data_len_max)
 
-        if (rand.randint(0,100) > 95):
-            burst_len = rand.randint(2,20)
-        else:
-            burst_len = 1
-
-        for j in range(burst_len):
-            # The seq_ids are effectively packet counts
-            if (hp_seq_id + lp_seq_id + other_seq_id) == num_packets:
-                done = True
-                break
-
-            if dst_mac_addr in lp_mac_addresses:
-                packet_type = DataLimiter.LP_PACKET
-                seq_id = lp_seq_id
-                lp_seq_id += 1
-                lp_data_bytes += frame_size + 14
-                if tag:
-                    lp_data_bytes += 4
-            elif dst_mac_addr == hp_mac_address:
-                packet_type = DataLimiter.HP_PACKET
-                seq_id = hp_seq_id
-                hp_seq_id += 1
-                hp_data_bytes += frame_size + 14
-                if tag:
-                    hp_data_bytes += 4
-            else:
-                packet_type = DataLimiter.OTHER_PACKET
-                seq_id = other_seq_id
-                other_seq_id += 1
-                other_data_bytes += frame_size + 14
-                if tag:
-                    other_data_bytes += 4
-
-            ifg = limiter.get_ifg(packet_type, frame_size, tag)
-
-            packets.append(MiiPacket(rand,
-                dst_mac_addr=dst_mac_addr,
-                create_data_args=['same', (seq_id, frame_size)],
-                vlan_prio_tag=tag,
-                inter_frame_gap=ifg
-            ))
-
-
-    tx_phy.set_packets(packets)
+    # Each burst repeats the same frame with a new sequence number
+    tag_ratio = weight_tagged / (weight_tagged + weight_untagged)
+    sizes = UniformSizes(data_len_min, data_len_max)
+    classes = [
+        TrafficClass("lp", lp_mac_addresses, weight=weight_lp, sizes=sizes, tag_ratio=tag_ratio,
+                     burst_prob=0.05, burst_len=(2, 20)),
+        TrafficClass("hp", [hp_mac_address], weight=weight_hp, sizes=sizes, tag_ratio=tag_ratio,
+                     burst_prob=0.05, burst_len=(2, 20), rate_mbps=max_hp_mbps),
+        TrafficClass("other", [other_mac_address], weight=weight_other, sizes=sizes, tag_ratio=tag_ratio,
+                     burst_prob=0.05, burst_len=(2, 20)),
+      ]
+    schedule = select_packets(TrafficProfile(classes, bit_time).generate(seed, num_frames=num_packets))
+
+    tx_phy.set_packets(schedule)
 
     with capfd.disabled():
-        print("Sending {n} hp packets with {b} bytes data".format(n=hp_seq_id, b=hp_data_bytes))
-        print("Sending {n} lp packets with {b} bytes hp data".format(n=lp_seq_id, b=lp_data_bytes))
-        print("Sending {n} other packets with {b} bytes hp data".format(n=other_seq_id, b=other_data_bytes))
+        for name in ["hp", "lp", "other"]:
+            counts = schedule.counts[name]
+            print(f"Sending {counts['frames']} {name} packets with {counts['bytes']} bytes data")
 
     expect_folder = create_if_needed("expect")
     expect_filename = f'{expect_folder}/{testname}_{mac}_{tx_phy.get_name()}_{tx_clk.get_name()}_{test_id}.expect'
-    create_expect(packets, expect_filename, hp_mac_address)
+    create_expect(schedule.counts["hp"]["bytes"], expect_filename)
     tester = px.testers.ComparisonTester(open(expect_filename), regexp=True, ordered=False)
 
     simargs = get_sim_args(testname, mac, tx_clk, tx_phy)
 
-    result = px.run_on_simulator_(  binary,
-                                    simthreads=[tx_clk, tx_phy, rxLpControl1, rxLpControl2],
-                                    tester=tester,
-                                    simargs=simargs,
-                                    capfd=capfd,
-                                    do_xe_prebuild=False)
+    result = run_on_simulator(binary,
+                              simthreads=[tx_clk, tx_phy, rxLpControl1, rxLpControl2],
+                              tester=tester,
+                              simargs=simargs,
+                              capfd=capfd,
+                              do_xe_prebuild=False)
     
 
     assert result is True, f"{result}"
 
-def create_expect(packets, filename, hp_mac_address):
+def create_expect(num_bytes_hp, filename):
     """ Create the expect file for what packets should be reported by the DUT
     """
-    num_bytes_hp = 0
-
-    for i,packet in enumerate(packets):
-        if packet.dropped:
-            continue
-
-        if (packet.dst_mac_addr == hp_mac_address):
-            num_bytes_hp += len(packet.get_packet_bytes())
-
     with open(filename, 'w') as f:
-        num_bytes = 0
         f.write("Received {} hp bytes\n".format(num_bytes_hp))
         f.write("LP client 1 received \\d+ bytes\n")
         f.write("LP client 2 received \\d+ bytes\n")
@@ -256,13 +143,13 @@ def create_expect(packets, filename, hp_mac_address):
 @pytest.mark.parametrize("params", params["PROFILES"], ids=["-".join(list(profile.values())) for profile in params["PROFILES"]])
 def test_rx_queues(capfd, params):
 
-    seed = random.randint(0, sys.maxsize)
+    seed = get_seed()
 
     verbose = False
 
     # Test 100 MBit - MII XS2
     if params["phy"] == "mii":
-        (tx_clk_25, tx_mii) = get_mii_tx_clk_phy(test_ctrl='tile[0]:XS1_PORT_1C', expect_loopback=False, verbose=verbose)
+        (tx_clk_25, tx_mii) = get_mii_tx_clk_phy(test_ctrl='tile[0]:XS1_PORT_1C', expect_loopback=False, verbose=verbose, compiled=True)
 
         # Test having every packet going to both LP receivers
         if params["test_id"] == "a":
@@ -285,7 +172,7 @@ def test_rx_queues(capfd, params):
     elif params["phy"] == "rgmii":
         # Test 100 MBit - RGMII
         if params["clk"] == "25MHz":
-            (tx_clk_25, tx_rgmii) = get_rgmii_tx_clk_phy(Clock.CLK_25MHz, test_ctrl='tile[0]:XS1_PORT_1C', expect_loopback=False, verbose=verbose)
+            (tx_clk_25, tx_rgmii) = get_rgmii_tx_clk_phy(Clock.CLK_25MHz, test_ctrl='tile[0]:XS1_PORT_1C', expect_loopback=False, verbose=verbose, compiled=True)
             if params["test_id"] == "a":
                 do_test(capfd, params["mac"], params["arch"], tx_clk_25, tx_rgmii, seed, params["test_id"],
                         num_packets=args.num_packets,
@@ -295,7 +182,7 @@ def test_rx_queues(capfd, params):
                         max_hp_mbps=100)
         # Test 1000 MBit - RGMII
         elif params["clk"] == "125MHz":
-            (tx_clk_125, tx_rgmii) = get_rgmii_tx_clk_phy(Clock.CLK_125MHz, test_ctrl='tile[0]:XS1_PORT_1C', expect_loopback=False,verbose=verbose)
+            (tx_clk_125, tx_rgmii) = get_rgmii_tx_clk_phy(Clock.CLK_125MHz, test_ctrl='tile[0]:XS1_PORT_1C', expect_loopback=False,verbose=verbose, compiled=True)
             if params["test_id"] == "a":
                 pytest.skip("https://github.com/xmos/lib_ethernet/issues/57")
                 do_test(capfd, params["mac"], params["arch"], tx_clk_125, tx_rgmii, seed, params["test_id"],
@@ -15,16 +15,28 @@ from mii_packet import MiiPacket
 from helpers import get_sim_args, create_if_needed, args
 from helpers import get_mii_rx_clk_phy, get_rgmii_rx_clk_phy
 from helpers import get_mii_tx_clk_phy, get_rgmii_tx_clk_phy
+from helpers import run_on_simulator
+from qav_shaper_model import QavShaperModel, ShaperFrame, TX_DEPTHS, calc_idle_slope, check_egress
 
 with open(Path(__file__).parent / "test_shaper/test_params.json") as f:
     params = json.load(f)
 
 high_priority_mac_addr = [0, 1, 2, 3, 4, 5]
 
+# The largest frame sent by lp_traffic(), without the CRC
+max_lp_frame_bytes = 1518
+
 def packet_checker(packet, phy):
     if phy._verbose:
         sys.stdout.write(packet.dump())
-    if packet.dst_mac_addr == high_priority_mac_addr:
+
+    # Record when each frame started on the wire to check against the shaper model
+    num_bytes = len(packet.get_packet_bytes())
+    frame_time = (8 + num_bytes + 4) * 8 * phy.get_clock().get_bit_time()
+    is_hp = packet.dst_mac_addr == bytes(high_priority_mac_addr)
+    phy.egress.append((phy.xsi.get_time() - frame_time, num_bytes, is_hp))
+
+    if packet.dst_mac_addr == bytes(high_priority_mac_addr):
         if phy._verbose: print("HP")
         phy.n_hp_packets += 1
         done = phy.timeout_monitor.hp_packet_received()
@@ -117,6 +129,7 @@ def do_test(capfd, mac, arch, rx_clk, rx_phy, tx_clk, tx_phy):
     rx_phy.timeout_monitor = timeout_monitor
     rx_phy.n_hp_packets = 0
     rx_phy.n_lp_packets = 0
+    rx_phy.egress = []
    
     expect_folder = create_if_needed("expect")
     expect_filename = '{folder}/{test}_{phy}_{clk}.expect'.format(
@@ -130,24 +143,44 @@ def do_test(capfd, mac, arch, rx_clk, rx_phy, tx_clk, tx_phy):
         pytest.skip("DUT firmware does not seem to obey the slope for mii - https://github.com/xmos/lib_ethernet/issues/56")
 
     if rx_phy.get_name() == 'rgmii' and rx_clk.get_name() == '125Mhz':
-        result = px.run_on_simulator_(  binary,
-                                        simthreads=[rx_clk, rx_phy, tx_clk, tx_phy, timeout_monitor],
-                                        tester=tester,
-                                        simargs=simargs,
-                                        do_xe_prebuild=False,
-                                        capfd=capfd,
-                                        timeout=1200)
+        result = run_on_simulator(binary,
+                                  simthreads=[rx_clk, rx_phy, tx_clk, tx_phy, timeout_monitor],
+                                  tester=tester,
+                                  simargs=simargs,
+                                  do_xe_prebuild=False,
+                                  capfd=capfd,
+                                  timeout=1200)
     else:
-        result = px.run_on_simulator_(  binary,
-                                        simthreads=[rx_clk, rx_phy, tx_clk, tx_phy, timeout_monitor],
-                                        tester=tester,
-                                        simargs=simargs,
-                                        capfd=capfd,
-                                        do_xe_prebuild=False)
+        result = run_on_simulator(binary,
+                                  simthreads=[rx_clk, rx_phy, tx_clk, tx_phy, timeout_monitor],
+                                  tester=tester,
+                                  simargs=simargs,
+                                  capfd=capfd,
+                                  do_xe_prebuild=False)
 
 
     assert result is True, f"{result}"
 
+    errors = check_shaper_egress(rx_phy, slope, bit_time)
+    assert not errors, "\n".join(errors)
+
+
+def check_shaper_egress(phy, slope, bit_time):
+    """ Check the start time of every HP frame received against the Qav shaper
+        model. The HP traffic is always queued so the HP frames are ready from the
+        start. When the LP frames were queued is not known, so each is taken to be
+        ready when it started and only the HP frames are checked. The MAC may
+        already hold as many LP frames as it can transmit at a time when an HP
+        frame becomes eligible, so the tolerance is that many of the largest.
+    """
+    model = QavShaperModel(calc_idle_slope(slope), bit_time, phy.get_name())
+    first_start = phy.egress[0][0]
+    frames = [ShaperFrame(first_start if is_hp else start, num_bytes, is_hp)
+              for (start, num_bytes, is_hp) in phy.egress]
+    observed = [start for (start, num_bytes, is_hp) in phy.egress]
+    tolerance = TX_DEPTHS[phy.get_name()] * (model.get_frame_time(max_lp_frame_bytes) + model.ifg_time)
+    return check_egress(frames, observed, model, tolerance, hp_only=True)
+
 
 def create_expect(filename, num_expected_packets):
     """ Create the expect file for what packets should be reported by the DUT
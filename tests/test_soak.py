@@ -0,0 +1,62 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# Check the packet selections, schedule minimization and builds of the soak runner.
+#
+
+from helpers import parse_packet_selection, format_packet_selection
+from soak import minimize, open_db, add_run, get_run, get_build_configs
+
+
+def test_packet_selection():
+    indices = [0, 1, 2, 5, 7, 8, 9, 20]
+    selection = format_packet_selection(indices)
+    assert selection == "0-2,5,7-9,20"
+    assert parse_packet_selection(selection) == indices
+
+
+def test_minimize_single():
+    tries = []
+
+    def fails(indices):
+        tries.append(indices)
+        return 37 in indices
+
+    assert minimize(list(range(100)), fails) == [37]
+    assert len(tries) < 30
+
+
+def test_minimize_pair():
+    # The failure needs both packets to be sent
+    def fails(indices):
+        return 3 in indices and 90 in indices
+
+    assert minimize(list(range(100)), fails) == [3, 90]
+
+
+def test_results_db(tmp_path):
+    db = open_db(tmp_path / "soak.sqlite")
+    run = {"nodeid": "test_rx.py::test_rx[standard-mii]", "seed": 1234, "packets": None,
+           "passed": False, "duration_s": 1.5, "metrics": {"num_packets": 10}, "output": "FAILED"}
+    run_id = add_run(db, run)
+    minimized_id = add_run(db, dict(run, packets="3-4"), minimized_from=run_id)
+
+    row = get_run(db, minimized_id)
+    assert row["seed"] == 1234
+    assert row["packets"] == "3-4"
+    assert row["minimized_from"] == run_id
+    assert not row["passed"]
+
+
+def test_build_configs():
+    # Each test needs the config of its own profile, named as its application names them
+    assert get_build_configs(["test_4_1_1.py::test_4_1_1[mii-25MHz-rt-xs2]",
+                              "test_shaper.py::test_shaper[rgmii-125MHz-hp-xs2]",
+                              "test_macaddr_filter.py::test_macaddr_filter[mii-25MHz-rt-xs2-256]"]) == [
+        ("test_macaddr_filter", "rt_mii_256"), ("test_rx", "rt_mii"), ("test_shaper", "hp_rgmii_125MHz")]
+
+    # Tests that are not parametrized by profile need all the configs of their application
+    assert get_build_configs(["test_rx_batch.py::test_rx_batch"]) == [
+        ("test_rx_batch", c) for c in ["rt_mii_batch1", "rt_mii_batch8", "rt_rgmii_batch1", "rt_rgmii_batch8"]]
+
+    assert get_build_configs(["test_soak.py::test_build_configs"]) == []
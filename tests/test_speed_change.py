@@ -14,6 +14,7 @@ from mii_clock import Clock
 from helpers import do_rx_test, packet_processing_time, get_dut_mac_address, args
 from helpers import choose_small_frame_size, check_received_packet
 from helpers import get_rgmii_tx_clk_phy, create_if_needed, get_sim_args
+from helpers import run_on_simulator, get_seed
 
 with open(Path(__file__).parent / "test_speed_change/test_params.json") as f:
     params = json.load(f)
@@ -121,12 +122,12 @@ def do_test(capfd, mac, arch, tx_clk_25, tx_rgmii_25, tx_clk_125, tx_rgmii_125,
     
     simargs = get_sim_args(testname, mac, tx_clk_25, tx_rgmii_25)
 
-    result = px.run_on_simulator_(  binary,
-                                    simthreads=[tx_clk_25, tx_rgmii_25, tx_clk_125, tx_rgmii_125, clock_control],
-                                    tester=tester,
-                                    simargs=simargs,
-                                    capfd=capfd,
-                                    do_xe_prebuild=False)
+    result = run_on_simulator(binary,
+                              simthreads=[tx_clk_25, tx_rgmii_25, tx_clk_125, tx_rgmii_125, clock_control],
+                              tester=tester,
+                              simargs=simargs,
+                              capfd=capfd,
+                              do_xe_prebuild=False)
     
 
     assert result is True, f"{result}"
@@ -146,7 +147,7 @@ def create_expect(filename, packets_25, packets_125):
 
 @pytest.mark.parametrize("params", params["PROFILES"], ids=["-".join(list(profile.values())) for profile in params["PROFILES"]])
 def test_speed_change(capfd, params):
-    seed = random.randint(0, sys.maxsize)
+    seed = get_seed()
     verbose = False
     
     (tx_clk_25, tx_rgmii_25) = get_rgmii_tx_clk_phy(Clock.CLK_25MHz, initial_delay=initial_delay,
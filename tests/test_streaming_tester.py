@@ -0,0 +1,62 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# Check the online output comparison of the StreamingTester and the packet field
+# differences it is given by the receive checker.
+#
+
+import random
+
+from mii_packet import MiiPacket
+from streaming_tester import StreamingTester
+
+golden = ["Received packet 0 ok\n", "\n", "Received packet 1 ok\n", "Test done\n"]
+
+
+def test_output_in_chunks():
+    tester = StreamingTester(golden)
+    assert tester.check_output("Received pack")
+    assert tester.check_output("et 0 ok\nReceived packet 1 ok\nTest", time=1e9)
+    assert tester.run([" done", ""])
+    assert tester.get_output() == ["Received packet 0 ok", "Received packet 1 ok", "Test done", ""]
+
+
+def test_first_mismatch_is_reported():
+    tester = StreamingTester(golden)
+    assert tester.check_output("Received packet 0 ok\n")
+    assert not tester.check_output("ERROR: packet 1 does not match\nReceived packet 1 ok\n", time=2e9)
+    assert tester.failure.startswith("Line 2 of output expected:")
+    assert "at simulated time 2000 ns" in tester.failure
+    assert not tester.run(["Test done"])
+
+
+def test_missing_and_extra_output():
+    tester = StreamingTester(golden)
+    assert not tester.run(["Received packet 0 ok"])
+    assert "missing" in tester.failure
+
+    tester = StreamingTester(golden)
+    assert not tester.run(["Received packet 0 ok", "Received packet 1 ok", "Test done", "Again"])
+    assert "was not expected" in tester.failure
+
+
+def test_regexp_and_ignore():
+    tester = StreamingTester([r"Received packet \d+ ok"], regexp=True, ignore=["Warning"])
+    assert tester.check_output("Warning: multidrive\nReceived packet 12 ok\n")
+    assert tester.run([])
+
+
+def test_packet_diff():
+    rand = random.Random(1)
+    packet = MiiPacket(rand, dst_mac_addr=[0, 1, 2, 3, 4, 5], create_data_args=['step', (1, 60)])
+    other = MiiPacket(rand, dst_mac_addr=[0, 1, 2, 3, 4, 6], create_data_args=['step', (1, 60)])
+    other.src_mac_addr = packet.src_mac_addr
+    assert packet.diff(packet) == []
+
+    other.data_bytes[10] = 0
+    other.data_bytes.append(0)
+    assert packet.diff(other) == [
+        "dst_mac_addr: [0x00 0x01 0x02 0x03 0x04 0x05] != [0x00 0x01 0x02 0x03 0x04 0x06]",
+        "data_bytes: length 60 != 61",
+        "data_bytes: first difference at byte 10: 0x0a != 0x00",
+      ]
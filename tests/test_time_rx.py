@@ -16,6 +16,7 @@ from mii_packet import MiiPacket
 from helpers import do_rx_test, get_dut_mac_address, check_received_packet
 from helpers import get_sim_args, create_if_needed, get_mii_tx_clk_phy, args
 from helpers import get_rgmii_tx_clk_phy
+from helpers import run_on_simulator
 
 
 with open(Path(__file__).parent / "test_time_rx/test_params.json") as f:
@@ -80,12 +81,12 @@ def do_test(capfd, mac, arch, tx_clk, tx_phy, seed):
 
     simargs = get_sim_args(testname, mac, tx_clk, tx_phy)
 
-    result = px.run_on_simulator_(  binary,
-                                    simthreads=[tx_clk, tx_phy],
-                                    tester=tester,
-                                    simargs=simargs,
-                                    capfd=capfd,
-                                    do_xe_prebuild=False)
+    result = run_on_simulator(binary,
+                              simthreads=[tx_clk, tx_phy],
+                              tester=tester,
+                              simargs=simargs,
+                              capfd=capfd,
+                              do_xe_prebuild=False)
 
     assert result is True, f"{result}"
 
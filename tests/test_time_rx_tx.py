@@ -8,17 +8,18 @@ import sys
 from pathlib import Path
 import json
 import pytest
-import subprocess
-from filelock import FileLock
 import re
 
 from mii_clock import Clock
 from mii_phy import MiiTransmitter, MiiReceiver
 from rgmii_phy import RgmiiTransmitter, RgmiiReceiver
 from mii_packet import MiiPacket
+from metrics import MetricsCollector
 from helpers import do_rx_test, get_dut_mac_address, check_received_packet, args
 from helpers import get_sim_args, create_if_needed, get_mii_tx_clk_phy, get_mii_rx_clk_phy
 from helpers import get_rgmii_tx_clk_phy, get_rgmii_rx_clk_phy
+from helpers import build_if_needed, write_if_changed
+from helpers import run_on_simulator
 
 
 with open(Path(__file__).parent / "test_time_rx_tx/test_params.json") as f:
@@ -34,9 +35,6 @@ def start_test(phy):
 
     tx_complete = False
     rx_complete = False
-    phy.num_packets = 0
-    phy.num_bytes = 0
-    phy.start_time = 0
     phy.end_time = 0
 
 def set_tx_complete(phy):
@@ -46,30 +44,17 @@ def set_tx_complete(phy):
 def packet_checker(packet, phy):
     global rx_complete
 
-    time_now = phy.xsi.get_time()
+    # The packet has already been counted by the metrics collector
+    metrics = phy.get_metrics().get_total()
 
     # The CRC is not included in the packet bytes
     num_packet_bytes = len(packet.get_packet_bytes()) + 4
 
-    clock = phy.get_clock()
-    bit_time = clock.get_bit_time()
+    bit_time = phy.get_clock().get_bit_time()
+    mega_bits_per_second = metrics.get_throughput()
+    efficiency = metrics.get_efficiency(bit_time)
 
-    if not phy.start_time:
-        packet_time = num_packet_bytes * 8 * bit_time
-        phy.start_time = time_now - packet_time
-
-    phy.num_packets += 1
-    phy.num_bytes += num_packet_bytes
-
-    time_delta = time_now - phy.start_time
-    mega_bits_per_second = (phy.num_bytes * 8.0) / time_delta * 1000
-
-    if phy.num_packets > 1:
-        efficiency = ((((phy.num_bytes * 8) + ((phy.num_packets - 1) * 96)) * bit_time) / time_delta) * 100
-    else:
-        efficiency = (((phy.num_bytes * 8) * bit_time) / time_delta) * 100
-
-    if phy.num_packets > num_test_packets:
+    if metrics.num_frames > num_test_packets:
         if rx_complete and tx_complete:
 
             # Allow time for the end of the packet to be received by the application
@@ -86,22 +71,12 @@ def packet_checker(packet, phy):
             phy.xsi.terminate()
 
     else:
-        print(f"Packet {phy.num_packets} received; bytes: {num_packet_bytes}, ifg: {packet.get_ifg():.2f} => {mega_bits_per_second:.2f} Mb/s, efficiency {efficiency:.2f}%")
+        print(f"Packet {metrics.num_frames} received; bytes: {num_packet_bytes}, ifg: {packet.get_ifg():.2f} => {mega_bits_per_second:.2f} Mb/s, efficiency {efficiency:.2f}%")
 
-        if phy.num_packets == num_test_packets:
+        if metrics.num_frames == num_test_packets:
             rx_complete = True
 
 
-def build_xccm(testname, config):
-    lock_path = f"{testname}.lock"
-    # xdist can cause race conditions so use a lock
-    with FileLock(lock_path):
-        result = subprocess.run('cmake -B build -G "Unix Makefiles"', shell=True, cwd=testname)
-        result.check_returncode()
-        result = subprocess.run(f'xmake -j 8 -C build {config}', shell=True, cwd=testname)
-        result.check_returncode()
-
-
 # I had problems with the comparison tester putting a newline in the expected regex so wrote custom one and replaced create_expect
 class mytester:
     def __init__(self, packets):
@@ -145,21 +120,25 @@ class mytester:
 
     
 
-def do_test(capfd, mac, arch, rx_clk, rx_phy, tx_clk, tx_phy, seed):
+def do_test(capfd, mac, arch, clk, rx_clk, rx_phy, tx_clk, tx_phy, seed):
     rand = random.Random()
     rand.seed(seed)
     start_test(rx_phy) # setup globs used in checkers
 
+    # The latency of frames looped back by the DUT and the achieved throughput
+    metrics = MetricsCollector(rx_clk)
+    rx_phy.set_metrics(metrics)
+    tx_phy.set_metrics(metrics)
+
     # Generate an include file to define the seed
-    with open(os.path.join("include", "seed.inc"), "w") as f:
-        f.write("#define SEED {}".format(seed))
+    write_if_changed(os.path.join("include", "seed.inc"), "#define SEED {}".format(seed))
 
     testname = 'test_time_rx_tx'
 
     profile = f'{mac}_{tx_phy.get_name()}'
     binary = f'{testname}/bin/{profile}/{testname}_{profile}.xe'
     with capfd.disabled():
-        build_xccm(testname, profile)
+        build_if_needed(testname, profile)
 
     assert os.path.isfile(binary)
 
@@ -203,12 +182,15 @@ def do_test(capfd, mac, arch, rx_clk, rx_phy, tx_clk, tx_phy, seed):
 
     simargs = get_sim_args(testname, mac, tx_clk, tx_phy)
 
-    result = px.run_on_simulator_(  binary,
-                                    simthreads=[rx_clk, rx_phy, tx_clk, tx_phy],
-                                    tester=mytester(packets),
-                                    simargs=simargs,
-                                    capfd=capfd,
-                                    do_xe_prebuild=False)
+    result = run_on_simulator(binary,
+                              simthreads=[rx_clk, rx_phy, tx_clk, tx_phy, metrics],
+                              tester=mytester(packets),
+                              simargs=simargs,
+                              capfd=capfd,
+                              do_xe_prebuild=False)
+
+    metrics.export(Path(__file__).parent / testname / "build" / "metrics" / f"{profile}_{clk}.json",
+                   {"mac": mac, "phy": tx_phy.get_name(), "clk": clk})
 
     assert result is True, f"{result}"
 
@@ -221,15 +203,15 @@ def test_time_rx_tx(capfd, params):
       # Test 100 MBit - MII XS2
     if params["phy"] == "mii":
         (rx_clk_25, rx_mii) = get_mii_rx_clk_phy(packet_fn=packet_checker, test_ctrl=test_ctrl)
-        (tx_clk_25, tx_mii) = get_mii_tx_clk_phy(do_timeout=False, complete_fn=set_tx_complete, verbose=verbose, dut_exit_time=200000 * 1e6)
-        do_test(capfd, params["mac"], params["arch"], rx_clk_25, rx_mii, tx_clk_25, tx_mii, seed)
+        (tx_clk_25, tx_mii) = get_mii_tx_clk_phy(do_timeout=False, complete_fn=set_tx_complete, verbose=verbose, dut_exit_time=200000 * 1e6, compiled=True)
+        do_test(capfd, params["mac"], params["arch"], params["clk"], rx_clk_25, rx_mii, tx_clk_25, tx_mii, seed)
 
     elif params["phy"] == "rgmii":
         # Test 100 MBit - RGMII
         if params["clk"] == "25MHz":
             (rx_clk_25, rx_rgmii) = get_rgmii_rx_clk_phy(Clock.CLK_25MHz, packet_fn=packet_checker, test_ctrl=test_ctrl)
-            (tx_clk_25, tx_rgmii) = get_rgmii_tx_clk_phy(Clock.CLK_25MHz, do_timeout=False, complete_fn=set_tx_complete, verbose=verbose, dut_exit_time=200000 * 1e6)
-            do_test(capfd, params["mac"], params["arch"], rx_clk_25, rx_rgmii, tx_clk_25, tx_rgmii, seed)
+            (tx_clk_25, tx_rgmii) = get_rgmii_tx_clk_phy(Clock.CLK_25MHz, do_timeout=False, complete_fn=set_tx_complete, verbose=verbose, dut_exit_time=200000 * 1e6, compiled=True)
+            do_test(capfd, params["mac"], params["arch"], params["clk"], rx_clk_25, rx_rgmii, tx_clk_25, tx_rgmii, seed)
         # Test 1000 MBit - RGMII
         elif params["clk"] == "125MHz":
             # The RGMII application cannot keep up with line-rate gigabit data
@@ -14,6 +14,7 @@ from rgmii_phy import RgmiiTransmitter
 from mii_packet import MiiPacket
 from helpers import get_sim_args, create_if_needed, args
 from helpers import get_mii_rx_clk_phy, get_mii_tx_clk_phy, get_rgmii_rx_clk_phy, get_rgmii_tx_clk_phy
+from helpers import run_on_simulator
 
 with open(Path(__file__).parent / "test_time_tx/test_params.json") as f:
     params = json.load(f)
@@ -77,13 +78,13 @@ def do_test(capfd, mac, arch, rx_clk, rx_phy, tx_clk, tx_phy):
 
     simargs = get_sim_args(testname, mac, rx_clk, rx_phy)
 
-    result = px.run_on_simulator_(  binary,
-                                    simthreads=[rx_clk, rx_phy, tx_clk, tx_phy],
-                                    # tester=mytester(packets),
-                                    tester=tester,
-                                    simargs=simargs,
-                                    capfd=capfd,
-                                    do_xe_prebuild=False)
+    result = run_on_simulator(binary,
+                              simthreads=[rx_clk, rx_phy, tx_clk, tx_phy],
+                              # tester=mytester(packets),
+                              tester=tester,
+                              simargs=simargs,
+                              capfd=capfd,
+                              do_xe_prebuild=False)
 
     assert result is True, f"{result}"
 
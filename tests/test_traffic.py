@@ -0,0 +1,90 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# Check the schedules generated by the TrafficProfile engine.
+#
+
+import numpy as np
+
+from traffic import TrafficProfile, TrafficClass, AvbStreams, UniformSizes
+from traffic import PREAMBLE_BYTES, CRC_BYTES, MIN_IFG_BITS
+
+bit_time = 10e6
+
+
+def get_frame_times(schedule):
+    """ Returns the wire time of each frame in the schedule
+    """
+    return [(len(packet.get_packet_bytes()) + PREAMBLE_BYTES + CRC_BYTES) * 8 * bit_time
+            for packet in schedule]
+
+
+def test_counts():
+    classes = [
+        TrafficClass("a", [[1,2,3,4,5,6], [2,3,4,5,6,7]], weight=2, tag_ratio=0.5),
+        TrafficClass("b", [[3,4,5,6,7,8]], weight=1, burst_prob=0.5, burst_len=(2, 10)),
+      ]
+    schedule = TrafficProfile(classes, bit_time).generate(1, num_frames=1000)
+    assert len(schedule) == 1000
+
+    counts = {"a": {"frames": 0, "bytes": 0}, "b": {"frames": 0, "bytes": 0}}
+    for (name, packet) in zip(schedule.get_class_names(), schedule):
+        counts[name]["frames"] += 1
+        counts[name]["bytes"] += len(packet.get_packet_bytes())
+    assert counts == schedule.counts
+
+
+def test_seeded():
+    classes = [TrafficClass("a", [[1,2,3,4,5,6]], sizes=UniformSizes(46, 1500), tag_ratio=0.5)]
+    profile = TrafficProfile(classes, bit_time, ifg_bits=(96, 192))
+    first = [p.get_packet_bytes() for p in profile.generate(3, num_frames=50)]
+    second = [p.get_packet_bytes() for p in profile.generate(3, num_frames=50)]
+    assert first == second
+
+
+def test_rate_limit():
+    # The limited class shares the line with an unlimited class
+    classes = [
+        TrafficClass("hp", [[0,1,2,3,4,5]], rate_mbps=30),
+        TrafficClass("lp", [[1,2,3,4,5,6]]),
+      ]
+    schedule = TrafficProfile(classes, bit_time).generate(1, num_frames=2000)
+    names = schedule.get_class_names()
+    frame_times = get_frame_times(schedule)
+    ifgs = schedule.get_ifgs()
+
+    # The reference implementation accumulates credit one frame at a time
+    credit = 0
+    min_ifg = MIN_IFG_BITS * bit_time
+    for (name, frame_time, ifg) in zip(names, frame_times, ifgs):
+        packet_time = frame_time + min_ifg
+        credit += packet_time
+        expected = min_ifg
+        if name == "hp":
+            credit -= packet_time * 100 / 30
+            if credit < 0:
+                expected = min_ifg - credit
+                credit = 0
+        assert np.isclose(ifg, expected)
+
+    total_time = sum(frame_times) + sum(ifgs)
+    hp_bits = schedule.counts["hp"]["bytes"] * 8
+    assert hp_bits / total_time * 1e9 <= 30
+
+
+def test_avb_windows():
+    classes = [
+        TrafficClass("none", [[0,0,0,0,0,0]], idle=True, burst_prob=0.7, burst_len=(1, 20)),
+        TrafficClass("lp", [[1,1,1,1,1,1]], tag_ratio=0.5, burst_prob=0.7, burst_len=(1, 20)),
+      ]
+    avb_streams = AvbStreams([[i,1,2,3,4,5] for i in range(4)], 100)
+    profile = TrafficProfile(classes, bit_time, ifg_bits=(96, 192), avb_streams=avb_streams)
+    schedule = profile.generate(1, num_windows=20)
+
+    for name in avb_streams.get_names():
+        assert schedule.counts[name] == {"frames": 20, "bytes": 20 * (100 + 18)}
+    assert schedule.counts["none"]["frames"] == 0
+    assert schedule.counts["lp"]["frames"] > 0
+
+    # The frames never overlap
+    assert min(schedule.get_ifgs()[1:]) >= MIN_IFG_BITS * bit_time
@@ -0,0 +1,141 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# Check that the compiled schedule mode of the transmit PHYs drives the same
+# pin values at the same times as sending each packet a cycle at a time. The
+# PHYs are run against a fake simulator that records every pin driven.
+#
+
+import random
+import pytest
+
+from mii_clock import Clock
+from mii_packet import MiiPacket
+from mii_phy import MiiTransmitter
+from rgmii_phy import RgmiiTransmitter
+
+
+class FakeXsi(object):
+    def __init__(self):
+        self.time = 0
+        self.drives = []
+
+    def get_time(self):
+        return self.time
+
+    def drive_port_pins(self, port, value):
+        self.drives.append((self.time, port, value))
+
+    def terminate(self):
+        pass
+
+
+class FakeSimThread(object):
+    """ The waits of the PHY advance the time of the fake simulator. After
+        switch_after packets have been sent the PHY is given switch_clock.
+    """
+
+    def __init__(self, *args, switch_after=None, switch_clock=None, **kwargs):
+        super(FakeSimThread, self).__init__(*args, **kwargs)
+        self.xsi = FakeXsi()
+        self._switch_after = switch_after
+        self._switch_clock = switch_clock
+
+    def wait_until(self, t):
+        assert t >= self.xsi.time
+        self.xsi.time = t
+
+    def packet_sent(self, packet):
+        super(FakeSimThread, self).packet_sent(packet)
+        if self.num_packets_sent == self._switch_after:
+            self.set_clock(self._switch_clock)
+
+    def get_pin_changes(self):
+        """ Returns the changes of value of each pin in time order, as pins
+            driven again with the same value are not seen by the DUT
+        """
+        values = {}
+        changes = []
+        for (time, port, value) in self.xsi.drives:
+            if values.get(port) != value:
+                values[port] = value
+                changes.append((time, port, value))
+        return changes
+
+
+class FakeMiiTransmitter(FakeSimThread, MiiTransmitter):
+    pass
+
+
+class FakeRgmiiTransmitter(FakeSimThread, RgmiiTransmitter):
+    pass
+
+
+def create_packets(rand, clock):
+    packets = []
+    for i in range(20):
+        packet = MiiPacket(rand, num_data_bytes=rand.randint(46, 200),
+                           inter_frame_gap=clock.get_min_ifg() + rand.randint(0, 40) * clock.get_bit_time())
+        if i % 3 == 0:
+            num_nibbles = len(packet.get_nibbles())
+            packet.error_nibbles = sorted(rand.sample(range(num_nibbles), 3))
+        packets.append(packet)
+
+    packets += [
+        MiiPacket(rand, vlan_prio_tag=[0x81, 0x00, 0x12, 0x34], error_nibbles=[0, 1]),
+        MiiPacket(rand, extra_nibble=True, inter_frame_gap=2 * clock.get_min_ifg()),
+        MiiPacket(rand, num_preamble_nibbles=7, corrupt_crc=True),
+      ]
+    return packets
+
+
+def run_phy(phy_class, ports, clock, packets, compiled, chunk_packets=None, **kwargs):
+    phy = phy_class(*ports, clock, initial_delay=1000*1e6, do_timeout=False,
+                    compiled=compiled, **kwargs)
+    if chunk_packets:
+        phy.SCHEDULE_CHUNK_PACKETS = chunk_packets
+    phy.set_packets(packets)
+    phy.run()
+    return phy
+
+
+MII_PORTS = ['rxd', 'rxdv', 'rxer']
+RGMII_PORTS = ['rxd', 'rxd_100', 'rxdv', 'mode_rxd', 'mode_rxdv', 'rxer']
+
+
+@pytest.mark.parametrize("chunk_packets", [None, 4])
+def test_mii_compiled(chunk_packets):
+    clock = Clock('clk', Clock.CLK_25MHz)
+    packets = create_packets(random.Random(1), clock)
+
+    expected = run_phy(FakeMiiTransmitter, MII_PORTS, clock, packets, False)
+    phy = run_phy(FakeMiiTransmitter, MII_PORTS, clock, packets, True, chunk_packets)
+
+    assert phy.get_pin_changes() == expected.get_pin_changes()
+    assert phy.num_packets_sent == expected.num_packets_sent == len(packets)
+
+
+@pytest.mark.parametrize("rate", [Clock.CLK_25MHz, Clock.CLK_125MHz])
+def test_rgmii_compiled(rate):
+    clock = Clock('clk', rate)
+    packets = create_packets(random.Random(2), clock)
+
+    expected = run_phy(FakeRgmiiTransmitter, RGMII_PORTS, clock, packets, False)
+    phy = run_phy(FakeRgmiiTransmitter, RGMII_PORTS, clock, packets, True)
+
+    assert phy.get_pin_changes() == expected.get_pin_changes()
+
+
+def test_rgmii_compiled_rate_change():
+    # The clock changes from 1Gb/s to 100Mb/s part way through a chunk, so the
+    # rest of the chunk has to be compiled again for the new rate
+    clock = Clock('clk', Clock.CLK_125MHz)
+    slow_clock = Clock('clk', Clock.CLK_25MHz)
+    packets = create_packets(random.Random(3), slow_clock)
+    switch = dict(switch_after=5, switch_clock=slow_clock)
+
+    expected = run_phy(FakeRgmiiTransmitter, RGMII_PORTS, clock, packets, False, **switch)
+    phy = run_phy(FakeRgmiiTransmitter, RGMII_PORTS, clock, packets, True, **switch)
+
+    assert phy.get_pin_changes() == expected.get_pin_changes()
+    assert phy.num_packets_sent == len(packets)
@@ -0,0 +1,94 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+
+import Pyxsim as px
+import os
+import random
+from pathlib import Path
+import json
+import pytest
+
+from mii_clock import Clock
+from mii_packet import MiiPacket
+from helpers import get_dut_mac_address, packet_processing_time
+from helpers import get_sim_args, get_mii_tx_clk_phy, get_rgmii_tx_clk_phy
+from helpers import run_on_simulator
+
+with open(Path(__file__).parent / "test_vlan_filter/test_params.json") as f:
+    params = json.load(f)
+
+# The VLAN tags sent by the test, or None for an untagged packet. Client 1 is a
+# member of VLANs 10 and 20 and client 2 of VLAN 30 (having deleted 40). Clients
+# 3 and 4 are not members of any VLAN, so are sent every packet.
+VLAN_TAGS = [
+    [0x81, 0x00, 0x00, 0x0a], # VLAN 10
+    [0x81, 0x00, 0x00, 0x14], # VLAN 20
+    [0x81, 0x00, 0x00, 0x1e], # VLAN 30
+    [0x81, 0x00, 0x00, 0x28], # VLAN 40, deleted
+    [0x81, 0x00, 0xa0, 0x00], # Priority tagged, always passes
+    None,                     # Untagged, always passes
+    [0x81, 0x00, 0x68, 0x0a], # VLAN 0x80a, not a member
+    [0x81, 0x00, 0xe0, 0x14], # VLAN 20 with priority 7
+  ]
+
+def do_test(capfd, mac, arch, tx_clk, tx_phy):
+    testname = 'test_vlan_filter'
+
+    profile = f'{mac}_{tx_phy.get_name()}'
+    binary = f'{testname}/bin/{profile}/{testname}_{profile}.xe'
+    assert os.path.isfile(binary)
+
+    with capfd.disabled():
+        print(f"Running {testname}: {tx_phy.get_name()} phy at {tx_clk.get_name()}")
+
+    rand = random.Random()
+    rand.seed(1)
+
+    # The first data byte identifies the packet in the DUT output
+    dut_mac_address = get_dut_mac_address()
+    packets = []
+    for (i, tag) in enumerate(VLAN_TAGS):
+        tag_args = {"vlan_prio_tag": tag} if tag else {}
+        packets.append(MiiPacket(rand, dst_mac_addr=dut_mac_address, src_mac_addr=[0 for x in range(6)],
+                                 ether_len_type=[0x12, 0x34],
+                                 inter_frame_gap=packet_processing_time(tx_phy, 64, mac)*4,
+                                 data_bytes=[i + 1] + [0 for x in range(63)], **tag_args))
+
+    tx_phy.set_packets(packets)
+
+    tester = px.testers.ComparisonTester(open('test_vlan_filter.expect'), ordered=False)
+
+    simargs = get_sim_args(testname, mac, tx_clk, tx_phy)
+
+    result = run_on_simulator(binary,
+                              simthreads=[tx_clk, tx_phy],
+                              tester=tester,
+                              simargs=simargs,
+                              capfd=capfd,
+                              do_xe_prebuild=False)
+
+    assert result is True, f"{result}"
+
+
+@pytest.mark.parametrize("params", params["PROFILES"], ids=["-".join(list(profile.values())) for profile in params["PROFILES"]])
+def test_vlan_filter(capfd, params):
+    verbose = False
+    # Test 100 MBit - MII XS2
+    if params["phy"] == "mii":
+        (tx_clk_25, tx_mii) = get_mii_tx_clk_phy(verbose=verbose, test_ctrl="tile[0]:XS1_PORT_1A")
+        do_test(capfd, params["mac"], params["arch"], tx_clk_25, tx_mii)
+
+    elif params["phy"] == "rgmii":
+        # Test 100 MBit - RGMII
+        if params["clk"] == "25MHz":
+            (tx_clk_25, tx_rgmii) = get_rgmii_tx_clk_phy(Clock.CLK_25MHz, verbose=verbose, test_ctrl="tile[0]:XS1_PORT_1A")
+            do_test(capfd, params["mac"], params["arch"], tx_clk_25, tx_rgmii)
+        # Test 1000 MBit - RGMII
+        elif params["clk"] == "125MHz":
+            (tx_clk_125, tx_rgmii) = get_rgmii_tx_clk_phy(Clock.CLK_125MHz, verbose=verbose, test_ctrl="tile[0]:XS1_PORT_1A")
+            do_test(capfd, params["mac"], params["arch"], tx_clk_125, tx_rgmii)
+        else:
+            assert 0, f"Invalid params: {params}"
+
+    else:
+        assert 0, f"Invalid params: {params}"
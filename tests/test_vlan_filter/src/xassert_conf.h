@@ -0,0 +1,3 @@
+// Copyright 2015-2021 XMOS LIMITED.
+// This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#define XASSERT_ENABLE_DEBUG 1
\ No newline at end of file
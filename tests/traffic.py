@@ -0,0 +1,375 @@
+# Copyright 2024 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+#
+# A traffic engine that generates the frames sent to the DUT from a declarative
+# profile. A profile is a set of traffic classes, each with a weight, destination
+# MAC addresses, a size distribution, a VLAN tag ratio, a burst length
+# distribution and an optional rate limit, plus optional AVB streams that send
+# one frame in every 125us window.
+#
+# The schedule is generated in batches of NumPy arrays from a seeded generator.
+# Only the MiiPackets themselves are created one at a time, as the schedule is
+# iterated by the transmitter, so schedules of millions of frames can be built.
+# The number of frames and bytes of each class are counted when the schedule is
+# generated so the expected output of the DUT can be written without iterating
+# over the packets.
+#
+
+import numpy as np
+
+from mii_packet import MiiPacket
+
+# The bytes on the wire around the frame data (preamble/SFD, header and CRC)
+PREAMBLE_BYTES = 8
+HEADER_BYTES = 14
+TAG_BYTES = 4
+CRC_BYTES = 4
+
+# The minimum inter-frame gap in bits
+MIN_IFG_BITS = 96
+
+# The AVB class measurement interval in fs
+AVB_WINDOW = 125000 * 1e6
+
+
+class UniformSizes(object):
+    """ Frame data sizes chosen uniformly from [min_bytes, max_bytes]
+    """
+
+    def __init__(self, min_bytes, max_bytes):
+        self.min_bytes = min_bytes
+        self.max_bytes = max_bytes
+
+    def sample(self, gen, n):
+        return gen.integers(self.min_bytes, self.max_bytes + 1, n)
+
+
+class ChoiceSizes(object):
+    """ Frame data sizes chosen from a list of sizes with the given weights
+    """
+
+    def __init__(self, sizes, weights=None):
+        self.sizes = np.array(sizes)
+        self.p = None if weights is None else np.array(weights) / np.sum(weights)
+
+    def sample(self, gen, n):
+        return gen.choice(self.sizes, n, p=self.p)
+
+
+def fixed_size(num_bytes):
+    return ChoiceSizes([num_bytes])
+
+
+def imix_sizes():
+    """ The simple IMIX: 7 x 64, 4 x 576 and 1 x 1518 byte frames
+    """
+    return ChoiceSizes([46, 558, 1500], [7, 4, 1])
+
+
+class TrafficClass(object):
+    """ A class of traffic sent to the DUT.
+
+        The class of each burst of frames is chosen by weight, as are its
+        destination address (from dst_mac_addrs), data size and whether it is VLAN
+        tagged (with probability tag_ratio). If tag_tci is None then the TCI of the
+        tag is random. A burst is a single frame unless it is one of a fraction
+        burst_prob of bursts with a length chosen uniformly from burst_len.
+
+        If rate_mbps is set then the gaps before the frames of the class are
+        stretched so that it does not exceed that rate. The frames of an idle class
+        take up time on the wire but are not sent.
+    """
+
+    def __init__(self, name, dst_mac_addrs, weight=1, sizes=UniformSizes(46, 500),
+                 tag_ratio=0.0, tag_tci=None, burst_prob=0.0, burst_len=(1, 1),
+                 rate_mbps=None, idle=False):
+        self.name = name
+        self.dst_mac_addrs = [bytes(addr) for addr in dst_mac_addrs]
+        self.weight = weight
+        self.sizes = sizes
+        self.tag_ratio = tag_ratio
+        self.tag_tci = tag_tci
+        self.burst_prob = burst_prob
+        self.burst_len = burst_len
+        self.rate_mbps = rate_mbps
+        self.idle = idle
+
+
+class AvbStreams(object):
+    """ Streams that each send one frame of num_data_bytes in every window. The
+        frames are placed at random times within each window and are VLAN tagged.
+    """
+
+    def __init__(self, dst_mac_addrs, num_data_bytes, tag_tci=0, window=AVB_WINDOW):
+        self.dst_mac_addrs = [bytes(addr) for addr in dst_mac_addrs]
+        self.num_data_bytes = num_data_bytes
+        self.tag_tci = tag_tci
+        self.window = window
+
+    def get_names(self):
+        return [f"stream_{i}" for i in range(len(self.dst_mac_addrs))]
+
+
+class TrafficSchedule(object):
+    """ The frames generated from a TrafficProfile, held as arrays. Iterating the
+        schedule creates the MiiPackets, so it can be passed to the transmitter
+        and iterated more than once.
+    """
+
+    def __init__(self, names, dst_mac_addrs, frames):
+        self._names = names
+        self._dst_mac_addrs = dst_mac_addrs
+        self._frames = frames
+
+        self.counts = {}
+        for (index, name) in enumerate(names):
+            mask = frames["cls"] == index
+            self.counts[name] = {"frames": int(np.count_nonzero(mask)),
+                                 "bytes": int(np.sum(frames["num_bytes"][mask]))}
+
+    def __len__(self):
+        return len(self._frames["cls"])
+
+    def get_class_names(self):
+        """ Returns the class name of each frame
+        """
+        return [self._names[i] for i in self._frames["cls"]]
+
+    def get_ifgs(self):
+        return self._frames["ifg"]
+
+    def get_num_bytes(self):
+        """ Returns the number of bytes of each frame from the header to the data
+        """
+        return self._frames["num_bytes"]
+
+    def select(self, indices):
+        """ Returns a schedule of only the frames at the given indices
+        """
+        return TrafficSchedule(self._names, self._dst_mac_addrs,
+                               {k: v[indices] for (k, v) in self._frames.items()})
+
+    def __iter__(self):
+        frames = self._frames
+        dst_mac_addrs = self._dst_mac_addrs
+        for (dst, src, size, tagged, tci, seq, ifg) in zip(
+                frames["dst"].tolist(), frames["src"], frames["size"].tolist(),
+                frames["tagged"].tolist(), frames["tci"].tolist(),
+                frames["seq"].tolist(), frames["ifg"].tolist()):
+            tag = [0x81, 0x00, tci >> 8, tci & 0xff] if tagged else None
+            yield MiiPacket(None,
+                dst_mac_addr=dst_mac_addrs[dst],
+                src_mac_addr=src.tobytes(),
+                create_data_args=['same', (seq, size)],
+                vlan_prio_tag=tag,
+                inter_frame_gap=ifg)
+
+
+class TrafficProfile(object):
+    """ A declarative description of the traffic to send: a list of TrafficClass
+        and optional AvbStreams. The gap between frames is chosen uniformly from
+        ifg_bits (in bit times) on top of any extra gap for rate limiting.
+    """
+
+    # The number of bursts drawn from the generator at a time
+    BATCH_BURSTS = 16384
+
+    def __init__(self, classes, bit_time, ifg_bits=(MIN_IFG_BITS, MIN_IFG_BITS), avb_streams=None):
+        self._classes = classes
+        self._bit_time = bit_time
+        self._ifg_bits = ifg_bits
+        self._avb = avb_streams
+
+        self._names = [c.name for c in classes]
+        self._dst_mac_addrs = []
+        self._dst_offsets = []
+        for c in classes:
+            self._dst_offsets.append(len(self._dst_mac_addrs))
+            self._dst_mac_addrs += c.dst_mac_addrs
+        if avb_streams:
+            self._avb_dst_offset = len(self._dst_mac_addrs)
+            self._names += avb_streams.get_names()
+            self._dst_mac_addrs += avb_streams.dst_mac_addrs
+
+        weights = np.array([c.weight for c in classes], dtype=float)
+        self._p = weights / weights.sum()
+
+        # The scale from the time of a frame of a rate limited class to the time
+        # it takes at the limited rate. Unlimited classes only add credit.
+        line_rate_mbps = 1e9 / bit_time
+        self._limit_scale = np.array([line_rate_mbps / c.rate_mbps if c.rate_mbps else 0.0
+                                      for c in classes])
+        self._idle = np.array([c.idle for c in classes])
+
+    def get_frame_time(self, num_bytes):
+        """ Returns the wire time of frames of num_bytes (header to data), including
+            the preamble and CRC but not the inter-frame gap
+        """
+        return (num_bytes + PREAMBLE_BYTES + CRC_BYTES) * 8 * self._bit_time
+
+    def _generate_batch(self, gen):
+        """ Returns the arrays of one batch of frames
+        """
+        n = self.BATCH_BURSTS
+        cls = gen.choice(len(self._classes), n, p=self._p)
+
+        size = np.zeros(n, dtype=np.int64)
+        dst = np.zeros(n, dtype=np.int64)
+        tagged = np.zeros(n, dtype=bool)
+        tci = np.zeros(n, dtype=np.int64)
+        burst = np.ones(n, dtype=np.int64)
+        for (index, c) in enumerate(self._classes):
+            mask = cls == index
+            count = int(np.count_nonzero(mask))
+            if not count:
+                continue
+            size[mask] = c.sizes.sample(gen, count)
+            dst[mask] = self._dst_offsets[index] + gen.integers(0, len(c.dst_mac_addrs), count)
+            tagged[mask] = gen.random(count) < c.tag_ratio
+            tci[mask] = gen.integers(0, 0x10000, count) if c.tag_tci is None else c.tag_tci
+            if c.burst_prob:
+                lengths = gen.integers(c.burst_len[0], c.burst_len[1] + 1, count)
+                burst[mask] = np.where(gen.random(count) < c.burst_prob, lengths, 1)
+
+        # Every frame of a burst is the same apart from its sequence number
+        frames = {"cls": cls, "size": size, "dst": dst, "tagged": tagged, "tci": tci}
+        frames = {k: np.repeat(v, burst) for (k, v) in frames.items()}
+
+        num_frames = len(frames["cls"])
+        frames["num_bytes"] = HEADER_BYTES + frames["size"] + TAG_BYTES * frames["tagged"]
+        frames["src"] = gen.integers(0, 256, (num_frames, 6), dtype=np.uint8)
+
+        (min_bits, max_bits) = self._ifg_bits
+        if min_bits == max_bits:
+            frames["ifg"] = np.full(num_frames, min_bits * self._bit_time)
+        else:
+            frames["ifg"] = gen.integers(int(min_bits * self._bit_time), int(max_bits * self._bit_time) + 1,
+                                         num_frames).astype(float)
+        return frames
+
+    def _limit_rate(self, frames, credit):
+        """ Stretch the gaps before frames of rate limited classes. Returns the new
+            credit.
+
+            The credit is increased by the time of every frame (including its
+            minimum gap) and decreased by the time a frame of a limited class would
+            take at its limited rate. When the credit would go negative the frame is
+            delayed by that amount and the credit is reset to zero. This is the
+            recursion c[n] = max(0, c[n-1] + d[n]), which is computed from the
+            running minimum of the cumulative sum of d.
+        """
+        packet_time = self.get_frame_time(frames["num_bytes"]) + MIN_IFG_BITS * self._bit_time
+        d = packet_time * (1 - self._limit_scale[frames["cls"]])
+        s = credit + np.cumsum(d)
+        running_min = np.minimum.accumulate(np.minimum(s, 0))
+        extra = -np.diff(running_min, prepend=0.0)
+        frames["ifg"] = frames["ifg"] + extra
+        return float(s[-1] - running_min[-1])
+
+    def _frame_batches(self, gen):
+        credit = 0.0
+        while True:
+            frames = self._generate_batch(gen)
+            credit = self._limit_rate(frames, credit)
+            yield frames
+
+    def _generate_count(self, gen, num_frames):
+        batches = []
+        total = 0
+        for frames in self._frame_batches(gen):
+            keep = ~self._idle[frames["cls"]]
+            frames = {k: v[keep] for (k, v) in frames.items()}
+            batches.append(frames)
+            total += len(frames["cls"])
+            if total >= num_frames:
+                break
+        return {k: np.concatenate([b[k] for b in batches])[:num_frames] for k in batches[0]}
+
+    def _generate_windows(self, gen, num_windows):
+        avb = self._avb
+        num_streams = len(avb.dst_mac_addrs)
+        end_time = num_windows * avb.window
+        min_ifg = MIN_IFG_BITS * self._bit_time
+
+        # Place the stream frames at random times in each window, in a random
+        # order, and delay any that would overlap the previous one:
+        #   start[n] = max(time[n], start[n-1] + period)
+        offsets = np.sort(gen.integers(0, int(avb.window) + 1, (num_windows, num_streams)), axis=1)
+        streams = np.concatenate([gen.permutation(num_streams) for w in range(num_windows)])
+        times = (offsets + np.arange(num_windows)[:, None] * avb.window).ravel()
+        avb_num_bytes = HEADER_BYTES + TAG_BYTES + avb.num_data_bytes
+        avb_time = self.get_frame_time(avb_num_bytes)
+        period = avb_time + min_ifg
+        steps = np.arange(len(times)) * period
+        avb_start = np.maximum.accumulate(times - steps) + steps
+
+        avb_end = avb_start + avb_time
+
+        # Generate enough frames of the other classes to fill all the time
+        batches = []
+        total_time = 0.0
+        for frames in self._frame_batches(gen):
+            batches.append(frames)
+            total_time += np.sum(frames["ifg"] + self.get_frame_time(frames["num_bytes"]))
+            if total_time > end_time:
+                break
+        frames = {k: np.concatenate([b[k] for b in batches]) for k in batches[0]}
+        frame_time = self.get_frame_time(frames["num_bytes"])
+        elapsed = np.cumsum(frames["ifg"] + frame_time)
+
+        # Pack them in order into the gaps between the stream frames, leaving the
+        # minimum gap before each stream frame. The frames that fit in each gap are
+        # found from the cumulative time of the frames.
+        gap_starts = np.concatenate(([0.0], avb_end))
+        gap_ends = np.concatenate((avb_start - min_ifg, [end_time]))
+        start = np.full(len(frame_time), np.nan)
+        (first, base) = (0, 0.0)
+        for (gap_start, gap_end) in zip(gap_starts.tolist(), gap_ends.tolist()):
+            last = int(np.searchsorted(elapsed, base + gap_end - gap_start, side='right'))
+            if last > first:
+                start[first:last] = gap_start + elapsed[first:last] - base - frame_time[first:last]
+                (first, base) = (last, elapsed[last - 1])
+
+        # Frames of idle classes only take up time
+        frames["start"] = start
+        frames["end"] = start + frame_time
+        keep = ~np.isnan(start) & ~self._idle[frames["cls"]]
+        frames = {k: v[keep] for (k, v) in frames.items()}
+
+        num_avb = len(avb_start)
+        avb_frames = {
+            "cls": len(self._classes) + streams,
+            "size": np.full(num_avb, avb.num_data_bytes),
+            "dst": self._avb_dst_offset + streams,
+            "tagged": np.ones(num_avb, dtype=bool),
+            "tci": np.full(num_avb, avb.tag_tci),
+            "num_bytes": np.full(num_avb, avb_num_bytes),
+            "src": gen.integers(0, 256, (num_avb, 6), dtype=np.uint8),
+            "start": avb_start,
+            "end": avb_end,
+          }
+
+        # Merge the frames in time order and set the gap before each
+        order = np.argsort(np.concatenate([frames["start"], avb_frames["start"]]), kind='stable')
+        frames = {k: np.concatenate([frames[k], avb_frames[k]])[order] for k in avb_frames}
+        frames["ifg"] = frames["start"] - np.concatenate(([0.0], frames["end"][:-1]))
+        return frames
+
+    def generate(self, seed, num_frames=None, num_windows=None):
+        """ Generate a TrafficSchedule of num_frames frames or, if there are AVB
+            streams, of num_windows windows
+        """
+        gen = np.random.default_rng(seed)
+        if self._avb:
+            frames = self._generate_windows(gen, num_windows)
+        else:
+            frames = self._generate_count(gen, num_frames)
+
+        # Number the frames of each class in order
+        seq = np.zeros(len(frames["cls"]), dtype=np.int64)
+        for index in range(len(self._names)):
+            mask = frames["cls"] == index
+            seq[mask] = np.arange(np.count_nonzero(mask))
+        frames["seq"] = seq
+
+        return TrafficSchedule(self._names, self._dst_mac_addrs, frames)